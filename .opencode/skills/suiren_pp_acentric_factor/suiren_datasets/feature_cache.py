@@ -0,0 +1,447 @@
+"""
+Persistent on-disk cache of featurized molecules.
+
+Entries are keyed by the featurizer version and the canonical SMILES of a
+molecule, so every suiren_pp_* predictor (and every rerun) shares them. An
+alias table maps the input SMILES strings seen so far to their canonical
+form, which lets repeated inputs skip RDKit entirely; invalid SMILES are
+remembered the same way.
+
+With the cache enabled a molecule is always featurized from its canonical
+SMILES, so the atom order, and with it the chirality tags, no longer depend
+on how the input was written.
+
+Layout of the cache directory:
+    index.sqlite        entry, alias and segment tables (WAL mode, shared by processes)
+    segment-NNNNNN.bin  append-only record data, memory-mapped for reading
+
+Each process appends to its own segment. The size limit covers the segments
+plus ALIAS_BYTES per alias row. Once it is exceeded, the aliases of invalid
+SMILES are deleted first, least recently used first, then the oldest
+segments with their entries and aliases. A segment is only deleted once its
+writer has sealed it (moved on to a new segment or closed the cache) or has
+exited.
+
+Each process keeps running totals of the segment bytes and alias rows, so
+that flushing does not count the alias table. The totals are read from the
+index when the cache is opened, on every segment rotation (which picks up
+what other processes wrote) and before evicting.
+"""
+
+import mmap
+import os
+import sqlite3
+import weakref
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from suiren_datasets.compact import CompactMolecule, compact_from_graph
+from suiren_datasets.fast_featurize import fast_from_rdmol
+
+# Bump whenever from_rdmol (and fast_from_rdmol) produces different features for the same molecule
+FEATURIZER_VERSION = 1
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "suiren" / "features"
+DEFAULT_MAX_SIZE_MB = 2048
+SEGMENT_BYTES = 64 * 1024 * 1024
+FLUSH_EVERY = 256
+# Size counted per alias row towards the limit (SMILES text plus index overhead, roughly)
+ALIAS_BYTES = 128
+
+_open_caches = weakref.WeakSet()
+
+
+def flush_open_caches() -> None:
+    """Commit pending entries of every FeatureCache open in this process."""
+    for cache in list(_open_caches):
+        cache.flush()
+
+
+def _writer_alive(pid: int) -> bool:
+    """Whether the process that owns an unsealed segment is still running."""
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        return False  # Open files cannot be deleted there; the unlink in evict fails instead
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def encode_record(record: CompactMolecule) -> bytes:
+    # int32 edge_index first so that it stays 4-byte aligned; records are padded to 4 bytes
+    payload = (
+        record.edge_index.to(torch.int32).numpy().tobytes()
+        + record.x.to(torch.uint8).numpy().tobytes()
+        + record.edge_attr.to(torch.uint8).numpy().tobytes()
+    )
+    return payload + b"\0" * (-len(payload) % 4)
+
+
+def decode_record(buffer, offset: int, num_atoms: int, num_edges: int) -> CompactMolecule:
+    edge_index = np.frombuffer(buffer, dtype=np.int32, count=2 * num_edges, offset=offset)
+    offset += 8 * num_edges
+    x = np.frombuffer(buffer, dtype=np.uint8, count=5 * num_atoms, offset=offset)
+    offset += 5 * num_atoms
+    edge_attr = np.frombuffer(buffer, dtype=np.uint8, count=3 * num_edges, offset=offset)
+    return CompactMolecule(
+        x=torch.from_numpy(x.reshape(num_atoms, 5).copy()),
+        edge_index=torch.from_numpy(edge_index.reshape(2, num_edges).copy()),
+        edge_attr=torch.from_numpy(edge_attr.reshape(num_edges, 3).copy()),
+    )
+
+
+def record_size(num_atoms: int, num_edges: int) -> int:
+    size = 8 * num_edges + 5 * num_atoms + 3 * num_edges
+    return size + (-size % 4)
+
+
+class FeatureCache:
+    """
+    Featurization cache shared by all Suiren predictors.
+
+    Instances are picklable: unpickling in a worker process reopens the same
+    directory through open_feature_cache, once per process, and the worker
+    writes to a segment of its own.
+
+    Args:
+        cache_dir (Path): Cache directory, created if missing
+        max_size_mb (float): Size limit of the record segments (default: 2048)
+    """
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, max_size_mb: float = DEFAULT_MAX_SIZE_MB):
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.max_size_mb = max_size_mb
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._pid = None
+        _open_caches.add(self)
+
+    def __reduce__(self):
+        return open_feature_cache, (self.cache_dir, self.max_size_mb)
+
+    # ------------------------------------------------------------------
+    # Connection and segment handling
+    # ------------------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        if self._pid == os.getpid():
+            return self._db
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Shared by the threads of a SuirenPredictor, which use it one at a time
+        self._db = sqlite3.connect(str(self.cache_dir / "index.sqlite"), timeout=60, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS segments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                size INTEGER NOT NULL DEFAULT 0,
+                owner INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                version INTEGER NOT NULL,
+                canonical TEXT NOT NULL,
+                segment INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                num_atoms INTEGER NOT NULL,
+                num_edges INTEGER NOT NULL,
+                PRIMARY KEY (version, canonical)
+            );
+            CREATE INDEX IF NOT EXISTS entries_segment ON entries (segment);
+            CREATE TABLE IF NOT EXISTS aliases (
+                version INTEGER NOT NULL,
+                smiles TEXT NOT NULL,
+                canonical TEXT,
+                PRIMARY KEY (version, smiles)
+            );
+            CREATE INDEX IF NOT EXISTS aliases_canonical ON aliases (canonical);
+            """
+        )
+        if "owner" not in {row[1] for row in self._db.execute("PRAGMA table_info(segments)")}:
+            # Caches written before segments had owners; their segments count as sealed
+            try:
+                self._db.execute("ALTER TABLE segments ADD COLUMN owner INTEGER")
+            except sqlite3.OperationalError:
+                pass  # Added by another process meanwhile
+        self._pid = os.getpid()
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._segment_id: Optional[int] = None
+        self._segment_file = None
+        self._segment_size = 0
+        # Segments left for a new one, sealed (and closed) once their entries are committed
+        self._rotated: List[Tuple[int, int, object]] = []
+        self._pending_entries: Dict[str, Tuple[CompactMolecule, tuple]] = {}
+        self._pending_aliases: Dict[str, Optional[str]] = {}
+        # Set when eviction could not get under the limit; retried after the next rotation
+        self._evict_blocked = False
+        self._refresh_totals()
+        return self._db
+
+    def _refresh_totals(self) -> None:
+        self._segment_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM segments").fetchone()[0]
+        self._alias_count = self._db.execute("SELECT COUNT(*) FROM aliases").fetchone()[0]
+
+    def _segment_path(self, segment_id: int) -> Path:
+        return self.cache_dir / f"segment-{segment_id:06d}.bin"
+
+    def _segment_buffer(self, segment_id: int, end: int):
+        buffer = self._maps.get(segment_id)
+        if buffer is None or len(buffer) < end:
+            # Segments still being written may have grown since they were mapped
+            with open(self._segment_path(segment_id), "rb") as handle:
+                new_buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+            if buffer is not None:
+                buffer.close()  # decode_record copies, nothing refers to the old mapping
+            buffer = self._maps[segment_id] = new_buffer
+        return buffer
+
+    def _append(self, payload: bytes) -> Tuple[int, int]:
+        db = self._connect()
+        if self._segment_file is None or self._segment_size + len(payload) > SEGMENT_BYTES:
+            if self._segment_file is not None:
+                self._segment_file.flush()
+                self._rotated.append((self._segment_id, self._segment_size, self._segment_file))
+            with db:
+                self._segment_id = db.execute(
+                    "INSERT INTO segments (size, owner) VALUES (0, ?)", (os.getpid(),)
+                ).lastrowid
+            self._segment_file = open(self._segment_path(self._segment_id), "ab")
+            self._segment_size = 0
+            self._evict_blocked = False
+        offset = self._segment_size
+        self._segment_file.write(payload)
+        self._segment_size += len(payload)
+        self._segment_bytes += len(payload)
+        return self._segment_id, offset
+
+    # ------------------------------------------------------------------
+    # Lookup and insertion
+    # ------------------------------------------------------------------
+    def lookup_alias(self, smiles: str) -> Tuple[bool, Optional[str]]:
+        """(known, canonical SMILES or None for a known invalid SMILES)."""
+        db = self._connect()
+        if smiles in self._pending_aliases:
+            return True, self._pending_aliases[smiles]
+        row = db.execute(
+            "SELECT canonical FROM aliases WHERE version = ? AND smiles = ?",
+            (FEATURIZER_VERSION, smiles),
+        ).fetchone()
+        return (False, None) if row is None else (True, row[0])
+
+    def get(self, canonical: str) -> Optional[CompactMolecule]:
+        db = self._connect()
+        pending = self._pending_entries.get(canonical)
+        if pending is not None:
+            return pending[0]
+        row = db.execute(
+            "SELECT segment, offset, num_atoms, num_edges FROM entries WHERE version = ? AND canonical = ?",
+            (FEATURIZER_VERSION, canonical),
+        ).fetchone()
+        if row is None:
+            return None
+        segment_id, offset, num_atoms, num_edges = row
+        try:
+            buffer = self._segment_buffer(segment_id, offset + record_size(num_atoms, num_edges))
+        except (FileNotFoundError, ValueError):
+            return None  # Evicted by another process
+        return decode_record(buffer, offset, num_atoms, num_edges)
+
+    def put(self, canonical: str, record: CompactMolecule) -> None:
+        self._connect()
+        segment_id, offset = self._append(encode_record(record))
+        row = (segment_id, offset, record.x.size(0), record.edge_index.size(1))
+        self._pending_entries[canonical] = (record, row)
+        self._maybe_flush()
+
+    def put_alias(self, smiles: str, canonical: Optional[str]) -> None:
+        self._connect()
+        self._pending_aliases[smiles] = canonical
+        self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        if len(self._pending_entries) + len(self._pending_aliases) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write pending records to disk and commit them to the index."""
+        if self._pid != os.getpid():
+            return
+        if not self._pending_entries and not self._pending_aliases:
+            return
+
+        db = self._db
+        if self._segment_file is not None:
+            self._segment_file.flush()
+        known_aliases = 0
+        if self._pending_aliases:
+            # At most FLUSH_EVERY aliases, well below SQLite's limit on bound parameters
+            placeholders = ",".join("?" * len(self._pending_aliases))
+            known_aliases = db.execute(
+                f"SELECT COUNT(*) FROM aliases WHERE version = ? AND smiles IN ({placeholders})",
+                (FEATURIZER_VERSION, *self._pending_aliases),
+            ).fetchone()[0]
+        with db:
+            db.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                [(FEATURIZER_VERSION, canonical) + row for canonical, (_, row) in self._pending_entries.items()],
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO aliases VALUES (?, ?, ?)",
+                [(FEATURIZER_VERSION, smiles, canonical) for smiles, canonical in self._pending_aliases.items()],
+            )
+            if self._segment_id is not None:
+                db.execute("UPDATE segments SET size = ? WHERE id = ?", (self._segment_size, self._segment_id))
+            db.executemany(
+                "UPDATE segments SET size = ?, owner = NULL WHERE id = ?",
+                [(size, segment_id) for segment_id, size, _ in self._rotated],
+            )
+        self._alias_count += len(self._pending_aliases) - known_aliases
+        for _, _, segment_file in self._rotated:
+            segment_file.close()
+        if self._rotated:
+            self._refresh_totals()
+        self._rotated.clear()
+        self._pending_entries.clear()
+        self._pending_aliases.clear()
+        if not self._evict_blocked and self._segment_bytes + self._alias_count * ALIAS_BYTES > self.max_size_bytes:
+            self.evict()
+
+    def evict(self) -> List[int]:
+        """
+        Delete cached data until the cache fits its size limit.
+
+        Returns:
+            List[int]: Ids of the deleted segments
+        """
+        db = self._connect()
+        evicted: List[int] = []
+        self._refresh_totals()
+        excess = self._segment_bytes + self._alias_count * ALIAS_BYTES - self.max_size_bytes
+        if excess <= 0:
+            return evicted
+
+        # Invalid SMILES are the cheapest to look at again. A hit writes the alias
+        # again (see featurize), so rowid order is least recently used first.
+        with db:
+            dropped = db.execute(
+                "DELETE FROM aliases WHERE rowid IN "
+                "(SELECT rowid FROM aliases WHERE canonical IS NULL ORDER BY rowid LIMIT ?)",
+                (-(-excess // ALIAS_BYTES),),
+            ).rowcount
+        excess -= dropped * ALIAS_BYTES
+        self._alias_count -= dropped
+
+        for segment_id, size, owner in db.execute("SELECT id, size, owner FROM segments ORDER BY id").fetchall():
+            if excess <= 0:
+                break
+            if segment_id == self._segment_id or (owner is not None and _writer_alive(owner)):
+                continue
+            buffer = self._maps.pop(segment_id, None)
+            if buffer is not None:
+                buffer.close()
+            try:
+                os.unlink(self._segment_path(segment_id))
+            except FileNotFoundError:
+                pass  # Evicted by another process meanwhile
+            except OSError:
+                continue  # Still open in another process (Windows)
+            with db:
+                dropped = db.execute(
+                    "DELETE FROM aliases WHERE canonical IN (SELECT canonical FROM entries WHERE segment = ?)",
+                    (segment_id,),
+                ).rowcount
+                db.execute("DELETE FROM entries WHERE segment = ?", (segment_id,))
+                db.execute("DELETE FROM segments WHERE id = ?", (segment_id,))
+            excess -= size + dropped * ALIAS_BYTES
+            self._segment_bytes -= size
+            self._alias_count -= dropped
+            evicted.append(segment_id)
+        # Whatever is left belongs to live writers
+        self._evict_blocked = excess > 0
+        return evicted
+
+    def close(self) -> None:
+        if self._pid != os.getpid():
+            return
+        self.flush()
+        if self._segment_file is not None:
+            self._segment_file.close()
+            self._segment_file = None
+            with self._db:
+                self._db.execute("UPDATE segments SET owner = NULL WHERE id = ?", (self._segment_id,))
+        for buffer in self._maps.values():
+            buffer.close()
+        self._maps.clear()
+        self._db.close()
+        self._pid = None
+
+    # ------------------------------------------------------------------
+    # Featurization
+    # ------------------------------------------------------------------
+    def featurize(self, smiles: str) -> Tuple[Optional[CompactMolecule], bool]:
+        """
+        Cached equivalent of compact_from_smiles.
+
+        Returns:
+            (CompactMolecule or None, mol_flag)
+        """
+        known, canonical = self.lookup_alias(smiles)
+        if known and canonical is None:
+            self.hits += 1
+            self.put_alias(smiles, None)  # Marks it as recently used for eviction
+            return None, False
+        if known:
+            record = self.get(canonical)
+            if record is not None:
+                self.hits += 1
+                return record, True
+
+        from rdkit import Chem, RDLogger
+
+        RDLogger.DisableLog('rdApp.*')  # type: ignore
+
+        mol = None
+        if not known:
+            mol = Chem.MolFromSmiles(smiles)
+            if mol is None:
+                self.misses += 1
+                self.put_alias(smiles, None)
+                return None, False
+            canonical = Chem.MolToSmiles(mol)
+            record = self.get(canonical)
+            if record is not None:
+                self.hits += 1
+                self.put_alias(smiles, canonical)
+                return record, True
+
+        self.misses += 1
+        canonical_mol = Chem.MolFromSmiles(canonical)
+        if canonical_mol is None:
+            # Rare canonical SMILES that RDKit cannot read back; use the input as written
+            canonical_mol = mol if mol is not None else Chem.MolFromSmiles(smiles)
+        x, edge_index, edge_attr, _ = fast_from_rdmol(canonical_mol, full_graph=False)
+        record = compact_from_graph(x, edge_index, edge_attr)
+        self.put(canonical, record)
+        self.put_alias(smiles, canonical)
+        return record, True
+
+
+_process_caches: Dict[Tuple[int, str, float], FeatureCache] = {}
+
+
+def open_feature_cache(cache_dir: Path = DEFAULT_CACHE_DIR, max_size_mb: float = DEFAULT_MAX_SIZE_MB) -> FeatureCache:
+    """FeatureCache for a directory, shared by all callers within a process."""
+    key = (os.getpid(), str(Path(cache_dir).expanduser().resolve()), max_size_mb)
+    cache = _process_caches.get(key)
+    if cache is None:
+        cache = _process_caches[key] = FeatureCache(cache_dir, max_size_mb)
+    return cache
@@ -0,0 +1,486 @@
+import argparse
+import atexit
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, TextIO
+
+import numpy as np
+import pandas as pd
+
+from models.export import EXPORT_BACKENDS
+from models.precision import PRECISIONS
+from models.predictor import (
+    SuirenPredictor,
+    detect_smiles_column,
+    format_peak_memory,
+    load_inputs,
+    parse_properties,
+)
+from suiren_datasets.feature_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE_MB
+from suiren_datasets.incremental import KEY_COLUMN, IncrementalScores
+from suiren_datasets.micro_batch import DEFAULT_FLUSH_MS, DEFAULT_FLUSH_SIZE, iter_micro_batches
+from suiren_datasets.prediction_cache import DEFAULT_CACHE_PATH
+from suiren_datasets.streaming import DEFAULT_CHUNK_ROWS, stream_csv
+
+# 设置标准输出编码为UTF-8
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+if sys.stderr.encoding != 'utf-8':
+    sys.stderr.reconfigure(encoding='utf-8')
+
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+DEFAULT_STUDENT_PATH = PROJECT_ROOT / "suiren_student.pt"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Predict multiple physicochemical properties of a molecule in one pass"
+    )
+    parser.add_argument(
+        "--properties",
+        type=str,
+        default="all",
+        help="Comma-separated property names to predict, or 'all' for every Suiren property.",
+    )
+    parser.add_argument(
+        "--smiles-column",
+        type=str,
+        default=None,
+        help="CSV column name containing SMILES. If omitted, the script auto-detects it.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="Inference batch size for CSV input.",
+    )
+    parser.add_argument(
+        "--max-batch-pairs",
+        type=int,
+        default=None,
+        help="Form size-bucketed batches by a budget on the summed squared atom counts instead of a fixed "
+        "--batch-size. Molecules are grouped by size and results are returned in input order.",
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default="auto",
+        choices=["auto", "cpu", "cuda"],
+        help="Inference device.",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="eager",
+        choices=["eager", *EXPORT_BACKENDS],
+        help="Inference backend: eager PyTorch, or a TorchScript / ONNX artifact created by "
+        "suiren_pp_all/export_models.py (CPU only, sparse full-graph mode).",
+    )
+    parser.add_argument(
+        "--precision",
+        type=str,
+        default="fp32",
+        choices=list(PRECISIONS),
+        help="Inference precision of the eager backend: fp32, bf16 (bfloat16 autocast) "
+        "or int8 (dynamic quantization of Linear layers, CPU only).",
+    )
+    parser.add_argument(
+        "--full-graph-mode",
+        type=str,
+        default="sparse",
+        choices=["sparse", "dense", "chunked"],
+        help="Execution mode of the full-connect attention: sparse (edge-wise), dense (padded batch tensors) "
+        "or chunked (dense, split into target-node chunks under --memory-budget).",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        default=None,
+        help="Memory budget in MB for the full-connect attention intermediates of each layer. "
+        "Implies --full-graph-mode chunked and reports the peak memory.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Worker processes for SMILES featurization. Featurization of the next chunk then overlaps "
+        "with inference on the current one. 0 featurizes in the main process.",
+    )
+    parser.add_argument(
+        "--inference-workers",
+        type=str,
+        default="0",
+        help="Worker processes for data-parallel CPU inference; they share the model weights and each "
+        "predicts shards of every chunk. 'auto' chooses workers x threads from the free cores. "
+        "0 runs the model in the main process.",
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=None,
+        help="Intra-op threads of each inference worker (default: chosen from the core count).",
+    )
+    parser.add_argument(
+        "--feature-cache",
+        type=str,
+        nargs="?",
+        const=str(DEFAULT_CACHE_DIR),
+        default=None,
+        metavar="DIR",
+        help="Reuse featurized molecules from a persistent cache shared by all Suiren predictors "
+        f"(default directory: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--feature-cache-size",
+        type=float,
+        default=DEFAULT_MAX_SIZE_MB,
+        help="Size limit of the feature cache in MB; the oldest entries are evicted beyond it.",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Predict each distinct molecule (by canonical SMILES) once and copy the result to its duplicate rows.",
+    )
+    parser.add_argument(
+        "--prediction-cache",
+        type=str,
+        nargs="?",
+        const=str(DEFAULT_CACHE_PATH),
+        default=None,
+        metavar="PATH",
+        help="Reuse earlier predictions stored in a SQLite file, keyed by the model checksum and canonical "
+        f"SMILES; only uncached molecules are run through the model (default file: {DEFAULT_CACHE_PATH}).",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream CSV input: read, predict and append results chunk by chunk in constant memory. "
+        "An interrupted run resumes from its progress marker when rerun with the same arguments.",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=DEFAULT_CHUNK_ROWS,
+        help="Rows per chunk in --stream mode.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"CSV input: write a '{KEY_COLUMN}' column (hash of the model checksum and the SMILES) and, "
+        "on later runs, reuse the predictions of rows whose key is unchanged in the file being written.",
+    )
+    parser.add_argument(
+        "--stdin-stream",
+        action="store_true",
+        help="Read SMILES lines from stdin until EOF and write one JSON line per molecule to stdout "
+        "(or --output) as each micro-batch completes; status messages go to stderr.",
+    )
+    parser.add_argument(
+        "--flush-size",
+        type=int,
+        default=DEFAULT_FLUSH_SIZE,
+        help="Largest micro-batch in --stdin-stream mode.",
+    )
+    parser.add_argument(
+        "--flush-ms",
+        type=float,
+        default=DEFAULT_FLUSH_MS,
+        help="Longest time in milliseconds a molecule waits for its micro-batch to fill in --stdin-stream mode.",
+    )
+    parser.add_argument(
+        "--fast-profile",
+        action="store_true",
+        help="Predict with the distilled multi-task student (one small model for all properties) "
+        "instead of the per-property models, and report its agreement with them.",
+    )
+    parser.add_argument(
+        "--student",
+        type=str,
+        default=str(DEFAULT_STUDENT_PATH),
+        help="Student checkpoint for --fast-profile, trained by distill_student.py.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Optional output file path. If not provided, the result will be printed to the terminal.",
+    )
+
+    args = parser.parse_args()
+    args.input = None
+    if args.workers < 0:
+        parser.error("--workers must be non-negative.")
+    if args.inference_workers != "auto":
+        if not args.inference_workers.isdigit():
+            parser.error("--inference-workers must be a non-negative integer or 'auto'.")
+        args.inference_workers = int(args.inference_workers)
+    if args.threads_per_worker is not None and args.threads_per_worker <= 0:
+        parser.error("--threads-per-worker must be positive.")
+    if args.chunk_rows <= 0:
+        parser.error("--chunk-rows must be positive.")
+    if args.flush_size <= 0:
+        parser.error("--flush-size must be positive.")
+    if args.flush_ms < 0:
+        parser.error("--flush-ms must be non-negative.")
+    if args.stdin_stream and args.stream:
+        parser.error("--stdin-stream and --stream are mutually exclusive.")
+    if args.stdin_stream and args.incremental:
+        parser.error("--incremental only applies to CSV input, not to --stdin-stream.")
+    if args.feature_cache_size <= 0:
+        parser.error("--feature-cache-size must be positive.")
+    if args.max_batch_pairs is not None and args.max_batch_pairs <= 0:
+        parser.error("--max-batch-pairs must be positive.")
+    if args.memory_budget is not None:
+        if args.memory_budget <= 0:
+            parser.error("--memory-budget must be positive.")
+        args.full_graph_mode = "chunked"
+    if args.backend != "eager" and args.full_graph_mode != "sparse":
+        parser.error("--backend torchscript/onnx only supports the sparse full-graph mode.")
+    if args.backend != "eager" and args.precision != "fp32":
+        parser.error("--precision is only supported with --backend eager.")
+    if args.fast_profile and args.backend != "eager":
+        parser.error("--fast-profile is only supported with --backend eager.")
+
+    return args
+
+
+def format_agreement(agreement: Dict[str, Dict[str, float]]) -> List[str]:
+    return [
+        f"Student agreement {name}: R2={stats['r2']:.4f}, MAE={stats['mae']:.4g} (n={stats['count']})"
+        for name, stats in agreement.items()
+    ]
+
+
+_default_predictor: Optional[SuirenPredictor] = None
+_default_predictor_lock = threading.Lock()
+
+
+def predict(smiles: Sequence[str], properties: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+    """
+    Predict properties in-process with a shared default SuirenPredictor.
+
+        from all_properties_predict import predict
+        result = predict(["CCO", "CC(=O)O"], ["boiling_point"])
+        result["boiling_point"], result["valid"]
+    """
+    global _default_predictor
+    with _default_predictor_lock:
+        if _default_predictor is None:
+            _default_predictor = SuirenPredictor()
+    return _default_predictor.predict(smiles, properties)
+
+
+def print_summary(
+    predictor: SuirenPredictor,
+    property_names: Sequence[str],
+    args: argparse.Namespace,
+    incremental: Optional[IncrementalScores] = None,
+) -> None:
+    if incremental is not None:
+        print(incremental.summary())
+    if predictor.deduplicator is not None:
+        print(predictor.deduplicator.summary())
+    if predictor.prediction_cache is not None:
+        print(predictor.prediction_cache.summary())
+    if predictor.student_path is not None:
+        print("\n".join(format_agreement(predictor.student_agreement(property_names))))
+    if args.memory_budget is not None:
+        print(format_peak_memory(predictor.device))
+
+
+def stream_predictions(
+    input_path: Path,
+    predictor: SuirenPredictor,
+    property_names: Sequence[str],
+    args: argparse.Namespace,
+    incremental: Optional[IncrementalScores] = None,
+) -> None:
+    smiles_column = detect_smiles_column(pd.read_csv(input_path, nrows=0), args.smiles_column)
+    valid_count = 0
+
+    def predict_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+        nonlocal valid_count
+        smiles_list = chunk[smiles_column].tolist()
+        if incremental is not None:
+            incremental.remember(chunk)
+        errors, value_columns = predictor.predict_rows(smiles_list, property_names, incremental)
+        valid_count += sum(error is None for error in errors)
+        output_df = chunk.copy()
+        for name, column in value_columns.items():
+            output_df[name] = column
+        if incremental is not None:
+            output_df[KEY_COLUMN] = incremental.row_keys(smiles_list)
+        return output_df
+
+    output_path = Path(args.output).expanduser().resolve() if args.output else input_path
+    if incremental is not None and output_path != input_path and output_path.is_file():
+        incremental.load(output_path)
+    total = stream_csv(
+        input_path,
+        output_path,
+        predict_chunk,
+        chunk_rows=args.chunk_rows,
+        on_chunk=lambda rows_done: print(f"Processed entries:{rows_done}", flush=True),
+    )
+    print(f"Task: {', '.join(property_names)}")
+    print(f"Type: regression")
+    print(f"Total entries:{total}")
+    print(f"Valid entries:{valid_count}")
+    print(f"Result file:{output_path}")
+    print_summary(predictor, property_names, args, incremental)
+
+
+def stream_stdin(
+    predictor: SuirenPredictor,
+    property_names: Sequence[str],
+    args: argparse.Namespace,
+    output: TextIO,
+) -> None:
+    """
+    Predict SMILES lines from stdin in latency-bounded micro-batches and write
+    one JSON line per input line, in input order, as each batch completes.
+    """
+    if args.output:
+        output = open(Path(args.output).expanduser().resolve(), "w", encoding="utf-8")
+    total = 0
+    try:
+        for smiles_batch in iter_micro_batches(sys.stdin, args.flush_size, args.flush_ms / 1000):
+            errors, value_columns = predictor.predict_rows(smiles_batch, property_names)
+            for row, smiles in enumerate(smiles_batch):
+                result = {"SMILES": smiles}
+                if errors[row] is not None:
+                    result["error"] = errors[row]
+                result["predictions"] = {name: value_columns[name][row] for name in property_names}
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            total += len(smiles_batch)
+    except BrokenPipeError:
+        # The consumer exited (e.g. `| head`); silence the final flush of the closed pipe
+        os.dup2(os.open(os.devnull, os.O_WRONLY), output.fileno())
+    finally:
+        if args.output:
+            output.close()
+
+    print(f"Total entries:{total}")
+    if predictor.deduplicator is not None:
+        print(predictor.deduplicator.summary())
+    if predictor.prediction_cache is not None:
+        print(predictor.prediction_cache.summary())
+
+
+def main() -> None:
+    args = parse_args()
+    jsonl_output = sys.stdout
+    if args.stdin_stream:
+        # stdout carries the JSON lines; every status message goes to stderr
+        sys.stdout = sys.stderr
+    property_names = parse_properties(args.properties)
+
+    if args.input is None and not args.stdin_stream:
+        try:
+            args.input = input().strip()
+        except EOFError:
+            raise ValueError("No input provided.")
+        if not args.input:
+            raise ValueError("Input cannot be empty.")
+
+    predictor = SuirenPredictor(
+        device=args.device,
+        batch_size=args.batch_size,
+        max_batch_pairs=args.max_batch_pairs,
+        full_graph_mode=args.full_graph_mode,
+        memory_budget_mb=args.memory_budget,
+        backend=args.backend,
+        precision=args.precision,
+        workers=args.workers,
+        feature_cache=args.feature_cache,
+        feature_cache_size_mb=args.feature_cache_size,
+        prediction_cache=args.prediction_cache,
+        dedup=args.dedup,
+        student_path=args.student if args.fast_profile else None,
+        inference_workers=args.inference_workers,
+        threads_per_worker=args.threads_per_worker,
+    )
+    atexit.register(predictor.close)
+    models, backbone_groups = predictor.load(property_names)
+    print(f"Model loading complete. {len(models)} properties loaded.")
+    if args.fast_profile:
+        print(f"Fast profile: one student model for {len(models)} properties.")
+    elif backbone_groups is not None and len(backbone_groups) < len(models):
+        print(f"Shared pretrain backbones: {len(backbone_groups)} groups for {len(models)} properties.")
+
+    if args.stdin_stream:
+        stream_stdin(predictor, property_names, args, jsonl_output)
+        return
+
+    incremental: Optional[IncrementalScores] = None
+    if args.incremental:
+        incremental = IncrementalScores(list(predictor.model_keys(property_names).values()), property_names)
+
+    input_path = Path(args.input).expanduser()
+    if args.stream and input_path.is_file():
+        stream_predictions(input_path.resolve(), predictor, property_names, args, incremental)
+        return
+
+    input_kind, input_df, smiles_column, input_path = load_inputs(args.input, args.smiles_column)
+    if input_kind == "smiles":
+        incremental = None
+    if incremental is not None:
+        # Earlier results come from the file being written: the input itself or --output
+        incremental.remember(input_df)
+        previous_path = Path(args.output).expanduser().resolve() if args.output else input_path
+        if previous_path != input_path and previous_path.is_file():
+            incremental.load(previous_path)
+
+    errors, value_columns = predictor.predict_rows(input_df[smiles_column].tolist(), property_names, incremental)
+
+    if input_kind == "smiles":
+        result = {"SMILES": input_df.iloc[0][smiles_column]}
+        if errors[0] is not None:
+            result["error"] = errors[0]
+        result["predictions"] = {name: value_columns[name][0] for name in property_names}
+        if args.fast_profile:
+            result["student_agreement"] = predictor.student_agreement(property_names)
+
+        message = json.dumps(result, ensure_ascii=False, indent=2)
+        if args.output:
+            output_path = Path(args.output).expanduser().resolve()
+            output_path.write_text(message, encoding="utf-8")
+            print(f"Results saved to: {output_path}")
+        else:
+            print(message)
+        if predictor.prediction_cache is not None:
+            print(predictor.prediction_cache.summary())
+        if args.memory_budget is not None:
+            print(format_peak_memory(predictor.device))
+        return
+
+    output_df = input_df.copy()
+    for name in property_names:
+        output_df[name] = value_columns[name]
+    if incremental is not None:
+        output_df[KEY_COLUMN] = incremental.row_keys(input_df[smiles_column].tolist())
+
+    output_path = Path(args.output).expanduser().resolve() if args.output else input_path
+    if output_path is None:
+        raise ValueError("No source file path found in CSV input to write back to.")
+
+    output_df.to_csv(output_path, index=False, encoding="utf-8-sig")
+    print(f"Task: {', '.join(property_names)}")
+    print(f"Type: regression")
+    print(f"Total entries:{len(output_df)}")
+    print(f"Valid entries:{sum(error is None for error in errors)}")
+    print(f"Result file:{output_path}")
+    print_summary(predictor, property_names, args, incremental)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (FileNotFoundError, ValueError, RuntimeError, TypeError) as exc:
+        print(str(exc))
+        raise SystemExit(1)
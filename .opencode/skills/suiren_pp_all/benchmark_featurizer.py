@@ -0,0 +1,120 @@
+"""
+Benchmark the array-based featurizer against org_mol2d.from_rdmol.
+
+SMILES are parsed once; both featurizers then run over the same RDKit
+molecules, so the reported molecules/second measure featurization alone.
+Every molecule is also checked for bit-identical x, edge_index, edge_attr
+and edge_index_all.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Sequence
+
+import pandas as pd
+import torch
+from rdkit import Chem, RDLogger
+
+from export_models import REFERENCE_SMILES
+from models.predictor import detect_smiles_column
+from suiren_datasets.fast_featurize import fast_from_rdmol
+from suiren_datasets.org_mol2d import from_rdmol
+
+# 设置标准输出编码为UTF-8
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+if sys.stderr.encoding != 'utf-8':
+    sys.stderr.reconfigure(encoding='utf-8')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Compare the throughput of the Suiren featurizers and check that they agree"
+    )
+    parser.add_argument(
+        "--smiles-file",
+        type=str,
+        default=None,
+        help="CSV file with the benchmark SMILES. If omitted, the built-in reference set is repeated.",
+    )
+    parser.add_argument(
+        "--smiles-column",
+        type=str,
+        default=None,
+        help="CSV column name containing SMILES. If omitted, the script auto-detects it.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1000,
+        help="Number of copies of the built-in reference set to featurize.",
+    )
+    parser.add_argument(
+        "--full-graph",
+        action="store_true",
+        help="Also build edge_index_all (the predict scripts skip it).",
+    )
+    return parser.parse_args()
+
+
+def load_molecules(args: argparse.Namespace) -> List[Chem.Mol]:
+    if args.smiles_file:
+        df = pd.read_csv(Path(args.smiles_file).expanduser())
+        smiles_list = df[detect_smiles_column(df, args.smiles_column)].dropna().astype(str).tolist()
+    else:
+        smiles_list = list(REFERENCE_SMILES) * args.repeat
+
+    RDLogger.DisableLog('rdApp.*')  # type: ignore
+    mols = [mol for mol in map(Chem.MolFromSmiles, smiles_list) if mol is not None]
+    if not mols:
+        raise ValueError("No valid SMILES to benchmark.")
+    return mols
+
+
+def timed(featurize: Callable, mols: Sequence[Chem.Mol], full_graph: bool):
+    start = time.perf_counter()
+    outputs = [featurize(mol, full_graph=full_graph) for mol in mols]
+    return outputs, time.perf_counter() - start
+
+
+def same_tensors(expected, actual) -> bool:
+    for expected_tensor, actual_tensor in zip(expected, actual):
+        if expected_tensor is None or actual_tensor is None:
+            if expected_tensor is not actual_tensor:
+                return False
+        elif expected_tensor.dtype != actual_tensor.dtype or not torch.equal(expected_tensor, actual_tensor):
+            return False
+    return True
+
+
+def main() -> None:
+    args = parse_args()
+    mols = load_molecules(args)
+    fast_from_rdmol(mols[0], full_graph=args.full_graph)  # warm-up
+
+    reference, reference_s = timed(from_rdmol, mols, args.full_graph)
+    fast, fast_s = timed(fast_from_rdmol, mols, args.full_graph)
+    mismatches = sum(not same_tensors(expected, actual) for expected, actual in zip(reference, fast))
+
+    report = {
+        "molecules": len(mols),
+        "full_graph": args.full_graph,
+        "from_rdmol_mol_per_s": len(mols) / reference_s if reference_s > 0 else None,
+        "fast_from_rdmol_mol_per_s": len(mols) / fast_s if fast_s > 0 else None,
+        "speedup": reference_s / fast_s if fast_s > 0 else None,
+        "mismatches": mismatches,
+    }
+    print(json.dumps(report, ensure_ascii=False))
+    if mismatches:
+        raise RuntimeError(f"fast_from_rdmol differs from from_rdmol on {mismatches} molecules")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (FileNotFoundError, ValueError, RuntimeError, TypeError) as exc:
+        print(str(exc))
+        raise SystemExit(1)
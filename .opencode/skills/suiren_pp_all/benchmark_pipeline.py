@@ -0,0 +1,480 @@
+"""
+Benchmark the stages of the Suiren prediction pipeline.
+
+Every SMILES set (synthetic molecules of fixed heavy-atom counts, and the
+rows of --smiles-file or the built-in reference set) is run through the pipeline of the predict scripts at
+every batch size, timing each stage on its own: featurization, collate,
+pretrained backbone, fine-tuned GNN, pooling and heads, and the CSV write.
+One JSON object per case reports molecules/second overall and per stage,
+p50/p99 single-molecule latency (featurize to prediction, batch size 1) and
+memory. Every case runs in a fresh process, since the peak RSS of a process
+never decreases: load_peak_rss_mb is its peak after loading the model and
+case_peak_rss_mb its peak at the end of the case, so the difference is
+what the case itself needed. With --trace, every GATConv layer is
+timed as well and the spans are written as a Chrome trace (chrome://tracing
+or Perfetto). --baseline compares molecules/second with an earlier --output
+report and fails on slowdowns beyond --max-slowdown.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import torch
+
+from export_models import REFERENCE_SMILES
+from models.finetune_model import standard_finetune
+from models.precision import PRECISIONS, apply_precision
+from models.predictor import (
+    build_graph,
+    detect_smiles_column,
+    load_model,
+    model_path_for,
+    peak_memory_mb,
+    resolve_device,
+)
+from suiren_datasets.compact import collate_molecules, iterate_batches
+
+# 设置标准输出编码为UTF-8
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+if sys.stderr.encoding != 'utf-8':
+    sys.stderr.reconfigure(encoding='utf-8')
+
+# Chain atoms of the synthetic molecules; every one is valid with two neighbours
+SYNTHETIC_ATOMS = ("C", "C", "C", "N", "O")
+STAGES = ("featurize", "collate", "pretrain", "finetune", "pool_head", "write")
+LAYER_PATTERN = re.compile(r"(pretrain|finetune)_model\.gnns\.\d+$")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Measure throughput, latency and memory of the Suiren prediction pipeline stage by stage"
+    )
+    parser.add_argument(
+        "--property",
+        type=str,
+        default="boiling_point",
+        help="Property whose checkpoint is benchmarked (all properties share the architecture).",
+    )
+    parser.add_argument(
+        "--random-weights",
+        action="store_true",
+        help="Benchmark a randomly initialized model of the same architecture instead of a checkpoint.",
+    )
+    parser.add_argument(
+        "--smiles-file",
+        type=str,
+        default=None,
+        help="CSV file with a real SMILES set to benchmark in addition to the synthetic ones. "
+        "If omitted, the built-in reference set is repeated to --molecules.",
+    )
+    parser.add_argument(
+        "--smiles-column",
+        type=str,
+        default=None,
+        help="CSV column name containing SMILES. If omitted, the script auto-detects it.",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=str,
+        default="8,16,32,64",
+        help="Comma-separated heavy-atom counts of the synthetic SMILES sets (empty: none).",
+    )
+    parser.add_argument(
+        "--molecules",
+        type=int,
+        default=512,
+        help="Molecules per synthetic set and of the repeated reference set.",
+    )
+    parser.add_argument(
+        "--batch-sizes",
+        type=str,
+        default="1,16,64",
+        help="Comma-separated batch sizes.",
+    )
+    parser.add_argument(
+        "--latency-samples",
+        type=int,
+        default=100,
+        help="Molecules per set timed one at a time for the latency percentiles.",
+    )
+    parser.add_argument(
+        "--max-batch-pairs",
+        type=int,
+        default=None,
+        help="Atom-pair budget per batch (see the predict scripts); replaces the batch sizes.",
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default="cpu",
+        choices=["auto", "cpu", "cuda"],
+        help="Device to benchmark.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="PyTorch intra-op threads (default: PyTorch's choice).",
+    )
+    parser.add_argument(
+        "--full-graph-mode",
+        type=str,
+        default="sparse",
+        choices=["sparse", "dense", "chunked"],
+        help="Execution mode of the full-connect attention stages.",
+    )
+    parser.add_argument(
+        "--precision",
+        type=str,
+        default="fp32",
+        choices=list(PRECISIONS),
+        help="Inference precision.",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        default=None,
+        help="Also time every GATConv layer and write all spans to this Chrome trace file.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Write the full report (environment and all cases) to this JSON file.",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Earlier --output report to compare molecules/second with.",
+    )
+    parser.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=0.1,
+        help="Largest allowed relative drop in molecules/second against --baseline.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the synthetic SMILES sets.",
+    )
+
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    args.batch_sizes = [int(size) for size in args.batch_sizes.split(",") if size.strip()]
+    if any(size <= 0 for size in args.sizes + args.batch_sizes):
+        parser.error("--sizes and --batch-sizes must be positive.")
+    if not args.batch_sizes:
+        parser.error("--batch-sizes must not be empty.")
+    if args.max_batch_pairs is not None:
+        if args.max_batch_pairs <= 0:
+            parser.error("--max-batch-pairs must be positive.")
+        args.batch_sizes = [args.batch_sizes[-1]]
+    return args
+
+
+def synthetic_smiles(num_atoms: int, count: int, seed: int) -> List[str]:
+    """Acyclic C/N/O molecules with exactly num_atoms heavy atoms and some methyl branches."""
+    rng = random.Random(seed * 1000003 + num_atoms)
+    smiles_list = []
+    for _ in range(count):
+        parts = ["C"]
+        for _ in range(num_atoms - 1):
+            if parts[-1] == "C" and rng.random() < 0.2:
+                parts.append("(C)")
+            else:
+                parts.append(rng.choice(SYNTHETIC_ATOMS))
+        smiles_list.append("".join(parts))
+    return smiles_list
+
+
+def smiles_sets(args: argparse.Namespace) -> Dict[str, List[str]]:
+    sets = {f"synthetic_{size}": synthetic_smiles(size, args.molecules, args.seed) for size in args.sizes}
+    if args.smiles_file:
+        df = pd.read_csv(Path(args.smiles_file).expanduser())
+        sets[Path(args.smiles_file).stem] = df[detect_smiles_column(df, args.smiles_column)].tolist()
+    else:
+        repeats = -(-args.molecules // len(REFERENCE_SMILES))
+        sets["reference"] = (list(REFERENCE_SMILES) * repeats)[:args.molecules]
+    return sets
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    # Nearest-rank percentile
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class SpanTimer:
+    """
+    Wall-clock spans of pipeline stages and of hooked model submodules.
+
+    The pretrained backbone, the fine-tuned GNN and, with layers=True, every
+    GATConv layer are timed by forward hooks; the remaining stages are timed
+    with span().
+    """
+
+    def __init__(self, model: torch.nn.Module, device: torch.device, layers: bool):
+        self.device = device
+        self.spans: List[Tuple[str, float, float]] = []
+        self._starts: Dict[str, float] = {}
+        for name, module in model.named_modules():
+            name = name[len("model."):] if name.startswith("model.") else name
+            if name in ("pretrain_model", "finetune_model") or (layers and LAYER_PATTERN.fullmatch(name)):
+                module.register_forward_pre_hook(self._pre_hook(name))
+                module.register_forward_hook(self._post_hook(name))
+
+    def now(self) -> float:
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+        return time.perf_counter()
+
+    def _pre_hook(self, name: str):
+        def hook(module, inputs):
+            self._starts[name] = self.now()
+        return hook
+
+    def _post_hook(self, name: str):
+        def hook(module, inputs, output):
+            self.add(name, self._starts.pop(name), self.now())
+        return hook
+
+    def add(self, name: str, start: float, end: float) -> None:
+        self.spans.append((name, start, end))
+
+    def total(self, name: str) -> float:
+        return sum(end - start for span_name, start, end in self.spans if span_name == name)
+
+    def layer_totals(self) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for name, start, end in self.spans:
+            if LAYER_PATTERN.fullmatch(name):
+                totals[name] = totals.get(name, 0.0) + end - start
+        return totals
+
+
+def run_case(
+    model: torch.nn.Module,
+    smiles_list: Sequence[str],
+    batch_size: int,
+    device: torch.device,
+    timer: SpanTimer,
+    args: argparse.Namespace,
+) -> Dict[str, object]:
+    full_graph_edges = args.full_graph_mode == "sparse"
+    timer.spans.clear()
+
+    start = timer.now()
+    records = [build_graph(smiles)[0] for smiles in smiles_list]
+    timer.add("featurize", start, timer.now())
+    valid = [record for record in records if record is not None]
+    if not valid:
+        raise ValueError("No valid SMILES in the benchmark set.")
+
+    with torch.no_grad():
+        model(collate_molecules(valid[:batch_size], full_graph_edges).to(device))  # warm-up
+        timer.spans = [span for span in timer.spans if span[0] == "featurize"]
+
+        predictions = []
+        batches = iterate_batches(valid, batch_size, full_graph_edges, args.max_batch_pairs)
+        while True:
+            start = timer.now()
+            item = next(batches, None)
+            if item is None:
+                break
+            batch = item[1].to(device)
+            timer.add("collate", start, timer.now())
+            start = timer.now()
+            predictions.extend(model(batch).view(-1).tolist())
+            timer.add("forward", start, timer.now())
+
+        latencies = []
+        for smiles in smiles_list[:args.latency_samples]:
+            start = time.perf_counter()
+            record, _ = build_graph(smiles)
+            if record is None:
+                continue
+            model(collate_molecules([record], full_graph_edges).to(device)).view(-1).tolist()  # includes the copy back
+            latencies.append(time.perf_counter() - start)
+
+    # Latency runs went through the hooks as well; keep only the throughput spans
+    forward_spans = [span for span in timer.spans if span[0] == "forward"]
+    last_forward_end = forward_spans[-1][2]
+    timer.spans = [span for span in timer.spans if span[1] <= last_forward_end]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_df = pd.DataFrame({"SMILES": [str(smiles) for smiles in smiles_list]})
+        values: List[Optional[float]] = [None] * len(records)
+        valid_rows = [idx for idx, record in enumerate(records) if record is not None]
+        for idx, value in zip(valid_rows, predictions):
+            values[idx] = value
+        output_df["value"] = values
+        start = timer.now()
+        output_df.to_csv(Path(tmp_dir) / "output.csv", index=False, encoding="utf-8-sig")
+        timer.add("write", start, timer.now())
+
+    seconds = {stage: timer.total(stage) for stage in ("featurize", "collate", "pretrain_model", "finetune_model", "write")}
+    seconds["pretrain"] = seconds.pop("pretrain_model")
+    seconds["finetune"] = seconds.pop("finetune_model")
+    seconds["pool_head"] = max(0.0, timer.total("forward") - seconds["pretrain"] - seconds["finetune"])
+    total_seconds = sum(seconds.values())
+
+    report: Dict[str, object] = {
+        "molecules": len(valid),
+        "mean_atoms": sum(int(record.x.size(0)) for record in valid) / len(valid),
+        "batch_size": None if args.max_batch_pairs is not None else batch_size,
+        "mol_per_s": len(valid) / total_seconds if total_seconds > 0 else None,
+        "stage_mol_per_s": {
+            stage: len(valid) / seconds[stage] if seconds[stage] > 0 else None for stage in STAGES
+        },
+        "stage_share": {
+            stage: seconds[stage] / total_seconds if total_seconds > 0 else None for stage in STAGES
+        },
+        "latency_p50_ms": None if not latencies else percentile(latencies, 50) * 1000,
+        "latency_p99_ms": None if not latencies else percentile(latencies, 99) * 1000,
+        "case_peak_rss_mb": peak_memory_mb(torch.device("cpu")),
+    }
+    if device.type == "cuda":
+        report["peak_cuda_mb"] = peak_memory_mb(device)
+    layer_totals = timer.layer_totals()
+    if layer_totals:
+        report["layer_ms"] = {name: value * 1000 for name, value in layer_totals.items()}
+    return report
+
+
+def measure_case(
+    args: argparse.Namespace,
+    set_name: str,
+    smiles_list: Sequence[str],
+    batch_size: int,
+) -> Tuple[Dict[str, object], List[Tuple[str, float, float]]]:
+    """Load the model and run one case; called in a fresh process per case (see main)."""
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    device = resolve_device(args.device)
+    model = load_benchmark_model(args, device)
+    load_peak = peak_memory_mb(torch.device("cpu"))
+    timer = SpanTimer(model, device, layers=args.trace is not None)
+    if device.type == "cuda":
+        torch.cuda.reset_peak_memory_stats(device)
+    case = {"set": set_name, **run_case(model, smiles_list, batch_size, device, timer, args)}
+    case["load_peak_rss_mb"] = load_peak
+    return case, timer.spans
+
+
+def trace_events(case: str, spans: Sequence[Tuple[str, float, float]], origin: float) -> List[Dict[str, object]]:
+    events = []
+    for name, start, end in spans:
+        # Layers nest inside their model stage; show them on their own row
+        tid = 1 if LAYER_PATTERN.fullmatch(name) else 0
+        events.append({
+            "name": name,
+            "cat": case,
+            "ph": "X",
+            "ts": (start - origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": 0,
+            "tid": tid,
+        })
+    return events
+
+
+def compare_with_baseline(cases: Sequence[Dict[str, object]], baseline_path: Path, max_slowdown: float) -> List[str]:
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    reference = {(case["set"], case["batch_size"]): case["mol_per_s"] for case in baseline["cases"]}
+    slower = []
+    for case in cases:
+        expected = reference.get((case["set"], case["batch_size"]))
+        if expected and case["mol_per_s"] is not None and case["mol_per_s"] < expected * (1 - max_slowdown):
+            slower.append(f"{case['set']}/batch {case['batch_size']}: {case['mol_per_s']:.1f} vs {expected:.1f} mol/s")
+    return slower
+
+
+def load_benchmark_model(args: argparse.Namespace, device: torch.device) -> torch.nn.Module:
+    if args.random_weights:
+        torch.manual_seed(args.seed)
+        model = standard_finetune(class_flag=False, class_num=2).to(device).eval()
+    else:
+        model, _ = load_model(model_path_for(args.property), device)
+    model.set_full_graph_mode(args.full_graph_mode)
+    return apply_precision(model, args.precision, device)
+
+
+def main() -> None:
+    args = parse_args()
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    device = resolve_device(args.device)
+
+    cases = []
+    events: List[Dict[str, object]] = []
+    # perf_counter is a system-wide monotonic clock, so the spans of the case processes line up
+    origin = time.perf_counter()
+    context = mp.get_context("spawn")
+    for set_name, smiles_list in smiles_sets(args).items():
+        for batch_size in args.batch_sizes:
+            # A fresh process per case, so that its peak RSS is not that of an earlier case
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                case, spans = executor.submit(measure_case, args, set_name, smiles_list, batch_size).result()
+            cases.append(case)
+            print(json.dumps(case, ensure_ascii=False), flush=True)
+            if args.trace:
+                events.extend(trace_events(f"{set_name}/batch {batch_size}", spans, origin))
+
+    report = {
+        "environment": {
+            "model": "random" if args.random_weights else args.property,
+            "device": str(device),
+            "precision": args.precision,
+            "full_graph_mode": args.full_graph_mode,
+            "threads": torch.get_num_threads(),
+            "cpu_count": os.cpu_count(),
+            "torch": torch.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "cases": cases,
+    }
+    if args.output:
+        output_path = Path(args.output).expanduser().resolve()
+        output_path.write_text(json.dumps(report, ensure_ascii=False, indent=1), encoding="utf-8")
+        print(f"Report saved to: {output_path}")
+    if args.trace:
+        trace_path = Path(args.trace).expanduser().resolve()
+        trace_path.write_text(json.dumps({"traceEvents": events}), encoding="utf-8")
+        print(f"Trace saved to: {trace_path}")
+    case_peaks = [case["case_peak_rss_mb"] for case in cases if case["case_peak_rss_mb"] is not None]
+    if case_peaks:
+        print(f"Largest case peak RSS: {max(case_peaks):.1f} MB")
+
+    if args.baseline:
+        slower = compare_with_baseline(cases, Path(args.baseline).expanduser(), args.max_slowdown)
+        if slower:
+            raise RuntimeError("Slower than the baseline:\n" + "\n".join(slower))
+        print(f"No case slower than the baseline by more than {args.max_slowdown:.0%}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (FileNotFoundError, ValueError, RuntimeError, TypeError) as exc:
+        print(str(exc))
+        raise SystemExit(1)
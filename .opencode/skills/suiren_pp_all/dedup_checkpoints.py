@@ -0,0 +1,131 @@
+"""
+Rewrite Suiren property checkpoints into a shared, content-addressed store.
+
+Every tensor of every requested checkpoint is hashed; tensors that are
+byte-identical across properties (the shared pretrained backbone) are
+written to the store once, and each property gets a manifest next to its
+checkpoint (see models/shared_store.py). The predict scripts load a
+property from its manifest when there is one, memory-mapping the shared
+tensors. Each manifest is reloaded and compared with its checkpoint before
+the original file may be removed.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict
+
+import torch
+
+from all_properties_predict import PROJECT_ROOT
+from models.checkpoint_integrity import verify_checkpoint
+from models.predictor import (
+    download_model_from_modelscope,
+    load_torch_file,
+    model_path_for,
+    normalize_state_dict,
+    parse_properties,
+    to_float,
+)
+from models.shared_store import load_manifest, manifest_path_for, store_checkpoint
+
+# 设置标准输出编码为UTF-8
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+if sys.stderr.encoding != 'utf-8':
+    sys.stderr.reconfigure(encoding='utf-8')
+
+DEFAULT_STORE_DIR = PROJECT_ROOT / "shared_weights"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Store the tensors of Suiren checkpoints once across properties"
+    )
+    parser.add_argument(
+        "--properties",
+        type=str,
+        default="all",
+        help="Comma-separated property names to convert, or 'all' for every Suiren property.",
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default=str(DEFAULT_STORE_DIR),
+        help="Directory of the shared tensor files.",
+    )
+    parser.add_argument(
+        "--remove-originals",
+        action="store_true",
+        help="Delete each <property>_regression.pt once its manifest reloads identical tensors.",
+    )
+    return parser.parse_args()
+
+
+def checkpoint_meta(meta) -> Dict[str, object]:
+    # Only norm_factor is read at load time; keep the manifest JSON-serializable
+    if isinstance(meta, dict) and "norm_factor" in meta:
+        norm_values = meta["norm_factor"]
+        if isinstance(norm_values, (list, tuple)) and len(norm_values) == 2:
+            return {"norm_factor": [to_float(value) for value in norm_values]}
+    return {}
+
+
+def convert_property(name: str, store_dir: Path, remove_original: bool) -> Dict[str, object]:
+    model_path = model_path_for(name)
+    if not model_path.is_file() and not download_model_from_modelscope(model_path):
+        raise FileNotFoundError(f"Model file not found and download failed: {model_path}")
+
+    print(f"Converting: {model_path}", flush=True)
+    verify_checkpoint(model_path, full=True)
+    state_dict, meta = normalize_state_dict(load_torch_file(model_path))
+    manifest_path = manifest_path_for(model_path)
+    total_bytes, written_bytes = store_checkpoint(state_dict, checkpoint_meta(meta), manifest_path, store_dir)
+
+    loaded, _ = load_manifest(manifest_path)
+    identical = loaded.keys() == state_dict.keys() and all(
+        loaded[key].dtype == state_dict[key].dtype and torch.equal(loaded[key], state_dict[key].cpu())
+        for key in state_dict
+    )
+    if not identical:
+        manifest_path.unlink()
+        raise RuntimeError(f"Manifest of {name} does not reproduce its checkpoint")
+    if remove_original:
+        model_path.unlink()
+
+    return {
+        "property": name,
+        "manifest": str(manifest_path),
+        "tensor_bytes": total_bytes,
+        "new_bytes": written_bytes,
+        "original_removed": remove_original,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    property_names = parse_properties(args.properties)
+    store_dir = Path(args.store).expanduser().resolve()
+
+    reports = []
+    for name in property_names:
+        report = convert_property(name, store_dir, args.remove_originals)
+        reports.append(report)
+        print(json.dumps(report, ensure_ascii=False), flush=True)
+
+    total = sum(report["tensor_bytes"] for report in reports)
+    stored = sum(path.stat().st_size for path in store_dir.glob("*.bin"))
+    print(f"Store: {store_dir}")
+    print(f"Checkpoint tensors:{total / 1024 ** 2:.1f} MB")
+    print(f"Stored tensors:{stored / 1024 ** 2:.1f} MB")
+    if total:
+        print(f"Saved:{1 - stored / total:.1%}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (FileNotFoundError, ValueError, RuntimeError, TypeError) as exc:
+        print(str(exc))
+        raise SystemExit(1)
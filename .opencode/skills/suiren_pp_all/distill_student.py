@@ -0,0 +1,334 @@
+"""
+Distill the Suiren property checkpoints into one multi-task student.
+
+1. The unlabeled SMILES corpus is featurized (optionally in a process pool).
+2. Every teacher (suiren_pp_<property> checkpoint) predicts the corpus;
+   teachers sharing a pretrained backbone share its pass per batch. The
+   labels are saved to --teacher-labels and reused by later runs over the
+   same corpus file (path, size and mtime) and the same teacher checkpoints
+   (their model keys, see suiren_datasets/incremental.py).
+3. The student (models/student.py) is trained on the normalized teacher
+   outputs with an MSE loss, holding out --val-fraction of the corpus.
+4. The weights with the lowest validation loss are saved together with
+   per-property agreement statistics against the teachers on the held-out
+   molecules, which all_properties_predict.py --fast-profile reports.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import torch
+import torch.nn.functional as F
+
+from all_properties_predict import DEFAULT_STUDENT_PATH
+from models.predictor import (
+    build_graph,
+    detect_smiles_column,
+    load_models,
+    model_path_for,
+    parse_properties,
+    resolve_device,
+    run_inference,
+)
+from models.shared_backbone import backbone_fingerprint, group_by_backbone
+from models.shared_store import resolve_checkpoint_file
+from models.student import STUDENT_CONFIG, agreement_statistics, save_student, student_model
+from suiren_datasets.compact import CompactMolecule, iterate_batches
+from suiren_datasets.incremental import model_key_for
+from suiren_datasets.parallel import FeaturizerPool, iter_featurized
+
+# 设置标准输出编码为UTF-8
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+if sys.stderr.encoding != 'utf-8':
+    sys.stderr.reconfigure(encoding='utf-8')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Train a multi-task Suiren student model on teacher predictions"
+    )
+    parser.add_argument(
+        "--smiles-file",
+        type=str,
+        required=True,
+        help="CSV file with the unlabeled distillation corpus.",
+    )
+    parser.add_argument(
+        "--smiles-column",
+        type=str,
+        default=None,
+        help="CSV column name containing SMILES. If omitted, the script auto-detects it.",
+    )
+    parser.add_argument(
+        "--properties",
+        type=str,
+        default="all",
+        help="Comma-separated property names the student covers, or 'all' for every Suiren property.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=str(DEFAULT_STUDENT_PATH),
+        help="Student checkpoint to write.",
+    )
+    parser.add_argument(
+        "--teacher-labels",
+        type=str,
+        default=None,
+        help="File caching the teacher predictions (default: next to --output).",
+    )
+    parser.add_argument(
+        "--epochs",
+        type=int,
+        default=30,
+        help="Training epochs.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=64,
+        help="Batch size for teacher inference and student training.",
+    )
+    parser.add_argument(
+        "--max-batch-pairs",
+        type=int,
+        default=None,
+        help="Atom-pair budget per batch (see the predict scripts).",
+    )
+    parser.add_argument(
+        "--lr",
+        type=float,
+        default=1e-3,
+        help="Initial learning rate (AdamW, cosine decay over the epochs).",
+    )
+    parser.add_argument(
+        "--val-fraction",
+        type=float,
+        default=0.05,
+        help="Fraction of the corpus held out for validation and agreement statistics.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the validation split, shuffling and initialization.",
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default="auto",
+        choices=["auto", "cpu", "cuda"],
+        help="Device to run on.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Number of processes for featurization (0: in the main process).",
+    )
+
+    args = parser.parse_args()
+    if args.epochs <= 0:
+        parser.error("--epochs must be positive.")
+    if not 0.0 < args.val_fraction < 1.0:
+        parser.error("--val-fraction must be between 0 and 1.")
+    if args.workers < 0:
+        parser.error("--workers must be non-negative.")
+    return args
+
+
+def load_corpus(args: argparse.Namespace) -> List[CompactMolecule]:
+    df = pd.read_csv(Path(args.smiles_file).expanduser())
+    smiles_list = df[detect_smiles_column(df, args.smiles_column)].tolist()
+    records: List[CompactMolecule] = []
+    pool = FeaturizerPool(args.workers) if args.workers else None
+    try:
+        for _, featurized in iter_featurized(smiles_list, build_graph, pool):
+            records.extend(record for record, _ in featurized if record is not None)
+    finally:
+        if pool is not None:
+            pool.close()
+    print(f"Corpus: {len(records)} valid of {len(smiles_list)} SMILES", flush=True)
+    if len(records) < 2:
+        raise ValueError("The distillation corpus needs at least two valid molecules.")
+    return records
+
+
+def teacher_keys(property_names: Sequence[str]) -> Optional[List[str]]:
+    """Model key of each teacher checkpoint, or None while one is not downloaded yet."""
+    model_files = [resolve_checkpoint_file(model_path_for(name)) for name in property_names]
+    if not all(model_file.is_file() for model_file in model_files):
+        return None
+    return [model_key_for(model_file, "eager/fp32") for model_file in model_files]
+
+
+def teacher_labels(
+    records: Sequence[CompactMolecule],
+    property_names: Sequence[str],
+    device: torch.device,
+    args: argparse.Namespace,
+) -> Tuple[torch.Tensor, Dict[str, Tuple[float, float]]]:
+    """
+    Normalized teacher predictions [num_molecules, num_properties] and the
+    teachers' norm_factors, loaded from --teacher-labels when they match.
+    """
+    labels_path = Path(args.teacher_labels).expanduser() if args.teacher_labels else \
+        Path(args.output).expanduser().with_suffix(".teacher.pt")
+    smiles_file = Path(args.smiles_file).expanduser().resolve()
+    stat = smiles_file.stat()
+    corpus = {
+        "smiles_file": str(smiles_file),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "molecules": len(records),
+    }
+    keys = teacher_keys(property_names)
+    if labels_path.is_file() and keys is not None:
+        cached = torch.load(labels_path, map_location="cpu")
+        if (
+            cached["corpus"] == corpus
+            and cached["properties"] == list(property_names)
+            and cached.get("teachers") == keys
+        ):
+            print(f"Teacher labels: {labels_path}", flush=True)
+            return cached["labels"], {name: tuple(value) for name, value in cached["norm_factors"].items()}
+
+    models = load_models(property_names, device)
+    # The checkpoints exist now (load_models downloads missing ones)
+    keys = teacher_keys(property_names)
+    fingerprints = {name: backbone_fingerprint(model) for name, (model, _) in models.items()}
+    start = time.perf_counter()
+    predictions = run_inference(
+        models=models,
+        data_list=records,
+        device=device,
+        batch_size=args.batch_size,
+        full_graph_edges=True,
+        max_batch_pairs=args.max_batch_pairs,
+        backbone_groups=group_by_backbone(fingerprints),
+    )
+    print(f"Teacher inference: {time.perf_counter() - start:.1f} s", flush=True)
+
+    norm_factors = {name: norm_factor or (0.0, 1.0) for name, (_, norm_factor) in models.items()}
+    labels = torch.stack([
+        (torch.tensor(predictions[name], dtype=torch.float32) - norm_factors[name][0]) / norm_factors[name][1]
+        for name in property_names
+    ], dim=1)
+    torch.save({
+        "corpus": corpus,
+        "properties": list(property_names),
+        "teachers": keys,
+        "labels": labels,
+        "norm_factors": {name: list(value) for name, value in norm_factors.items()},
+    }, labels_path)
+    print(f"Teacher labels saved to: {labels_path}", flush=True)
+    return labels, norm_factors
+
+
+def predict_normalized(model, records: Sequence[CompactMolecule], device: torch.device, args) -> torch.Tensor:
+    outputs = torch.empty(len(records), model.proj_2d_glob[-1].out_features)
+    model.eval()
+    with torch.no_grad():
+        for indices, batch in iterate_batches(records, args.batch_size, True, args.max_batch_pairs):
+            outputs[indices] = model(batch.to(device)).float().cpu()
+    return outputs
+
+
+def masked_mse(preds: torch.Tensor, targets: torch.Tensor) -> torch.Tensor:
+    # Teachers can produce non-finite values for out-of-domain molecules
+    mask = torch.isfinite(targets)
+    return F.mse_loss(preds[mask], targets[mask])
+
+
+def train_student(
+    records: Sequence[CompactMolecule],
+    labels: torch.Tensor,
+    device: torch.device,
+    args: argparse.Namespace,
+):
+    generator = torch.Generator().manual_seed(args.seed)
+    torch.manual_seed(args.seed)
+    perm = torch.randperm(len(records), generator=generator).tolist()
+    num_val = max(1, int(len(records) * args.val_fraction))
+    val_idx, train_idx = perm[:num_val], perm[num_val:]
+    val_records = [records[idx] for idx in val_idx]
+    if not torch.isfinite(labels[val_idx]).any():
+        raise ValueError(
+            f"None of the {num_val} held-out molecules has a finite teacher label; "
+            "use a larger --val-fraction or a different --seed."
+        )
+
+    model = student_model(labels.size(1)).to(device)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=args.lr, weight_decay=1e-4)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=args.epochs)
+
+    best_loss, best_state = float("inf"), None
+    for epoch in range(args.epochs):
+        model.train()
+        order = [train_idx[i] for i in torch.randperm(len(train_idx), generator=generator).tolist()]
+        epoch_records = [records[idx] for idx in order]
+        total, count = 0.0, 0
+        # Batches are formed from the shuffled order; with a pair budget they are size-bucketed
+        for indices, batch in iterate_batches(epoch_records, args.batch_size, True, args.max_batch_pairs):
+            targets = labels[[order[i] for i in indices]].to(device)
+            loss = masked_mse(model(batch.to(device)), targets)
+            optimizer.zero_grad()
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+            optimizer.step()
+            total += float(loss) * len(indices)
+            count += len(indices)
+        scheduler.step()
+
+        val_loss = float(masked_mse(predict_normalized(model, val_records, device, args), labels[val_idx]))
+        print(json.dumps({"epoch": epoch + 1, "train_loss": total / max(count, 1), "val_loss": val_loss}), flush=True)
+        if val_loss < best_loss:
+            best_loss = val_loss
+            best_state = {key: value.detach().clone() for key, value in model.state_dict().items()}
+
+    if best_state is None:
+        raise RuntimeError(
+            f"The validation loss was not finite in any of the {args.epochs} epochs; "
+            "the student diverged, try a lower --lr."
+        )
+    model.load_state_dict(best_state)
+    return model.eval(), val_idx
+
+
+def main() -> None:
+    args = parse_args()
+    property_names = parse_properties(args.properties)
+    device = resolve_device(args.device)
+
+    records = load_corpus(args)
+    labels, norm_factors = teacher_labels(records, property_names, device, args)
+    model, val_idx = train_student(records, labels, device, args)
+
+    preds = predict_normalized(model, [records[idx] for idx in val_idx], device, args)
+    agreement = {}
+    for column, name in enumerate(property_names):
+        mean, std = norm_factors[name]
+        teacher = labels[val_idx, column]
+        finite = torch.isfinite(teacher)
+        agreement[name] = agreement_statistics(
+            preds[finite, column] * std + mean, teacher[finite] * std + mean
+        )
+        print(json.dumps({"property": name, **agreement[name]}, ensure_ascii=False), flush=True)
+
+    output_path = Path(args.output).expanduser().resolve()
+    save_student(output_path, model.cpu(), STUDENT_CONFIG, property_names, norm_factors, agreement)
+    print(f"Student saved to: {output_path}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (FileNotFoundError, ValueError, RuntimeError, TypeError) as exc:
+        print(str(exc))
+        raise SystemExit(1)
@@ -0,0 +1,170 @@
+"""
+Export Suiren property checkpoints to TorchScript or ONNX artifacts.
+
+For every requested property the checkpoint is traced in the "sparse"
+full-graph mode and written next to it (see models/export.py for the file
+names), then reloaded and checked against the eager model on a reference
+SMILES set. The report lists the largest prediction deviation and the CPU
+speedup of the artifact over eager PyTorch; the predict scripts use the
+artifacts with --backend torchscript or --backend onnx.
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List, Sequence
+
+import torch
+
+from models.export import (
+    EXPORT_BACKENDS,
+    export_model,
+    exported_path_for,
+    load_exported_model,
+    max_abs_difference,
+)
+from models.predictor import build_graph, load_model, model_path_for, parse_properties
+from suiren_datasets.compact import CompactMolecule, collate_molecules, iterate_batches
+
+# 设置标准输出编码为UTF-8
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+if sys.stderr.encoding != 'utf-8':
+    sys.stderr.reconfigure(encoding='utf-8')
+
+
+# Small, size-diverse molecules using only the supported elements
+REFERENCE_SMILES = (
+    "C",
+    "O",
+    "CCO",
+    "CC(=O)O",
+    "c1ccccc1",
+    "CC(C)Cc1ccc(cc1)C(C)C(=O)O",
+    "CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+    "OC(=O)c1ccccc1OC(C)=O",
+    "FC(F)(F)c1ccc(Cl)cc1",
+    "BrCCBr",
+    "ICC(O)CO",
+    "CCOP(=S)(OCC)Oc1ccc(cc1)[N+](=O)[O-]",
+    "CS(=O)(=O)N1CCN(CC1)c1ccccn1",
+    "C[C@H](N)C(=O)N[C@@H](Cc1ccccc1)C(=O)O",
+    "CC1(C)SC2C(NC(=O)Cc3ccccc3)C(=O)N2C1C(=O)O",
+    "CCCCCCCCCCCCCCCCCCCC(=O)OCC(COC(=O)CCCCCCCCCCCCCCC)OC(=O)CCCCCCCCCCCCCCCCC",
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Export Suiren property models to TorchScript or ONNX and check parity with eager PyTorch"
+    )
+    parser.add_argument(
+        "--properties",
+        type=str,
+        default="all",
+        help="Comma-separated property names to export, or 'all' for every Suiren property.",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="torchscript",
+        choices=list(EXPORT_BACKENDS),
+        help="Artifact format.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="Batch size of the parity check and timing runs.",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=5,
+        help="Timed passes over the reference set for the speedup measurement.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-4,
+        help="Maximum allowed absolute deviation of the normalized predictions from the eager model.",
+    )
+    return parser.parse_args()
+
+
+def reference_molecules() -> List[CompactMolecule]:
+    records = []
+    for smiles in REFERENCE_SMILES:
+        record, error = build_graph(smiles)
+        if record is None:
+            raise RuntimeError(f"Reference SMILES {smiles} could not be featurized: {error}")
+        records.append(record)
+    return records
+
+
+def timed_predictions(model, batches: Sequence, repeats: int):
+    with torch.no_grad():
+        outputs = [model(batch) for batch in batches]  # warm-up, also the parity outputs
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for batch in batches:
+                model(batch)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / max(repeats, 1)
+    return outputs, elapsed_ms
+
+
+def export_property(name: str, records: List[CompactMolecule], args: argparse.Namespace) -> Dict[str, object]:
+    device = torch.device("cpu")
+    model_path = model_path_for(name)
+    print(f"Loading model: {model_path}", flush=True)
+    model, norm_factor = load_model(model_path, device)
+    model.set_full_graph_mode("sparse")
+
+    batches = [batch for _, batch in iterate_batches(records, args.batch_size)]
+    eager_outputs, eager_ms = timed_predictions(model, batches, args.repeats)
+
+    artifact_path = exported_path_for(model_path, args.backend)
+    export_model(model, collate_molecules(records), artifact_path, args.backend, norm_factor)
+    exported, _ = load_exported_model(artifact_path, args.backend, device)
+    exported_outputs, exported_ms = timed_predictions(exported, batches, args.repeats)
+
+    max_diff = max_abs_difference(eager_outputs, exported_outputs)
+    return {
+        "property": name,
+        "artifact": str(artifact_path),
+        "max_abs_diff": max_diff,
+        "parity": max_diff <= args.tolerance,
+        "eager_ms": eager_ms,
+        "exported_ms": exported_ms,
+        "speedup": eager_ms / exported_ms if exported_ms > 0 else None,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    property_names = parse_properties(args.properties)
+    records = reference_molecules()
+
+    reports = []
+    for name in property_names:
+        report = export_property(name, records, args)
+        reports.append(report)
+        print(json.dumps(report, ensure_ascii=False), flush=True)
+
+    failed = [report["property"] for report in reports if not report["parity"]]
+    print(f"Backend: {args.backend}")
+    print(f"Exported models:{len(reports)}")
+    if reports:
+        mean_speedup = sum(report["speedup"] or 0.0 for report in reports) / len(reports)
+        print(f"Mean speedup:{mean_speedup:.2f}x")
+    if failed:
+        raise RuntimeError(f"Parity check failed (tolerance {args.tolerance}): {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (FileNotFoundError, ValueError, RuntimeError, TypeError) as exc:
+        print(str(exc))
+        raise SystemExit(1)
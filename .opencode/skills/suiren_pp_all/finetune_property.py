@@ -0,0 +1,423 @@
+"""
+Fine-tune a Suiren property model on an in-house property set.
+
+1. The raw property CSV (SMILES, value) under --data-root/raw is processed
+   into sharded train / valid splits (suiren_datasets/dataset_shards.py) on
+   all cores; later runs reuse the processed shards.
+2. --ddp-procs processes train with DistributedDataParallel (gloo) on the
+   CPU cores, each with --threads-per-proc intra-op threads and
+   --loader-workers DataLoader processes that read and collate the shards.
+   Batches are size-bucketed within a shard, gradients are accumulated over
+   --accumulate batches, and --checkpoint-activations recomputes the GATConv
+   layers in the backward pass instead of keeping their activations.
+3. Targets are normalized with the mean and std of the train split. The
+   weights with the lowest validation loss are saved as
+   {"state_dict", "norm_factor"}, the checkpoint format that load_model of
+   the predict scripts reads.
+
+Every epoch prints a JSON line with the losses, the validation MAE, the
+training throughput in samples per second and the epoch time.
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn.functional as F
+from torch.distributed.algorithms.join import Join
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader
+
+from models.data_parallel import auto_layout, available_cores
+from models.finetune_model import standard_finetune
+from models.graph_NN import FULL_GRAPH_MODES, set_activation_checkpointing
+from models.predictor import PROPERTIES, load_model, model_path_for, resolve_device
+from suiren_datasets.dataset_shards import DEFAULT_SHARD_SIZE, ShardBatches, ShardedPP_smiles_2d
+
+# 设置标准输出编码为UTF-8
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+if sys.stderr.encoding != 'utf-8':
+    sys.stderr.reconfigure(encoding='utf-8')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Fine-tune a Suiren property model on a property CSV"
+    )
+    parser.add_argument(
+        "--data-root",
+        type=str,
+        required=True,
+        help="Dataset directory: raw/<property-name>.csv (columns SMILES, value), processed shards go to processed/.",
+    )
+    parser.add_argument(
+        "--property-name",
+        type=str,
+        required=True,
+        help="Name of the raw CSV without extension.",
+    )
+    parser.add_argument(
+        "--defined",
+        action="store_true",
+        help="The raw data is already split into <property-name>_train.csv and <property-name>_valid.csv.",
+    )
+    parser.add_argument(
+        "--ratio",
+        type=float,
+        default=0.8,
+        help="Train fraction of the random split (without --defined).",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="Checkpoint to write.",
+    )
+    parser.add_argument(
+        "--init",
+        type=str,
+        default=None,
+        help="Initial weights: a Suiren property name (its checkpoint, downloaded if missing) or a checkpoint "
+        "path. Without it the model starts from random weights.",
+    )
+    parser.add_argument(
+        "--epochs",
+        type=int,
+        default=30,
+        help="Training epochs.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=64,
+        help="Molecules per batch (ignored with --max-batch-pairs).",
+    )
+    parser.add_argument(
+        "--max-batch-pairs",
+        type=int,
+        default=None,
+        help="Atom-pair budget per batch instead of a fixed batch size (see the predict scripts).",
+    )
+    parser.add_argument(
+        "--accumulate",
+        type=int,
+        default=1,
+        help="Batches per optimizer step (gradient accumulation).",
+    )
+    parser.add_argument(
+        "--lr",
+        type=float,
+        default=1e-4,
+        help="Initial learning rate (AdamW, cosine decay over the epochs).",
+    )
+    parser.add_argument(
+        "--checkpoint-activations",
+        action="store_true",
+        help="Recompute the GATConv layers in the backward pass instead of storing their activations.",
+    )
+    parser.add_argument(
+        "--full-graph-mode",
+        type=str,
+        default="sparse",
+        choices=FULL_GRAPH_MODES,
+        help="Execution of the full-connect graph attention (see the predict scripts).",
+    )
+    parser.add_argument(
+        "--ddp-procs",
+        type=str,
+        default="1",
+        help="Data-parallel training processes on the CPU, or 'auto' to fill the cores.",
+    )
+    parser.add_argument(
+        "--threads-per-proc",
+        type=int,
+        default=None,
+        help="Intra-op threads of each training process (default: the cores divided among the processes).",
+    )
+    parser.add_argument(
+        "--loader-workers",
+        type=int,
+        default=2,
+        help="DataLoader processes per training process that load and collate shards (0: in the training process).",
+    )
+    parser.add_argument(
+        "--prepare-workers",
+        type=int,
+        default=None,
+        help="Featurization processes when the shards are built (default: all cores).",
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=DEFAULT_SHARD_SIZE,
+        help="Molecules per processed shard.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of shuffling and initialization.",
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default="auto",
+        choices=["auto", "cpu", "cuda"],
+        help="Device to train on. More than one --ddp-procs requires the CPU.",
+    )
+
+    args = parser.parse_args()
+    if args.epochs <= 0:
+        parser.error("--epochs must be positive.")
+    if args.batch_size <= 0:
+        parser.error("--batch-size must be positive.")
+    if args.max_batch_pairs is not None and args.max_batch_pairs <= 0:
+        parser.error("--max-batch-pairs must be positive.")
+    if args.accumulate <= 0:
+        parser.error("--accumulate must be positive.")
+    if not 0.0 < args.ratio < 1.0:
+        parser.error("--ratio must be between 0 and 1.")
+    if args.ddp_procs != "auto":
+        if not args.ddp_procs.isdigit() or int(args.ddp_procs) == 0:
+            parser.error("--ddp-procs must be a positive integer or 'auto'.")
+        args.ddp_procs = int(args.ddp_procs)
+    if args.threads_per_proc is not None and args.threads_per_proc <= 0:
+        parser.error("--threads-per-proc must be positive.")
+    if args.loader_workers < 0:
+        parser.error("--loader-workers must be non-negative.")
+    if args.ddp_procs != 1 and args.device == "cuda":
+        parser.error("--ddp-procs is only supported on the CPU.")
+    return args
+
+
+def open_split(split: str, args: argparse.Namespace) -> ShardedPP_smiles_2d:
+    return ShardedPP_smiles_2d(
+        args.data_root,
+        split,
+        args.property_name,
+        ratio=args.ratio,
+        defined=args.defined,
+        workers=args.prepare_workers,
+        shard_size=args.shard_size,
+    )
+
+
+def initial_state(init: Optional[str]) -> Optional[Dict[str, torch.Tensor]]:
+    if init is None:
+        return None
+    model_path = model_path_for(init) if init in PROPERTIES else Path(init).expanduser().resolve()
+    print(f"Initial weights: {model_path}", flush=True)
+    model, _ = load_model(model_path, torch.device("cpu"))
+    # Copies: the spawned training processes receive them through shared memory
+    return {key: value.detach().clone() for key, value in model.state_dict().items()}
+
+
+def with_last(items: Iterable) -> Iterator[Tuple[object, bool]]:
+    """Yield (item, is_last) pairs, looking one item ahead."""
+    iterator = iter(items)
+    try:
+        previous = next(iterator)
+    except StopIteration:
+        return
+    for item in iterator:
+        yield previous, False
+        previous = item
+    yield previous, True
+
+
+def keep_batch(item):
+    # ShardBatches yields collated batches already
+    return item
+
+
+def all_reduce_sum(values: torch.Tensor, distributed: bool) -> torch.Tensor:
+    if distributed:
+        dist.all_reduce(values, op=dist.ReduceOp.SUM)
+    return values
+
+
+def evaluate(model, batches: ShardBatches, norm_factor: Tuple[float, float], device, args, distributed: bool):
+    """(normalized MSE, MAE in property units, molecules) over the shards of all ranks."""
+    mean, std = norm_factor
+    totals = torch.zeros(3, dtype=torch.float64)
+    model.eval()
+    with torch.no_grad():
+        for batch, y in DataLoader(batches, batch_size=None, num_workers=args.loader_workers, collate_fn=keep_batch):
+            preds = model(batch.to(device)).view(-1).float().cpu()
+            targets = (y.float() - mean) / std
+            totals += torch.tensor([
+                float(F.mse_loss(preds, targets, reduction="sum")),
+                float((preds - targets).abs().sum()) * std,
+                len(y),
+            ], dtype=torch.float64)
+    totals = all_reduce_sum(totals, distributed)
+    count = max(float(totals[2]), 1.0)
+    return float(totals[0]) / count, float(totals[1]) / count, int(totals[2])
+
+
+def train_worker(
+    rank: int,
+    world_size: int,
+    threads: int,
+    norm_factor: Tuple[float, float],
+    init_state: Optional[Dict[str, torch.Tensor]],
+    args: argparse.Namespace,
+) -> None:
+    distributed = world_size > 1
+    if distributed:
+        dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    torch.set_num_threads(threads)
+    torch.manual_seed(args.seed)
+    device = torch.device("cpu") if distributed else resolve_device(args.device)
+
+    model = standard_finetune(class_flag=False, class_num=2)
+    if init_state is not None:
+        model.load_state_dict(init_state, strict=True)
+    model = model.to(device)
+    model.set_full_graph_mode(args.full_graph_mode)
+    set_activation_checkpointing(model, args.checkpoint_activations)
+    trained = DistributedDataParallel(model) if distributed else model
+
+    optimizer = torch.optim.AdamW(model.parameters(), lr=args.lr, weight_decay=1e-4)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=args.epochs)
+    full_graph_edges = args.full_graph_mode == "sparse"
+    train_batches = ShardBatches(
+        open_split("train", args), args.batch_size, args.max_batch_pairs, full_graph_edges,
+        shuffle=True, seed=args.seed, rank=rank, world_size=world_size,
+    )
+    valid_batches = ShardBatches(
+        open_split("valid", args), args.batch_size, args.max_batch_pairs, full_graph_edges,
+        shuffle=False, rank=rank, world_size=world_size,
+    )
+    mean, std = norm_factor
+
+    best_loss, best_state, best_epoch = math.inf, None, 0
+    for epoch in range(args.epochs):
+        train_batches.set_epoch(epoch)
+        model.train()
+        start = time.perf_counter()
+        totals = torch.zeros(2, dtype=torch.float64)
+        loader = DataLoader(train_batches, batch_size=None, num_workers=args.loader_workers, collate_fn=keep_batch)
+        # Ranks get different numbers of size-bucketed batches; Join shadows the
+        # gradient all-reduce of the ranks that run out first
+        with Join([trained]) if distributed else contextlib.nullcontext():
+            for step, ((batch, y), last) in enumerate(with_last(loader), start=1):
+                step_now = step % args.accumulate == 0 or last
+                targets = ((y.float() - mean) / std).to(device)
+                with trained.no_sync() if distributed and not step_now else contextlib.nullcontext():
+                    loss = F.mse_loss(trained(batch.to(device)).view(-1), targets)
+                    (loss / args.accumulate).backward()
+                if step_now:
+                    torch.nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+                    optimizer.step()
+                    optimizer.zero_grad()
+                totals += torch.tensor([float(loss) * len(y), len(y)], dtype=torch.float64)
+        scheduler.step()
+        totals = all_reduce_sum(totals, distributed)
+        epoch_s = time.perf_counter() - start
+
+        val_loss, val_mae, val_count = evaluate(model, valid_batches, norm_factor, device, args, distributed)
+        train_loss = float(totals[0]) / max(float(totals[1]), 1.0)
+        if val_count == 0:
+            val_loss = train_loss
+        if rank == 0:
+            print(json.dumps({
+                "epoch": epoch + 1,
+                "train_loss": train_loss,
+                "val_loss": val_loss,
+                "val_mae": val_mae if val_count else None,
+                "samples_per_s": round(float(totals[1]) / epoch_s, 1),
+                "epoch_s": round(epoch_s, 1),
+            }), flush=True)
+        if val_loss < best_loss:
+            best_loss, best_epoch = val_loss, epoch + 1
+            if rank == 0:
+                best_state = {key: value.detach().cpu().clone() for key, value in model.state_dict().items()}
+
+    if rank == 0:
+        output_path = Path(args.output).expanduser().resolve()
+        save_checkpoint(output_path, best_state, norm_factor, {
+            "property": args.property_name,
+            "epoch": best_epoch,
+            "val_loss": best_loss,
+        })
+        print(f"Best epoch: {best_epoch} (val_loss {best_loss:.6f})")
+        print(f"Checkpoint saved to: {output_path}")
+    if distributed:
+        dist.destroy_process_group()
+
+
+def save_checkpoint(
+    output_path: Path,
+    state_dict: Dict[str, torch.Tensor],
+    norm_factor: Tuple[float, float],
+    meta: Dict[str, object],
+) -> None:
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    # Written next to the target and moved into place, so a crash never leaves a partial checkpoint
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    torch.save({"state_dict": state_dict, "norm_factor": list(norm_factor), **meta}, tmp_path)
+    os.replace(tmp_path, output_path)
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main() -> None:
+    args = parse_args()
+
+    # Build the shards once, before any training process opens them
+    start = time.perf_counter()
+    train_set = open_split("train", args)
+    open_split("valid", args)
+    if len(train_set) == 0:
+        raise ValueError(f"No valid molecules in the train split of {args.property_name}.")
+    print(f"Train molecules: {len(train_set)} in {len(train_set.shard_files)} shards "
+          f"(prepared in {time.perf_counter() - start:.1f} s)", flush=True)
+
+    labels = train_set.labels()
+    std = float(labels.std()) if len(labels) > 1 else 1.0
+    norm_factor = (float(labels.mean()), std if std > 0 else 1.0)
+    init_state = initial_state(args.init)
+
+    world_size, threads = auto_layout(
+        available_cores(),
+        None if args.ddp_procs == "auto" else args.ddp_procs,
+        args.threads_per_proc,
+    )
+    print(f"Training: {world_size} processes x {threads} threads, {args.loader_workers} loader workers each",
+          flush=True)
+    readers = world_size * max(args.loader_workers, 1)
+    idle = ShardBatches(train_set, args.batch_size, args.max_batch_pairs, seed=args.seed).idle_readers(readers)
+    if idle:
+        print(f"Warning: {len(idle)} of {readers} data loaders get no training batch; use fewer --ddp-procs "
+              f"or --loader-workers, or a smaller --batch-size.", flush=True)
+
+    if world_size == 1:
+        train_worker(0, 1, threads, norm_factor, init_state, args)
+        return
+    os.environ.setdefault("MASTER_ADDR", "127.0.0.1")
+    os.environ.setdefault("MASTER_PORT", str(free_port()))
+    mp.spawn(train_worker, args=(world_size, threads, norm_factor, init_state, args), nprocs=world_size)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (FileNotFoundError, ValueError, RuntimeError, TypeError) as exc:
+        print(str(exc))
+        raise SystemExit(1)
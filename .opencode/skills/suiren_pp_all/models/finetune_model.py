@@ -0,0 +1,244 @@
+"""
+Molecular Property Prediction Model using Suiren Pre-trained and Fine-tuned GNN
+
+This module implements a transfer learning approach for molecular property prediction
+by combining pre-trained GNN embeddings with fine-tuned layers. The architecture
+supports both regression and classification tasks.
+
+Author: JunyiAn
+Date: 2026-02-28
+"""
+
+import torch
+import torch.nn as nn
+from models.graph_NN import GNN, set_full_graph_mode
+
+
+class PredictModel2D(torch.nn.Module):
+    """
+    2D Molecular Property Predictor with Transfer Learning
+
+    This model employs a two-stage approach:
+    1. Pre-trained GNN: Extracts general molecular representations
+    2. Fine-tuned GNN: Refines representations for specific property prediction
+
+    The overall pipeline:
+    - Extract node embeddings from pre-trained model (all layers)
+    - Process through fine-tuned model with pre-trained embedding conditioning
+    - Project node embeddings to latent space
+    - Aggregate to molecular level (graph pooling)
+    - Generate final prediction (regression or classification)
+
+    Args:
+        pretrain_num_layer (int): Number of layers in pre-trained model
+        finetune_num_layer (int): Number of layers in fine-tuned model
+        pretrain_embed_dim (int): Embedding dimension of pre-trained model
+        finetune_embed_dim (int): Embedding dimension of fine-tuned model
+        drop_ratio (float): Dropout ratio for regularization (default: 0.1)
+        d_proj (int): Projection dimension for latent space (default: 256)
+        class_num (int): Number of classes for classification (default: 2)
+        class_flag (bool): Whether to perform classification (True) or regression (False)
+                          (default: False)
+
+    Attributes:
+        pretrain_model (GNN): Pre-trained GNN model (returns all layer outputs)
+        finetune_model (GNN): Fine-tune GNN model
+        proj_2d (Sequential): Projection network for node embeddings to latent space
+        proj_2d_glob (Sequential): Global predictor from molecular representation
+    """
+
+    def __init__(self, 
+                 pretrain_num_layer,
+                 finetune_num_layer,
+                 pretrain_embed_dim,
+                 finetune_embed_dim,
+                 drop_ratio=0.1,
+                 d_proj=256, 
+                 class_num=2, 
+                 class_flag=False):
+
+        super().__init__()
+
+        # Average number of atoms used for normalization
+        self.avg_atom = 35.2160
+
+        # ========================================================================
+        # Pre-trained and Fine-tuned Models
+        # ========================================================================
+        # Pre-trained model extracts embeddings from all layers
+        self.pretrain_model = GNN(
+            num_layer=pretrain_num_layer,
+            emb_dim=pretrain_embed_dim,
+            drop_ratio=0.0,
+            output_type="layers"  # Return outputs from all layers
+        )
+
+        # Fine-tuned model refines representations with conditioning from pre-trained model
+        self.finetune_model = GNN(
+            num_layer=finetune_num_layer,
+            emb_dim=finetune_embed_dim,
+            drop_ratio=drop_ratio,
+            model_mode="finetune",
+            pretrain_emb_dim=pretrain_embed_dim,
+            pretrain_num_layer=pretrain_num_layer
+        )
+
+        # ========================================================================
+        # Projection Networks
+        # ========================================================================
+        # Node embedding projection to latent space
+        self.proj_2d = nn.Sequential(
+            nn.Linear(finetune_embed_dim, d_proj),
+            nn.SiLU(),
+            nn.Linear(d_proj, d_proj),
+            nn.SiLU(),
+            nn.Linear(d_proj, d_proj),
+        )
+
+        # Global prediction head (molecular level)
+        if class_flag:
+            # Classification task
+            self.proj_2d_glob = nn.Sequential(
+                nn.Linear(d_proj, d_proj),
+                nn.SiLU(),
+                nn.Linear(d_proj, class_num)
+            )
+        else:
+            # Regression task
+            self.proj_2d_glob = nn.Sequential(
+                nn.Linear(d_proj, d_proj),
+                nn.SiLU(),
+                nn.Linear(d_proj, 1)
+            )
+
+    def forward(self, data):
+        """
+        Forward pass of the model.
+
+        Args:
+            data: PyTorch Geometric Data object with attributes:
+                - x (Tensor): Node features
+                - edge_index (LongTensor): Local graph edges
+                - edge_index_all (LongTensor): Full-connect graph edges
+                  (may be absent or None in the "dense" and "chunked" full-graph modes)
+                - edge_attr (Tensor): Edge attributes
+                - batch (LongTensor): Batch assignment for nodes
+                - num_atoms (LongTensor, optional): Number of nodes of each graph;
+                  derived from batch if absent
+
+        Returns:
+            Tensor: Molecular level predictions
+                - Shape [batch_size, class_num] for classification
+                - Shape [batch_size, 1] for regression
+        """
+        return self.forward_from_embeddings(data, self.pretrain_embeddings(data))
+
+    def pretrain_embeddings(self, data):
+        """
+        Stage 1 of forward: node embeddings of all layers of the pre-trained model.
+
+        Models with identical pretrain_model weights give identical results, so
+        multi-property inference computes this once per batch for all of them
+        (see models/shared_backbone.py).
+        """
+        # ========================================================================
+        # Stage 1: Extract Pre-trained Embeddings
+        # ========================================================================
+        # Get embeddings from all layers of pre-trained model
+        return self.pretrain_model(
+            node_atom=data.x,
+            edge_index=data.edge_index,
+            edge_index_all=getattr(data, "edge_index_all", None),
+            edge_attr=data.edge_attr,
+            batch=data.batch
+        )
+
+    def forward_from_embeddings(self, data, reference_2d):
+        """
+        Stages 2-5 of forward, given the output of pretrain_embeddings.
+        """
+        edge_index_all = getattr(data, "edge_index_all", None)
+        num_atoms = getattr(data, "num_atoms", None)
+        if num_atoms is None:
+            num_atoms = torch.bincount(data.batch)
+
+        # ========================================================================
+        # Stage 2: Fine-tune with Pre-trained Embeddings
+        # ========================================================================
+        # Process through fine-tuned model with pre-trained embedding conditioning
+        outputs_2d = self.finetune_model(
+            node_atom=data.x,
+            edge_index=data.edge_index,
+            edge_index_all=edge_index_all,
+            edge_attr=data.edge_attr,
+            batch=data.batch,
+            extra_embedding=reference_2d
+        )
+
+        # ========================================================================
+        # Stage 3: Node-level Projection
+        # ========================================================================
+        # Project node embeddings to latent space
+        outputs_2d = self.proj_2d(outputs_2d)
+
+        # ========================================================================
+        # Stage 4: Graph-level Pooling and Normalization
+        # ========================================================================
+        # Aggregate node representations to molecular level using scatter mean
+        # (global_add_pool with the graph count taken from num_atoms, so it stays traceable)
+        pooled = torch.zeros(num_atoms.size(0), outputs_2d.size(1), dtype=outputs_2d.dtype, device=outputs_2d.device)
+        outputs_2d = pooled.index_add_(0, data.batch, outputs_2d) / self.avg_atom
+
+        # ========================================================================
+        # Stage 5: Molecular Prediction
+        # ========================================================================
+        # Generate final predictions
+        outputs_2d_final = self.proj_2d_glob(outputs_2d)
+
+        return outputs_2d_final
+
+    def set_full_graph_mode(self, mode, memory_budget_mb=None):
+        """
+        Select how the full-connect stages of all GATConv layers are executed.
+
+        Args:
+            mode (str): "sparse" (gather/scatter over edge_index_all),
+                        "dense" (padded batch tensors with masked softmax) or
+                        "chunked" (dense, split into target-node chunks for large molecules)
+            memory_budget_mb (float, optional): Pair-intermediate budget of the "chunked" mode
+        """
+        set_full_graph_mode(self, mode, memory_budget_mb)
+        return self
+
+
+def standard_finetune(class_num=2, class_flag=False):
+    """
+    Factory function to create a standard fine-tuned model with predefined architecture.
+
+    This function returns a PredictModel2D with commonly used hyperparameters
+    optimized for molecular property prediction.
+
+    Args:
+        class_num (int): Number of classes for classification task (default: 2)
+        class_flag (bool): Whether to perform classification (True) or regression (False)
+                          (default: False)
+
+    Returns:
+        PredictModel2D: Initialized model ready for fine-tuning
+
+    Model Architecture:
+        - Pre-trained: 12 layers with 256-dim embeddings
+        - Fine-tune: 16 layers with 256-dim embeddings
+        - Projection: 256-dim latent space
+        - Dropout: 0.1
+    """
+    return PredictModel2D(
+        pretrain_num_layer=12,
+        finetune_num_layer=16,
+        pretrain_embed_dim=256,
+        finetune_embed_dim=256,
+        drop_ratio=0.1,
+        d_proj=256,
+        class_num=class_num,
+        class_flag=class_flag,
+    )
\ No newline at end of file
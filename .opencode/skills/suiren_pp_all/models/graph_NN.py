@@ -0,0 +1,630 @@
+"""
+Molecular Graph Neural Network (GNN) Models for 2D Property Prediction
+
+This module provides implementation of Graph Attention Network (GAT) based GNN
+for molecular property prediction tasks. It includes pre-training and fine-tuning
+capabilities with multi-head attention mechanisms.
+
+Author: JunyiAn
+Date: 2026-02-28
+"""
+
+import torch
+import torch.nn as nn
+from torch_geometric.nn import MessagePassing
+from torch_geometric.utils import to_dense_batch
+from torch_geometric.nn import global_add_pool, global_mean_pool, global_max_pool, GlobalAttention, Set2Set
+import torch.nn.functional as F
+from torch.utils.checkpoint import checkpoint
+
+# ============================================================================
+# Global Configuration Constants for Molecular Features
+# ============================================================================
+NUM_ATOM_TYPE = 100  # Including extra mask tokens for pre-training
+NUM_CHIRALITY_TAG = 12  # Chirality information tags
+
+NUM_BOND_TYPE = 28  # Including aromatic and self-loop edges, and extra masked tokens
+NUM_BOND_DIRECTION = 10  # Bond direction types 
+
+# Execution modes for the full-connect graph stages of GATConv
+#   "sparse": gather/scatter over edge_index_all (reference implementation)
+#   "dense":  padded [B, Nmax, ...] tensors with masked softmax, no edge_index_all needed
+#   "chunked": like "dense", on sub-batches of consecutive graphs whose pair intermediates
+#              fit a memory budget; a graph too large on its own is processed in
+#              target-node chunks
+FULL_GRAPH_MODES = ("sparse", "dense", "chunked")
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+
+def scatter_softmax(src, index, num_nodes):
+    """
+    Softmax of src over the entries sharing the same index.
+
+    Same computation as torch_geometric.utils.softmax, written with plain torch
+    ops whose output sizes follow the input tensors, so the "sparse" path can
+    be traced and exported.
+
+    Args:
+        src (Tensor): Values of shape [num_edges, heads]
+        index (LongTensor): Group (target node) of each entry [num_edges]
+        num_nodes (int): Number of groups
+
+    Returns:
+        Tensor: Normalized values of shape [num_edges, heads]
+    """
+    scatter_index = index.unsqueeze(-1).expand_as(src)
+    src_max = torch.full((num_nodes, src.size(1)), float("-inf"), dtype=src.dtype, device=src.device)
+    src_max = src_max.scatter_reduce(0, scatter_index, src.detach(), reduce="amax", include_self=True)
+    out = (src - src_max.index_select(0, index)).exp()
+    out_sum = torch.zeros(num_nodes, src.size(1), dtype=src.dtype, device=src.device)
+    out_sum = out_sum.index_add_(0, index, out) + 1e-16
+    return out / out_sum.index_select(0, index)
+
+
+class GATConv(nn.Module):
+    """
+    Multi-head Graph Attention Convolution Layer with Full-Connect Graph Processing
+    
+    This layer implements a full-connect graph attention mechanism that:
+    1. Processes messages through local graph edges
+    2. Applies attention on the full-connect graph
+    3. Aggregates messages with residual connections
+    4. Uses layer normalization and activation functions for stability
+    
+    Args:
+        emb_dim (int): Embedding dimension of node features
+        heads (int): Number of attention heads (default: 2)
+        drop_ratio (float): Dropout ratio for regularization (default: 0.0)
+        negative_slope (float): Negative slope for LeakyReLU in attention (default: 0.2)
+        reduce_ratio (int): Channel reduction ratio for dimensionality reduction (default: 16)
+    """
+    
+    def __init__(self, emb_dim, heads=2, drop_ratio=0.0, negative_slope=0.2, reduce_ratio=16):
+        super(GATConv, self).__init__()
+
+        # Store configuration parameters
+        self.emb_dim = emb_dim
+        self.heads = heads
+        self.reduce_ratio = reduce_ratio
+        self.negative_slope = negative_slope
+
+        # Activation function and normalization layers
+        self.act = nn.SiLU()
+        self.norm1 = nn.LayerNorm(emb_dim)  # Normalization for local message computation
+        self.norm2 = nn.LayerNorm(emb_dim)  # Normalization for full-connect message computation
+        self.norm3 = nn.LayerNorm(emb_dim)  # Normalization for attention mechanism
+        self.norm4 = nn.LayerNorm(emb_dim)  # Normalization before feed-forward network
+
+        # Linear projections for local graph message passing
+        self.weight_linear1 = torch.nn.Linear(emb_dim, heads * emb_dim)  # Source node projection
+        self.weight_linear2 = torch.nn.Linear(emb_dim, heads * emb_dim)  # Target node projection
+
+        # Dimensionality reduction for full-connect graph processing
+        self.reduce_channel = emb_dim // self.reduce_ratio
+        self.weight_linear3 = torch.nn.Linear(emb_dim, heads * self.reduce_channel)  # Source node in FC graph
+        self.weight_linear4 = torch.nn.Linear(emb_dim, heads * self.reduce_channel)  # Target node in FC graph
+        self.weight_linear5 = torch.nn.Linear(self.reduce_channel, emb_dim)  # Projection back to full dimension
+
+        # Attention mechanism projections for full-connect graph
+        self.weight_linear_a1 = torch.nn.Linear(emb_dim, heads)  # Source attention weights
+        self.weight_linear_a2 = torch.nn.Linear(emb_dim, heads)  # Target attention weights
+        self.fc_attn = torch.nn.Linear(heads, heads)  # Attention aggregation
+
+        # Edge attribute embeddings
+        self.edge_embedding1 = torch.nn.Embedding(NUM_BOND_TYPE, heads * emb_dim)  # Bond type embedding
+        self.edge_embedding2 = torch.nn.Embedding(5, heads * emb_dim)  # Bond stereo embedding
+        self.edge_embedding3 = torch.nn.Embedding(NUM_BOND_DIRECTION, heads * emb_dim)  # Bond direction embedding
+
+        # Feed-forward network for residual update
+        self.FFN = nn.Sequential(nn.Linear(emb_dim, 4 * emb_dim),
+                                nn.SiLU(),
+                                nn.Linear(emb_dim * 4, emb_dim))
+        
+        # Scaling factor for full-connect graph contribution
+        self.scale = 0.01
+
+        # Dropout layer for regularization
+        self.dropout = torch.nn.Dropout(drop_ratio)
+
+        # Execution mode of the full-connect stages, see FULL_GRAPH_MODES
+        self.full_graph_mode = "sparse"
+        # Budget (bytes) for the pair intermediates of the "chunked" mode
+        self.memory_budget = DEFAULT_MEMORY_BUDGET_MB * 1024 * 1024
+
+        # Initialize embedding weights with Xavier uniform distribution
+        torch.nn.init.xavier_uniform_(self.edge_embedding1.weight.data)
+        torch.nn.init.xavier_uniform_(self.edge_embedding2.weight.data)
+        torch.nn.init.xavier_uniform_(self.edge_embedding3.weight.data)
+
+    def forward(self, x, edge_index, edge_index_all, edge_attr, batch=None):
+        """
+        Forward pass of GAT convolution with full-connect graph processing.
+        
+        Args:
+            x (Tensor): Node feature matrix of shape [num_nodes, emb_dim]
+            edge_index (LongTensor): Edge indices for local graph of shape [2, num_edges]
+            edge_index_all (LongTensor): Edge indices for full-connect graph of shape [2, num_edges_full]
+            edge_attr (Tensor): Edge attributes of shape [num_edges, num_attr_features]
+            batch (LongTensor, optional): Batch assignment for each node [num_nodes].
+                                          Only used by the "dense" and "chunked" full-graph modes.
+        
+        Returns:
+            Tensor: Updated node representations of shape [num_nodes, emb_dim]
+        """
+        # Get tensor dimensions
+        num_node, n_dim = x.shape
+        shortcut1 = x  # Store input for residual connection
+
+        # ========================================================================
+        # Stage 1: Local Graph Message Passing
+        # ========================================================================
+        x_norm = self.norm1(x)
+
+        # Add self-loops to the edge index
+        loop_index = torch.arange(num_node, dtype=edge_index.dtype, device=edge_index.device)
+        edge_index = torch.cat((edge_index, loop_index.unsqueeze(0).repeat(2, 1)), dim=1)
+
+        # Create edge attributes for self-loop edges
+        self_loop_attr = torch.zeros(x.size(0), 3, device=edge_attr.device, dtype=edge_attr.dtype)
+        self_loop_attr[:, 0] = 25  # Bond type ID 25 is reserved for self-loops
+        edge_attr = torch.cat((edge_attr, self_loop_attr), dim=0)
+
+        # Embed edge attributes using multiple embedding layers
+        edge_emb = (self.edge_embedding1(edge_attr[:, 0].long()) + 
+                   self.edge_embedding2(edge_attr[:, 1].long()) + 
+                   self.edge_embedding3(edge_attr[:, 2].long()))
+        edge_attr_embedded = edge_emb.view(-1, self.heads, self.emb_dim)
+
+        # Compute source and target node representations for messages
+        x_src = self.weight_linear1(x_norm).view(-1, self.heads, self.emb_dim)
+        x_tgt = self.weight_linear2(x_norm).view(-1, self.heads, self.emb_dim)
+        
+        x_i = x_src[edge_index[0]]  # Source nodes for all edges
+        x_j = x_tgt[edge_index[1]]  # Target nodes for all edges
+        
+        # Compute messages with edge embeddings and activation
+        message = self.act(x_i + x_j + edge_attr_embedded)
+        
+        # Combine multi-head messages
+        message_combined = message.mean(dim=1)
+
+        # Aggregate messages to target nodes
+        new_x = torch.zeros_like(x)
+        # Cast for reduced-precision autocast, where the Linear outputs are bfloat16
+        new_x = new_x.index_add_(0, edge_index[1], message_combined.to(new_x.dtype))
+
+        # ========================================================================
+        # Stages 2-3: Full-Connect Graph Messages and Attention
+        # ========================================================================
+        if self.full_graph_mode == "dense":
+            new_x_fc = self.full_graph_dense(x, batch)
+        elif self.full_graph_mode == "chunked":
+            new_x_fc = self.full_graph_chunked(x, batch)
+        else:
+            new_x_fc = self.full_graph_sparse(x, edge_index_all)
+
+        # ========================================================================
+        # Stage 4: Residual Connection and Feed-Forward Network
+        # ========================================================================
+        # Combine local and full-connect contributions with residual connection
+        new_x = new_x + self.scale * new_x_fc + shortcut1
+        shortcut2 = new_x
+        
+        # Apply normalization and feed-forward network
+        new_x = self.norm4(new_x)
+        new_x = self.FFN(new_x)
+        new_x = self.dropout(new_x)
+
+        # Return output with residual connection
+        return new_x + shortcut2
+
+    def full_graph_sparse(self, x, edge_index_all):
+        """
+        Full-connect stages computed edge-wise over edge_index_all.
+
+        Args:
+            x (Tensor): Node feature matrix of shape [num_nodes, emb_dim]
+            edge_index_all (LongTensor): Edge indices for full-connect graph of shape [2, num_edges_full]
+
+        Returns:
+            Tensor: Aggregated full-connect messages of shape [num_nodes, emb_dim]
+        """
+        num_node = x.size(0)
+
+        # Stage 2: Full-Connect Graph Processing
+        x_norm2 = self.norm2(x)
+        
+        # Compute dimensionality-reduced representations
+        x_src_fc = self.weight_linear3(x_norm2).view(-1, self.heads, self.reduce_channel)[edge_index_all[0]]
+        x_tgt_fc = self.weight_linear4(x_norm2).view(-1, self.heads, self.reduce_channel)[edge_index_all[1]]
+        
+        # Compute full-connect graph messages
+        fc_message = self.act(x_src_fc + x_tgt_fc)
+        fc_message = self.weight_linear5(fc_message)
+
+        # Stage 3: Attention Mechanism on Full-Connect Graph
+        x_norm3 = self.norm3(x)
+        
+        # Compute attention logits
+        attn_src = self.weight_linear_a1(x_norm3)[edge_index_all[0]]
+        attn_tgt = self.weight_linear_a2(x_norm3)[edge_index_all[1]]
+        fc_attn_logits = F.leaky_relu(attn_src + attn_tgt, self.negative_slope)
+        fc_attn_logits = self.fc_attn(fc_attn_logits)
+        
+        # Normalize attention weights using softmax
+        attn_weights = scatter_softmax(fc_attn_logits, edge_index_all[1], num_node).view(-1, self.heads, 1)
+
+        # Apply attention weights to messages
+        fc_message_weighted = fc_message * attn_weights
+        fc_message_final = fc_message_weighted.mean(dim=1)
+        
+        # Aggregate attention-weighted messages to target nodes
+        new_x_fc = torch.zeros(num_node, self.emb_dim, dtype=x.dtype, device=x.device)
+        new_x_fc = new_x_fc.index_add_(0, edge_index_all[1], fc_message_final.to(new_x_fc.dtype))
+
+        return new_x_fc
+
+    def full_graph_dense(self, x, batch=None):
+        """
+        Full-connect stages computed on padded [B, Nmax, ...] tensors.
+
+        Numerically equivalent to full_graph_sparse. Attention is a masked softmax
+        over the source axis, and since weight_linear5 is affine, the attention
+        weighted sum over sources is taken in the reduced channel space before
+        projecting back, so the largest intermediate is [B, Nmax, Nmax, heads,
+        emb_dim // reduce_ratio] instead of [num_edges_full, heads, emb_dim].
+
+        Args:
+            x (Tensor): Node feature matrix of shape [num_nodes, emb_dim]
+            batch (LongTensor, optional): Sorted batch assignment for each node [num_nodes].
+                                          All nodes form one graph if omitted.
+
+        Returns:
+            Tensor: Aggregated full-connect messages of shape [num_nodes, emb_dim]
+        """
+        if batch is None:
+            batch = torch.zeros(x.size(0), dtype=torch.long, device=x.device)
+
+        x_norm2, node_mask = to_dense_batch(self.norm2(x), batch)  # [B, N, C], [B, N]
+        x_norm3, _ = to_dense_batch(self.norm3(x), batch)
+        num_graph, max_node, _ = x_norm2.shape
+
+        # Valid (target, source) pairs: both real nodes and not a self pair
+        pair_mask = node_mask.unsqueeze(2) & node_mask.unsqueeze(1)
+        pair_mask = pair_mask & ~torch.eye(max_node, dtype=torch.bool, device=x.device)
+        pair_mask = pair_mask.unsqueeze(-1)  # [B, N_tgt, N_src, 1]
+
+        # Stage 2: reduced-channel pair messages [B, N_tgt, N_src, heads, reduce_channel]
+        src_fc = self.weight_linear3(x_norm2).view(num_graph, 1, max_node, self.heads, self.reduce_channel)
+        tgt_fc = self.weight_linear4(x_norm2).view(num_graph, max_node, 1, self.heads, self.reduce_channel)
+        fc_message = self.act(src_fc + tgt_fc)
+
+        # Stage 3: attention logits [B, N_tgt, N_src, heads], softmax over sources
+        attn_src = self.weight_linear_a1(x_norm3).unsqueeze(1)
+        attn_tgt = self.weight_linear_a2(x_norm3).unsqueeze(2)
+        fc_attn_logits = F.leaky_relu(attn_src + attn_tgt, self.negative_slope)
+        fc_attn_logits = self.fc_attn(fc_attn_logits)
+        fc_attn_logits = fc_attn_logits.masked_fill(~pair_mask, float("-inf"))
+        # Targets without any source (single-atom graphs, padding) give NaN rows; zero them
+        attn_weights = torch.softmax(fc_attn_logits, dim=2).masked_fill(~pair_mask, 0.0)
+
+        # sum_s w * (W5 m + b5) == W5 (sum_s w * m) + b5 * sum_s w
+        fc_agg = torch.einsum("btsh,btshr->bthr", attn_weights.to(fc_message.dtype), fc_message)
+        weight_sum = attn_weights.sum(dim=2).unsqueeze(-1)
+        fc_out = F.linear(fc_agg, self.weight_linear5.weight) + weight_sum * self.weight_linear5.bias
+        fc_out = fc_out.mean(dim=2)  # Combine heads: [B, N, emb_dim]
+
+        return fc_out[node_mask]
+
+    def full_graph_chunked(self, x, batch=None):
+        """
+        Full-connect stages with pair intermediates bounded by self.memory_budget.
+
+        If the padded pair tensors of the whole batch fit in the budget this is
+        full_graph_dense. Otherwise consecutive graphs are packed into sub-batches
+        whose padded pair tensors fit, each run with full_graph_dense. Only a graph
+        too large on its own is processed in chunks of target nodes sized so that
+        the [chunk, num_graph_nodes, heads, reduce_channel] intermediates stay
+        within the budget.
+
+        Args:
+            x (Tensor): Node feature matrix of shape [num_nodes, emb_dim]
+            batch (LongTensor, optional): Sorted batch assignment for each node [num_nodes].
+                                          All nodes form one graph if omitted.
+
+        Returns:
+            Tensor: Aggregated full-connect messages of shape [num_nodes, emb_dim]
+        """
+        num_node = x.size(0)
+        if batch is None:
+            batch = torch.zeros(num_node, dtype=torch.long, device=x.device)
+
+        # Live floats per (target, source) pair: pre-activation and activated messages, logits, weights
+        pair_bytes = self.heads * (2 * self.reduce_channel + 4) * x.element_size()
+        budget_pairs = max(1, int(self.memory_budget // pair_bytes))
+
+        counts = torch.bincount(batch)
+        max_node = int(counts.max()) if counts.numel() > 0 else 0
+        if counts.numel() * max_node * max_node <= budget_pairs:
+            return self.full_graph_dense(x, batch)
+
+        new_x_fc = torch.zeros(num_node, self.emb_dim, dtype=x.dtype, device=x.device)
+        sizes = counts.tolist()
+        ptr = [0] + torch.cumsum(counts, dim=0).tolist()
+        graph_idx = 0
+        while graph_idx < len(sizes):
+            if sizes[graph_idx] ** 2 > budget_pairs:
+                start, end = ptr[graph_idx], ptr[graph_idx + 1]
+                new_x_fc[start:end] = self.full_graph_target_chunks(x[start:end], budget_pairs)
+                graph_idx += 1
+                continue
+
+            # Pack the following graphs while their padded pair tensors fit
+            group_end, group_max = graph_idx, 0
+            while group_end < len(sizes):
+                next_max = max(group_max, sizes[group_end])
+                if (group_end - graph_idx + 1) * next_max * next_max > budget_pairs:
+                    break
+                group_end, group_max = group_end + 1, next_max
+            start, end = ptr[graph_idx], ptr[group_end]
+            new_x_fc[start:end] = self.full_graph_dense(x[start:end], batch[start:end] - batch[start])
+            graph_idx = group_end
+
+        return new_x_fc
+
+    def full_graph_target_chunks(self, x, budget_pairs):
+        """
+        Full-connect stages of a single graph, in chunks of at most
+        budget_pairs // num_nodes target nodes.
+
+        Args:
+            x (Tensor): Node feature matrix of one graph [num_nodes, emb_dim]
+            budget_pairs (int): Number of (target, source) pairs per chunk
+
+        Returns:
+            Tensor: Aggregated full-connect messages of shape [num_nodes, emb_dim]
+        """
+        num_node = x.size(0)
+        new_x_fc = torch.zeros(num_node, self.emb_dim, dtype=x.dtype, device=x.device)
+        if num_node < 2:
+            return new_x_fc  # No source node, the full-connect message is zero
+
+        x_norm2 = self.norm2(x)
+        x_norm3 = self.norm3(x)
+        src_fc = self.weight_linear3(x_norm2).view(1, num_node, self.heads, self.reduce_channel)
+        tgt_fc_all = self.weight_linear4(x_norm2).view(-1, self.heads, self.reduce_channel)
+        attn_src = self.weight_linear_a1(x_norm3).unsqueeze(0)  # [1, S, heads]
+        attn_tgt_all = self.weight_linear_a2(x_norm3)
+        src_ids = torch.arange(num_node, device=x.device)
+        chunk = max(1, budget_pairs // num_node)
+
+        for t_start in range(0, num_node, chunk):
+            t_end = min(t_start + chunk, num_node)
+
+            # Stage 2: reduced-channel pair messages [T, S, heads, reduce_channel]
+            fc_message = self.act(src_fc + tgt_fc_all[t_start:t_end].unsqueeze(1))
+
+            # Stage 3: attention over the sources of each target, excluding itself
+            fc_attn_logits = F.leaky_relu(attn_src + attn_tgt_all[t_start:t_end].unsqueeze(1), self.negative_slope)
+            fc_attn_logits = self.fc_attn(fc_attn_logits)
+            self_pair = (src_ids[t_start:t_end].unsqueeze(1) == src_ids.unsqueeze(0)).unsqueeze(-1)
+            fc_attn_logits = fc_attn_logits.masked_fill(self_pair, float("-inf"))
+            attn_weights = torch.softmax(fc_attn_logits, dim=1)
+
+            # Attention weights sum to one over the sources, see full_graph_dense
+            fc_agg = torch.einsum("tsh,tshr->thr", attn_weights.to(fc_message.dtype), fc_message)
+            fc_out = self.weight_linear5(fc_agg)
+            new_x_fc[t_start:t_end] = fc_out.mean(dim=1)
+
+        return new_x_fc
+
+
+class GNN(torch.nn.Module):
+    """
+    Graph Neural Network for Molecular Property Prediction
+    
+    A multi-layer GNN architecture that supports both pre-training and fine-tuning modes.
+    In fine-tuning mode, it can leverage pre-trained embeddings from a larger pre-trained model.
+    
+    Args:
+        num_layer (int): Number of GAT layers in the network
+        emb_dim (int): Embedding dimension for node features
+        drop_ratio (float): Dropout rate for regularization (default: 0)
+        output_type (str): Output mode - "last" returns final layer output, 
+                          "layers" returns outputs from all layers (default: "last")
+        model_mode (str): Training mode - "pretrain" or "finetune" (default: "pretrain")
+        pretrain_emb_dim (int): Embedding dimension of pre-trained model (default: 126)
+        pretrain_num_layer (int): Number of layers in pre-trained model (default: 12)
+    
+    Attributes:
+        gnns (ModuleList): List of GAT convolution layers
+        x_embedding1 (Embedding): Atom type embedding
+        x_embedding2 (Embedding): Atom chirality embedding
+        x_embedding3-5 (Embedding): Additional atom feature embeddings
+        fc_condition (ModuleList): Linear layers for conditioning in fine-tuning mode
+    """
+    
+    def __init__(self, num_layer, emb_dim, drop_ratio=0, output_type="last", 
+                 model_mode="pretrain", pretrain_emb_dim=126, pretrain_num_layer=12):
+        super(GNN, self).__init__()
+        
+        # Store configuration parameters
+        self.num_layer = num_layer
+        self.drop_ratio = drop_ratio
+        self.pretrain_num_layer = pretrain_num_layer
+        self.model_mode = model_mode
+        self.output_type = output_type
+        # Recompute each GATConv in the backward pass instead of keeping its
+        # activations (training only, see set_activation_checkpointing)
+        self.checkpoint_layers = False
+
+        # ========================================================================
+        # Input Validation
+        # ========================================================================
+        if self.num_layer < 2:
+            raise ValueError("Number of GNN layers must be greater than or equal to 2.")
+        
+        if self.model_mode not in ["pretrain", "finetune"]:
+            raise ValueError(f"model_mode must be 'pretrain' or 'finetune', got {self.model_mode}")
+        
+        if self.model_mode == "finetune" and self.num_layer < self.pretrain_num_layer:
+            raise ValueError(
+                f"In finetune mode, num_layer ({self.num_layer}) must be >= "
+                f"pretrain_num_layer ({self.pretrain_num_layer})"
+            )
+
+        # ========================================================================
+        # Node Feature Embeddings
+        # ========================================================================
+        # Primary atom feature embeddings
+        self.x_embedding1 = torch.nn.Embedding(NUM_ATOM_TYPE, emb_dim)  # Atom type
+        self.x_embedding2 = torch.nn.Embedding(NUM_CHIRALITY_TAG, emb_dim)  # Atom chirality
+        
+        # Auxiliary atom feature embeddings
+        self.x_embedding3 = torch.nn.Embedding(20, emb_dim)  # Additional feature 1
+        self.x_embedding4 = torch.nn.Embedding(10, emb_dim)  # Additional feature 2
+        self.x_embedding5 = torch.nn.Embedding(10, emb_dim)  # Additional feature 3
+        
+        # Feed-forward network for combining auxiliary embeddings
+        self.fc_embedding = nn.Sequential(
+            nn.Linear(emb_dim, emb_dim),
+            nn.SiLU(),
+            nn.Linear(emb_dim, emb_dim)
+        )
+
+        # Initialize embedding weights with Xavier uniform distribution
+        torch.nn.init.xavier_uniform_(self.x_embedding1.weight.data)
+        torch.nn.init.xavier_uniform_(self.x_embedding2.weight.data)
+        torch.nn.init.xavier_uniform_(self.x_embedding3.weight.data)
+        torch.nn.init.xavier_uniform_(self.x_embedding4.weight.data)
+        torch.nn.init.xavier_uniform_(self.x_embedding5.weight.data)
+
+        # ========================================================================
+        # Graph Attention Convolution Layers
+        # ========================================================================
+        self.gnns = torch.nn.ModuleList()
+        for _ in range(num_layer):
+            self.gnns.append(GATConv(emb_dim, drop_ratio=self.drop_ratio))
+        
+        # ========================================================================
+        # Fine-tuning Mode Specific Components
+        # ========================================================================
+        if self.output_type == "last" and self.model_mode == "finetune":
+            # Linear layers for conditioning the fine-tune model with pre-trained embeddings
+            self.fc_condition = nn.ModuleList()
+            for _ in range(pretrain_num_layer):
+                condition_layer = nn.Linear(pretrain_emb_dim, emb_dim, bias=False) if pretrain_emb_dim != emb_dim else nn.Identity()
+                self.fc_condition.append(
+                    condition_layer
+                )
+
+    def forward(self, node_atom, edge_index, edge_index_all, edge_attr, batch, extra_embedding=None):
+        """
+        Forward pass through the GNN layers.
+        
+        Args:
+            node_atom (Tensor): Node atom features of shape [num_nodes, num_features]
+                               Expected format: [atom_type, chirality, feature1, feature2, feature3]
+            edge_index (LongTensor): Edge indices for local graph [2, num_edges]
+            edge_index_all (LongTensor): Edge indices for full-connect graph [2, num_edges_full]
+            edge_attr (Tensor): Edge attributes [num_edges, 3]
+            batch (LongTensor): Batch assignment for each node [num_nodes]
+            extra_embedding (list of Tensor, optional): Pre-trained embeddings for fine-tuning.
+                                                       List of layer outputs from pre-trained model.
+        
+        Returns:
+            Tensor or List[Tensor]: 
+                - If output_type == "last": Node representations after final layer [num_nodes, emb_dim]
+                - If output_type == "layers": List of node representations from all layers
+        """
+        
+        # ========================================================================
+        # Stage 1: Node Feature Embedding
+        # ========================================================================
+        # Combine primary atom features (atom type + chirality)
+        x = self.x_embedding1(node_atom[:, 0]) + self.x_embedding2(node_atom[:, 1])
+        
+        # Process auxiliary atom features
+        extra_features = (self.x_embedding3(node_atom[:, 2]) + 
+                         self.x_embedding4(node_atom[:, 3]) + 
+                         self.x_embedding5(node_atom[:, 4]))
+        extra_features = self.fc_embedding(extra_features)
+        
+        # Combine all embeddings
+        x = x + extra_features
+        
+        # Initialize list for storing layer outputs if needed
+        if self.output_type == "layers":
+            h = []
+
+        # ========================================================================
+        # Stage 2: Multi-layer Graph Convolution
+        # ========================================================================
+        for layer_idx in range(self.num_layer):
+            # In fine-tuning mode, condition the network with pre-trained embeddings
+            if self.model_mode == "finetune":
+                if extra_embedding is not None and layer_idx < self.pretrain_num_layer:
+                    # Project pre-trained embedding to current dimension and add as residual
+                    condition_feature = self.fc_condition[layer_idx](extra_embedding[layer_idx])
+                    x = x + condition_feature
+            
+            # Apply graph attention convolution
+            if self.checkpoint_layers and self.training and torch.is_grad_enabled():
+                x = checkpoint(self.gnns[layer_idx], x, edge_index, edge_index_all, edge_attr, batch,
+                               use_reentrant=False)
+            else:
+                x = self.gnns[layer_idx](x, edge_index=edge_index, 
+                                         edge_index_all=edge_index_all, 
+                                         edge_attr=edge_attr,
+                                         batch=batch)
+            
+            # Store layer output if returning all layers
+            if self.output_type == "layers":
+                h.append(x)
+
+        # ========================================================================
+        # Return Results
+        # ========================================================================
+        if self.output_type == "layers":
+            return h
+        return x
+
+def set_full_graph_mode(model, mode, memory_budget_mb=None):
+    """
+    Select the execution mode of the full-connect stages for every GATConv in a model.
+
+    Args:
+        model (nn.Module): Any module containing GATConv layers
+        mode (str): One of FULL_GRAPH_MODES
+        memory_budget_mb (float, optional): Pair-intermediate budget of the "chunked" mode
+                                            (default: DEFAULT_MEMORY_BUDGET_MB)
+    """
+    if mode not in FULL_GRAPH_MODES:
+        raise ValueError(f"full graph mode must be one of {FULL_GRAPH_MODES}, got {mode}")
+    if memory_budget_mb is not None and memory_budget_mb <= 0:
+        raise ValueError(f"memory budget must be positive, got {memory_budget_mb}")
+    for module in model.modules():
+        if isinstance(module, GATConv):
+            module.full_graph_mode = mode
+            if memory_budget_mb is not None:
+                module.memory_budget = int(memory_budget_mb * 1024 * 1024)
+    return model
+
+def set_activation_checkpointing(model, enabled=True):
+    """
+    Enable or disable activation checkpointing of the GATConv layers of every GNN in a model.
+
+    Checkpointed layers store only their inputs during training and run
+    again in the backward pass, trading about one extra forward for the
+    attention and FFN activations of each layer.
+    """
+    for module in model.modules():
+        if isinstance(module, GNN):
+            module.checkpoint_layers = enabled
+    return model
+
+if __name__ == "__main__":
+    """
+    Main entry point for testing the GNN models.
+    """
+    pass
@@ -0,0 +1,197 @@
+"""
+Download and verify the Suiren property checkpoints ahead of time.
+
+Meant for container build or start: checkpoints are downloaded concurrently
+(see models/checkpoint_integrity.py for how each download is verified and
+moved into place), checkpoints already present are hashed and checked, and
+corrupt ones are downloaded again. Checkpoints converted by
+dedup_checkpoints.py have every shared tensor file hashed against its
+content address instead; a corrupt one is reported, since only converting
+a fresh download again can restore it. --checksums pins the expected SHA-256 of
+every file; --write-checksums records the verified ones in that format.
+After a successful run, SUIREN_OFFLINE=1 keeps the predict scripts off the
+network entirely. The exit status is non-zero if any checkpoint is missing
+or invalid afterwards.
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from models.checkpoint_integrity import DOWNLOAD_TIMEOUT_S, download_checkpoint, verify_checkpoint
+from models.predictor import model_path_for, parse_properties
+from models.shared_store import manifest_path_for, verify_manifest
+
+# 设置标准输出编码为UTF-8
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+if sys.stderr.encoding != 'utf-8':
+    sys.stderr.reconfigure(encoding='utf-8')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Download all Suiren checkpoints concurrently and verify their integrity"
+    )
+    parser.add_argument(
+        "--properties",
+        type=str,
+        default="all",
+        help="Comma-separated property names to prefetch, or 'all' for every Suiren property.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=8,
+        help="Concurrent downloads.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DOWNLOAD_TIMEOUT_S,
+        help="Timeout of one download in seconds.",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=2,
+        help="Further attempts after a failed download.",
+    )
+    parser.add_argument(
+        "--checksums",
+        type=str,
+        default=None,
+        help="Expected SHA-256 per checkpoint: sha256sum-style lines ('<sha256>  <file name>') "
+        "or a JSON object keyed by file or property name.",
+    )
+    parser.add_argument(
+        "--write-checksums",
+        type=str,
+        default=None,
+        help="Write the SHA-256 of every verified checkpoint to this file (sha256sum format).",
+    )
+    parser.add_argument(
+        "--verify-only",
+        action="store_true",
+        help="Only verify the checkpoints that are present; never download.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Download every checkpoint again, even if it verifies.",
+    )
+
+    args = parser.parse_args()
+    if args.jobs <= 0:
+        parser.error("--jobs must be positive.")
+    if args.retries < 0:
+        parser.error("--retries must be non-negative.")
+    if args.verify_only and args.force:
+        parser.error("--verify-only and --force are mutually exclusive.")
+    return args
+
+
+def load_checksums(path: Path) -> Dict[str, str]:
+    text = path.read_text(encoding="utf-8")
+    if text.lstrip().startswith("{"):
+        return {str(key): str(value).lower() for key, value in json.loads(text).items()}
+    checksums = {}
+    for line in text.splitlines():
+        if line.strip():
+            digest, name = line.split(maxsplit=1)
+            checksums[name.lstrip("*").strip()] = digest.lower()
+    return checksums
+
+
+def prefetch_property(name: str, expected_sha256: Optional[str], args: argparse.Namespace) -> Dict[str, object]:
+    model_path = model_path_for(name)
+    report: Dict[str, object] = {"property": name, "file": str(model_path), "sha256": None, "error": None}
+    start = time.perf_counter()
+
+    manifest_path = manifest_path_for(model_path)
+    if not model_path.is_file() and manifest_path.is_file():
+        # Converted by dedup_checkpoints.py; the predict scripts load the manifest
+        report["file"] = str(manifest_path)
+        try:
+            verify_manifest(manifest_path, full=True)
+            report["status"] = "shared"
+        except (OSError, ValueError, KeyError, RuntimeError) as exc:
+            report["status"] = "invalid"
+            report["error"] = (
+                f"{exc} Download {model_path.name} and run dedup_checkpoints.py --properties {name} again."
+            )
+        report["seconds"] = round(time.perf_counter() - start, 1)
+        return report
+
+    if model_path.is_file() and not args.force:
+        try:
+            report["sha256"] = verify_checkpoint(model_path, expected_sha256, full=True)
+            report["status"] = "present"
+            return report
+        except RuntimeError as exc:
+            report["error"] = str(exc)
+            if args.verify_only:
+                report["status"] = "invalid"
+                return report
+            print(f"{name}: {exc} Downloading it again.", flush=True)
+    elif args.verify_only:
+        report["status"] = "missing"
+        return report
+
+    for _ in range(args.retries + 1):
+        try:
+            report["sha256"] = download_checkpoint(model_path, expected_sha256, args.timeout)
+            report["status"] = "downloaded"
+            report["error"] = None
+            break
+        except (RuntimeError, OSError) as exc:
+            report["status"] = "failed"
+            report["error"] = str(exc)
+    report["seconds"] = round(time.perf_counter() - start, 1)
+    return report
+
+
+def main() -> None:
+    args = parse_args()
+    property_names = parse_properties(args.properties)
+    checksums = load_checksums(Path(args.checksums).expanduser()) if args.checksums else {}
+
+    def expected(name: str) -> Optional[str]:
+        return checksums.get(model_path_for(name).name, checksums.get(name))
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(prefetch_property, name, expected(name), args) for name in property_names]
+        reports = []
+        for future in futures:
+            report = future.result()
+            reports.append(report)
+            print(json.dumps(report, ensure_ascii=False), flush=True)
+
+    if args.write_checksums:
+        lines = [
+            f"{report['sha256']}  {Path(report['file']).name}"
+            for report in reports if report["sha256"] is not None
+        ]
+        output_path = Path(args.write_checksums).expanduser().resolve()
+        output_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        print(f"Checksums saved to: {output_path}")
+
+    counts: Dict[str, int] = {}
+    for report in reports:
+        counts[report["status"]] = counts.get(report["status"], 0) + 1
+    print("Checkpoints: " + ", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+    failed = [report["property"] for report in reports if report["status"] in ("failed", "invalid", "missing")]
+    if failed:
+        raise RuntimeError(f"Checkpoints not available: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (FileNotFoundError, ValueError, RuntimeError, TypeError) as exc:
+        print(str(exc))
+        raise SystemExit(1)
@@ -0,0 +1,203 @@
+"""
+Thin client for suiren_server.py.
+
+Reads a SMILES string or CSV path from stdin exactly like the
+suiren_pp_<property>/<property>_predict.py scripts and prints the same output,
+but forwards inference to a running server. Torch is never imported here, so a
+single-SMILES call costs one local round trip.
+"""
+
+import argparse
+import http.client
+import json
+import socket
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+# 设置标准输出编码为UTF-8
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+if sys.stderr.encoding != 'utf-8':
+    sys.stderr.reconfigure(encoding='utf-8')
+
+
+DEFAULT_SERVER = "http://127.0.0.1:8618"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Predict a molecular property through a running Suiren server"
+    )
+    parser.add_argument(
+        "--property",
+        type=str,
+        required=True,
+        help="Property name, e.g. boiling_point (same as the suiren_pp_<property> directory name).",
+    )
+    parser.add_argument(
+        "--server",
+        type=str,
+        default=DEFAULT_SERVER,
+        help="Server address: http://host:port or unix:///path/to/socket.",
+    )
+    parser.add_argument(
+        "--smiles-column",
+        type=str,
+        default=None,
+        help="CSV column name containing SMILES. If omitted, the script auto-detects it.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=600,
+        help="Request timeout in seconds.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Optional output file path. If not provided, the result will be printed to the terminal.",
+    )
+
+    args = parser.parse_args()
+    args.input = None
+
+    return args
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def open_connection(server: str, timeout: float) -> http.client.HTTPConnection:
+    parsed = urlparse(server)
+    if parsed.scheme == "unix":
+        return UnixHTTPConnection(parsed.path, timeout)
+    if parsed.scheme == "http":
+        return http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+    raise ValueError(f"Unsupported server address: {server}")
+
+
+def request_predictions(
+    server: str,
+    property_name: str,
+    smiles_list: List[str],
+    timeout: float,
+) -> List[Dict[str, object]]:
+    body = json.dumps({"property": property_name, "smiles": smiles_list}, ensure_ascii=False)
+    connection = open_connection(server, timeout)
+    try:
+        connection.request(
+            "POST",
+            "/predict",
+            body=body.encode("utf-8"),
+            headers={"Content-Type": "application/json; charset=utf-8"},
+        )
+        response = connection.getresponse()
+        payload = json.loads(response.read().decode("utf-8"))
+    except (ConnectionError, FileNotFoundError, socket.timeout) as exc:
+        raise RuntimeError(
+            f"Unable to reach the Suiren server at {server}: {exc}. "
+            f"Start it with: python suiren_server.py"
+        )
+    finally:
+        connection.close()
+
+    if response.status != 200:
+        raise RuntimeError(payload.get("error", f"Server returned HTTP {response.status}"))
+    return payload["results"]
+
+
+def detect_smiles_column(df, preferred: Optional[str] = None) -> str:
+    if preferred:
+        if preferred not in df.columns:
+            raise ValueError(f"The specified column does not exist in the CSV: {preferred}")
+        return preferred
+
+    exact_candidates = [
+        "SMILES",
+        "smiles",
+        "Smiles",
+        "canonical_smiles",
+        "Canonical_SMILES",
+    ]
+    for column in exact_candidates:
+        if column in df.columns:
+            return column
+
+    fuzzy_candidates = [column for column in df.columns if "smiles" in str(column).lower()]
+    if len(fuzzy_candidates) == 1:
+        return fuzzy_candidates[0]
+
+    if len(df.columns) == 1:
+        return df.columns[0]
+
+    raise ValueError(
+        "Unable to automatically identify the SMILES column. Please specify it explicitly using --smiles-column."
+    )
+
+
+def main() -> None:
+    args = parse_args()
+
+    if args.input is None:
+        try:
+            args.input = input().strip()
+        except EOFError:
+            raise ValueError("No input provided.")
+        if not args.input:
+            raise ValueError("Input cannot be empty.")
+
+    input_path = Path(args.input).expanduser()
+    if not input_path.is_file():
+        if input_path.suffix.lower() == ".csv":
+            raise FileNotFoundError(f"Input CSV not found: {input_path.resolve()}")
+
+        # Single SMILES: keep the client free of pandas/torch imports.
+        results = request_predictions(args.server, args.property, [args.input], args.timeout)
+        result = {"SMILES": args.input, "prediction": results[0]["prediction"]}
+
+        message = json.dumps(result, ensure_ascii=False, indent=2)
+        if args.output:
+            output_path = Path(args.output).expanduser().resolve()
+            output_path.write_text(message, encoding="utf-8")
+            print(f"Results saved to: {output_path}")
+        else:
+            print(message)
+        return
+
+    import pandas as pd
+
+    input_df = pd.read_csv(input_path)
+    smiles_column = detect_smiles_column(input_df, args.smiles_column)
+    smiles_list = ["" if pd.isna(value) else str(value) for value in input_df[smiles_column].tolist()]
+
+    results = request_predictions(args.server, args.property, smiles_list, args.timeout)
+    value_column: List[Optional[float]] = [record["prediction"] for record in results]
+
+    output_df = input_df.copy()
+    output_df["value"] = value_column
+
+    output_path = Path(args.output).expanduser().resolve() if args.output else input_path.resolve()
+    output_df.to_csv(output_path, index=False, encoding="utf-8-sig")
+    print(f"Task: {args.property}")
+    print(f"Type: regression")
+    print(f"Total entries:{len(output_df)}")
+    print(f"Result file:{output_path}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (FileNotFoundError, ValueError, RuntimeError, TypeError) as exc:
+        print(str(exc))
+        raise SystemExit(1)
@@ -0,0 +1,297 @@
+"""
+Resident Suiren inference server.
+
+Keeps property models warm in one process so that repeated skill calls do not
+pay the torch import and checkpoint loading cost on every request. Models are
+loaded lazily on first use and evicted in least-recently-used order once the
+configured memory cap is exceeded.
+
+Requests run through the same SuirenPredictor (models/predictor.py) as the
+predict scripts, so the options shared with them (backend, precision,
+full-graph mode, batch pair budget, feature and prediction caches,
+deduplication) give the same results. --fast-profile, --workers and
+--inference-workers are command-line only: the server answers one property
+per request and keeps its models in this process.
+
+Endpoints (JSON over HTTP, on localhost or a Unix socket):
+    GET  /health   -> {"status": "ok", "loaded": [...], "memory_mb": float}
+    POST /predict  <- {"property": "boiling_point", "smiles": ["CCO", ...]}
+                   -> {"property": ..., "results": [{"SMILES", "prediction", "error"}, ...]}
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+from models.export import EXPORT_BACKENDS
+from models.precision import PRECISIONS
+from models.predictor import PROPERTIES, SuirenPredictor, parse_properties
+from suiren_datasets.feature_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE_MB
+from suiren_datasets.prediction_cache import DEFAULT_CACHE_PATH
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8618
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Serve Suiren property predictions from a long-running process"
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        default=DEFAULT_HOST,
+        help="Host to bind the HTTP server to. Only localhost is recommended.",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_PORT,
+        help="Port to bind the HTTP server to.",
+    )
+    parser.add_argument(
+        "--unix-socket",
+        type=str,
+        default=None,
+        help="Serve on this Unix socket path instead of a TCP port.",
+    )
+    parser.add_argument(
+        "--max-memory-mb",
+        type=float,
+        default=4096,
+        help="Memory cap for resident model weights; least recently used models are evicted above it.",
+    )
+    parser.add_argument(
+        "--preload",
+        type=str,
+        default="",
+        help="Comma-separated property names (or 'all') to load at startup.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="Inference batch size for batch requests.",
+    )
+    parser.add_argument(
+        "--max-batch-pairs",
+        type=int,
+        default=None,
+        help="Form size-bucketed batches by a budget on the summed squared atom counts instead of a fixed "
+        "--batch-size.",
+    )
+    parser.add_argument(
+        "--device",
+        type=str,
+        default="auto",
+        choices=["auto", "cpu", "cuda"],
+        help="Inference device.",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="eager",
+        choices=["eager", *EXPORT_BACKENDS],
+        help="Inference backend: eager PyTorch, or a TorchScript / ONNX artifact created by "
+        "export_models.py (CPU only, sparse full-graph mode).",
+    )
+    parser.add_argument(
+        "--precision",
+        type=str,
+        default="fp32",
+        choices=list(PRECISIONS),
+        help="Inference precision of the eager backend: fp32, bf16 or int8.",
+    )
+    parser.add_argument(
+        "--full-graph-mode",
+        type=str,
+        default="sparse",
+        choices=["sparse", "dense", "chunked"],
+        help="Execution mode of the full-connect attention: sparse (edge-wise), dense (padded batch tensors) "
+        "or chunked (dense, split into target-node chunks under --memory-budget).",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        default=None,
+        help="Memory budget in MB for the full-connect attention intermediates of each layer. "
+        "Implies --full-graph-mode chunked.",
+    )
+    parser.add_argument(
+        "--feature-cache",
+        type=str,
+        nargs="?",
+        const=str(DEFAULT_CACHE_DIR),
+        default=None,
+        metavar="DIR",
+        help=f"Reuse featurized molecules from the persistent feature cache (default directory: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--feature-cache-size",
+        type=float,
+        default=DEFAULT_MAX_SIZE_MB,
+        help="Size limit of the feature cache in MB.",
+    )
+    parser.add_argument(
+        "--prediction-cache",
+        type=str,
+        nargs="?",
+        const=str(DEFAULT_CACHE_PATH),
+        default=None,
+        metavar="PATH",
+        help=f"Reuse earlier predictions stored in a SQLite file (default file: {DEFAULT_CACHE_PATH}).",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Predict each distinct molecule of a request (by canonical SMILES) once.",
+    )
+    args = parser.parse_args()
+    if args.memory_budget is not None:
+        if args.memory_budget <= 0:
+            parser.error("--memory-budget must be positive.")
+        args.full_graph_mode = "chunked"
+    if args.max_batch_pairs is not None and args.max_batch_pairs <= 0:
+        parser.error("--max-batch-pairs must be positive.")
+    if args.feature_cache_size <= 0:
+        parser.error("--feature-cache-size must be positive.")
+    if args.backend != "eager" and args.full_graph_mode != "sparse":
+        parser.error("--backend torchscript/onnx only supports the sparse full-graph mode.")
+    if args.backend != "eager" and args.precision != "fp32":
+        parser.error("--precision is only supported with --backend eager.")
+    return args
+
+
+def predict_smiles(
+    predictor: SuirenPredictor,
+    property_name: str,
+    smiles_list: Sequence[str],
+) -> List[Dict[str, object]]:
+    if property_name not in PROPERTIES:
+        raise ValueError(f"Unknown property: {property_name}")
+    errors, value_columns = predictor.predict_rows(smiles_list, [property_name])
+    return [
+        {"SMILES": smiles, "prediction": value, "error": error}
+        for smiles, value, error in zip(smiles_list, value_columns[property_name], errors)
+    ]
+
+
+class SuirenRequestHandler(BaseHTTPRequestHandler):
+    server_version = "SuirenServer/1.0"
+
+    def log_message(self, format, *args):
+        print(f"[{time.strftime('%H:%M:%S')}] {format % args}", flush=True)
+
+    def _send_json(self, status: int, payload: Dict[str, object]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+            return
+        predictor: SuirenPredictor = self.server.predictor
+        self._send_json(200, {
+            "status": "ok",
+            "loaded": predictor.loaded(),
+            "memory_mb": predictor.memory_bytes() / (1024 * 1024),
+        })
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+            property_name = request["property"]
+            smiles = request["smiles"]
+            if isinstance(smiles, str):
+                smiles = [smiles]
+        except (ValueError, KeyError, TypeError) as exc:
+            self._send_json(400, {"error": f"Malformed request: {exc}"})
+            return
+
+        start = time.perf_counter()
+        try:
+            results = predict_smiles(self.server.predictor, property_name, smiles)
+        except (FileNotFoundError, ValueError, RuntimeError, TypeError) as exc:
+            self._send_json(400, {"error": str(exc)})
+            return
+
+        self._send_json(200, {
+            "property": property_name,
+            "results": results,
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+        })
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) style client address.
+        return request, ("unix", 0)
+
+
+def main() -> None:
+    args = parse_args()
+    predictor = SuirenPredictor(
+        device=args.device,
+        batch_size=args.batch_size,
+        max_batch_pairs=args.max_batch_pairs,
+        full_graph_mode=args.full_graph_mode,
+        memory_budget_mb=args.memory_budget,
+        backend=args.backend,
+        precision=args.precision,
+        feature_cache=args.feature_cache,
+        feature_cache_size_mb=args.feature_cache_size,
+        prediction_cache=args.prediction_cache,
+        dedup=args.dedup,
+        max_memory_mb=args.max_memory_mb,
+    )
+
+    if args.preload.strip():
+        for name in parse_properties(args.preload):
+            predictor.load([name])
+
+    if args.unix_socket:
+        socket_path = Path(args.unix_socket).expanduser()
+        if socket_path.exists():
+            os.unlink(socket_path)
+        server = UnixHTTPServer(str(socket_path), SuirenRequestHandler)
+        address = f"unix://{socket_path}"
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), SuirenRequestHandler)
+        address = f"http://{args.host}:{args.port}"
+
+    server.predictor = predictor
+    print(f"Suiren server listening on {address}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        predictor.close()
+        if args.unix_socket and socket_path.exists():
+            os.unlink(socket_path)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (FileNotFoundError, ValueError, RuntimeError, TypeError) as exc:
+        print(str(exc))
+        raise SystemExit(1)
@@ -0,0 +1,183 @@
+"""
+Compare reduced-precision Suiren inference against fp32.
+
+For every requested property, predictions on a reference SMILES set are made
+in fp32 and in each reduced-precision mode (see models/precision.py). The
+report gives the maximum and mean absolute deviation in property units, the
+maximum deviation relative to the property's normalization std, and the run
+time relative to fp32, so that properties can be marked safe to run quantized.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import pandas as pd
+import torch
+
+from export_models import REFERENCE_SMILES
+from models.precision import PRECISIONS, apply_precision
+from models.predictor import (
+    build_graph,
+    detect_smiles_column,
+    load_model,
+    model_path_for,
+    parse_properties,
+)
+from suiren_datasets.compact import CompactMolecule, iterate_batches
+
+# 设置标准输出编码为UTF-8
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+if sys.stderr.encoding != 'utf-8':
+    sys.stderr.reconfigure(encoding='utf-8')
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Report the deviation of bf16 / int8 Suiren predictions from fp32"
+    )
+    parser.add_argument(
+        "--properties",
+        type=str,
+        default="all",
+        help="Comma-separated property names to validate, or 'all' for every Suiren property.",
+    )
+    parser.add_argument(
+        "--precisions",
+        type=str,
+        default="bf16,int8",
+        help="Comma-separated reduced-precision modes to compare against fp32.",
+    )
+    parser.add_argument(
+        "--smiles-file",
+        type=str,
+        default=None,
+        help="CSV file with the reference SMILES. If omitted, a built-in reference set is used.",
+    )
+    parser.add_argument(
+        "--smiles-column",
+        type=str,
+        default=None,
+        help="CSV column name containing SMILES. If omitted, the script auto-detects it.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=32,
+        help="Inference batch size.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.01,
+        help="A mode is reported safe for a property if its maximum deviation is at most this "
+        "fraction of the property's normalization std.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Optional CSV file for the report.",
+    )
+
+    args = parser.parse_args()
+    args.precisions = [name.strip() for name in args.precisions.split(",") if name.strip()]
+    for name in args.precisions:
+        if name not in PRECISIONS or name == "fp32":
+            parser.error(f"Unknown reduced-precision mode: {name}")
+    return args
+
+
+def reference_records(args: argparse.Namespace) -> List[CompactMolecule]:
+    if args.smiles_file:
+        df = pd.read_csv(Path(args.smiles_file).expanduser())
+        smiles_list = df[detect_smiles_column(df, args.smiles_column)].tolist()
+    else:
+        smiles_list = list(REFERENCE_SMILES)
+
+    records = [record for record, _ in map(build_graph, smiles_list) if record is not None]
+    if not records:
+        raise ValueError("No valid reference SMILES.")
+    return records
+
+
+def predict(model, norm_factor, batches: Sequence) -> torch.Tensor:
+    outputs = []
+    with torch.no_grad():
+        for batch in batches:
+            preds = model(batch).view(-1).float()
+            if norm_factor is not None:
+                mean, std = norm_factor
+                preds = preds * std + mean
+            outputs.append(preds)
+    return torch.cat(outputs)
+
+
+def timed_predict(model, norm_factor, batches: Sequence):
+    start = time.perf_counter()
+    preds = predict(model, norm_factor, batches)
+    return preds, (time.perf_counter() - start) * 1000
+
+
+def validate_property(name: str, batches: Sequence, args: argparse.Namespace) -> List[Dict[str, object]]:
+    device = torch.device("cpu")
+    model_path = model_path_for(name)
+    print(f"Loading model: {model_path}", flush=True)
+    model, norm_factor = load_model(model_path, device)
+
+    predict(model, norm_factor, batches[:1])  # warm-up
+    reference, reference_ms = timed_predict(model, norm_factor, batches)
+    scale = norm_factor[1] if norm_factor is not None else 1.0
+
+    reports = []
+    for precision in args.precisions:
+        reduced_model = apply_precision(model, precision, device)
+        predict(reduced_model, norm_factor, batches[:1])
+        preds, elapsed_ms = timed_predict(reduced_model, norm_factor, batches)
+        deviation = (preds - reference).abs()
+        max_dev = float(deviation.max())
+        reports.append({
+            "property": name,
+            "precision": precision,
+            "molecules": int(reference.numel()),
+            "max_abs_dev": max_dev,
+            "mean_abs_dev": float(deviation.mean()),
+            "max_dev_over_std": max_dev / abs(scale) if scale else None,
+            "safe": scale != 0 and max_dev / abs(scale) <= args.threshold,
+            "speedup": reference_ms / elapsed_ms if elapsed_ms > 0 else None,
+        })
+    return reports
+
+
+def main() -> None:
+    args = parse_args()
+    property_names = parse_properties(args.properties)
+    records = reference_records(args)
+    batches = [batch for _, batch in iterate_batches(records, args.batch_size)]
+
+    reports: List[Dict[str, object]] = []
+    for name in property_names:
+        for report in validate_property(name, batches, args):
+            reports.append(report)
+            print(json.dumps(report, ensure_ascii=False), flush=True)
+
+    for precision in args.precisions:
+        safe = [report["property"] for report in reports if report["precision"] == precision and report["safe"]]
+        print(f"Safe for {precision} ({len(safe)}/{len(property_names)}): {', '.join(safe)}")
+
+    if args.output:
+        output_path = Path(args.output).expanduser().resolve()
+        pd.DataFrame(reports).to_csv(output_path, index=False, encoding="utf-8-sig")
+        print(f"Result file:{output_path}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except (FileNotFoundError, ValueError, RuntimeError, TypeError) as exc:
+        print(str(exc))
+        raise SystemExit(1)
@@ -1,17 +1,21 @@
 import argparse
+import atexit
 import json
+import os
 import sys
-import subprocess
 from pathlib import Path
-from typing import Dict, List, Optional, Sequence, Tuple
+from typing import Optional, TextIO
 
 import pandas as pd
-import torch
-from torch_geometric.data import Data
-from torch_geometric.loader import DataLoader
 
-from models.finetune_model import standard_finetune
-from suiren_datasets.org_mol2d import from_smiles
+from models.export import EXPORT_BACKENDS
+from models.precision import PRECISIONS
+from models.predictor import SuirenPredictor, detect_smiles_column, format_peak_memory, load_inputs
+from suiren_datasets.feature_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_SIZE_MB
+from suiren_datasets.incremental import KEY_COLUMN, IncrementalScores
+from suiren_datasets.micro_batch import DEFAULT_FLUSH_MS, DEFAULT_FLUSH_SIZE, iter_micro_batches
+from suiren_datasets.prediction_cache import DEFAULT_CACHE_PATH
+from suiren_datasets.streaming import DEFAULT_CHUNK_ROWS, stream_csv
 
 # 设置标准输出编码为UTF-8
 if sys.stdout.encoding != 'utf-8':
@@ -20,9 +24,10 @@ if sys.stderr.encoding != 'utf-8':
     sys.stderr.reconfigure(encoding='utf-8')
 
 
-PROJECT_ROOT = Path(__file__).resolve().parent
-MODEL_PATH = PROJECT_ROOT / "boiling_point_regression.pt"
-ALLOWED_ELEMENTS = {1, 6, 7, 8, 9, 15, 16, 17, 35, 53}
+# Prediction runs through models/predictor.py, which finds the checkpoint at
+# suiren_pp_boiling_point/boiling_point_regression.pt next to this script
+PROPERTY = "boiling_point"
+
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -40,6 +45,13 @@ def parse_args() -> argparse.Namespace:
         default=32,
         help="Inference batch size for CSV input.",
     )
+    parser.add_argument(
+        "--max-batch-pairs",
+        type=int,
+        default=None,
+        help="Form size-bucketed batches by a budget on the summed squared atom counts instead of a fixed "
+        "--batch-size. Molecules are grouped by size and results are returned in input order.",
+    )
     parser.add_argument(
         "--device",
         type=str,
@@ -47,6 +59,125 @@ def parse_args() -> argparse.Namespace:
         choices=["auto", "cpu", "cuda"],
         help="Inference device.",
     )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="eager",
+        choices=["eager", *EXPORT_BACKENDS],
+        help="Inference backend: eager PyTorch, or a TorchScript / ONNX artifact created by "
+        "suiren_pp_all/export_models.py (CPU only, sparse full-graph mode).",
+    )
+    parser.add_argument(
+        "--precision",
+        type=str,
+        default="fp32",
+        choices=list(PRECISIONS),
+        help="Inference precision of the eager backend: fp32, bf16 (bfloat16 autocast) "
+        "or int8 (dynamic quantization of Linear layers, CPU only).",
+    )
+    parser.add_argument(
+        "--full-graph-mode",
+        type=str,
+        default="sparse",
+        choices=["sparse", "dense", "chunked"],
+        help="Execution mode of the full-connect attention: sparse (edge-wise), dense (padded batch tensors) "
+        "or chunked (dense, split into target-node chunks under --memory-budget).",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        default=None,
+        help="Memory budget in MB for the full-connect attention intermediates of each layer. "
+        "Implies --full-graph-mode chunked and reports the peak memory.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Worker processes for SMILES featurization. Featurization of the next chunk then overlaps "
+        "with inference on the current one. 0 featurizes in the main process.",
+    )
+    parser.add_argument(
+        "--inference-workers",
+        type=str,
+        default="0",
+        help="Worker processes for data-parallel CPU inference; they share the model weights and each "
+        "predicts shards of every chunk. 'auto' chooses workers x threads from the free cores. "
+        "0 runs the model in the main process.",
+    )
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=None,
+        help="Intra-op threads of each inference worker (default: chosen from the core count).",
+    )
+    parser.add_argument(
+        "--feature-cache",
+        type=str,
+        nargs="?",
+        const=str(DEFAULT_CACHE_DIR),
+        default=None,
+        metavar="DIR",
+        help="Reuse featurized molecules from a persistent cache shared by all Suiren predictors "
+        f"(default directory: {DEFAULT_CACHE_DIR}).",
+    )
+    parser.add_argument(
+        "--feature-cache-size",
+        type=float,
+        default=DEFAULT_MAX_SIZE_MB,
+        help="Size limit of the feature cache in MB; the oldest entries are evicted beyond it.",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Predict each distinct molecule (by canonical SMILES) once and copy the result to its duplicate rows.",
+    )
+    parser.add_argument(
+        "--prediction-cache",
+        type=str,
+        nargs="?",
+        const=str(DEFAULT_CACHE_PATH),
+        default=None,
+        metavar="PATH",
+        help="Reuse earlier predictions stored in a SQLite file, keyed by the model checksum and canonical "
+        f"SMILES; only uncached molecules are run through the model (default file: {DEFAULT_CACHE_PATH}).",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream CSV input: read, predict and append results chunk by chunk in constant memory. "
+        "An interrupted run resumes from its progress marker when rerun with the same arguments.",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=DEFAULT_CHUNK_ROWS,
+        help="Rows per chunk in --stream mode.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"CSV input: write a '{KEY_COLUMN}' column (hash of the model checksum and the SMILES) and, "
+        "on later runs, reuse the predictions of rows whose key is unchanged in the file being written.",
+    )
+    parser.add_argument(
+        "--stdin-stream",
+        action="store_true",
+        help="Read SMILES lines from stdin until EOF and write one JSON line per molecule to stdout "
+        "(or --output) as each micro-batch completes; status messages go to stderr.",
+    )
+    parser.add_argument(
+        "--flush-size",
+        type=int,
+        default=DEFAULT_FLUSH_SIZE,
+        help="Largest micro-batch in --stdin-stream mode.",
+    )
+    parser.add_argument(
+        "--flush-ms",
+        type=float,
+        default=DEFAULT_FLUSH_MS,
+        help="Longest time in milliseconds a molecule waits for its micro-batch to fill in --stdin-stream mode.",
+    )
     parser.add_argument(
         "--output",
         type=str,
@@ -56,268 +187,136 @@ def parse_args() -> argparse.Namespace:
 
     args = parser.parse_args()
     args.input = None
+    if args.workers < 0:
+        parser.error("--workers must be non-negative.")
+    if args.inference_workers != "auto":
+        if not args.inference_workers.isdigit():
+            parser.error("--inference-workers must be a non-negative integer or 'auto'.")
+        args.inference_workers = int(args.inference_workers)
+    if args.threads_per_worker is not None and args.threads_per_worker <= 0:
+        parser.error("--threads-per-worker must be positive.")
+    if args.chunk_rows <= 0:
+        parser.error("--chunk-rows must be positive.")
+    if args.flush_size <= 0:
+        parser.error("--flush-size must be positive.")
+    if args.flush_ms < 0:
+        parser.error("--flush-ms must be non-negative.")
+    if args.stdin_stream and args.stream:
+        parser.error("--stdin-stream and --stream are mutually exclusive.")
+    if args.stdin_stream and args.incremental:
+        parser.error("--incremental only applies to CSV input, not to --stdin-stream.")
+    if args.feature_cache_size <= 0:
+        parser.error("--feature-cache-size must be positive.")
+    if args.max_batch_pairs is not None and args.max_batch_pairs <= 0:
+        parser.error("--max-batch-pairs must be positive.")
+    if args.memory_budget is not None:
+        if args.memory_budget <= 0:
+            parser.error("--memory-budget must be positive.")
+        args.full_graph_mode = "chunked"
+    if args.backend != "eager" and args.full_graph_mode != "sparse":
+        parser.error("--backend torchscript/onnx only supports the sparse full-graph mode.")
+    if args.backend != "eager" and args.precision != "fp32":
+        parser.error("--precision is only supported with --backend eager.")
 
     return args
 
 
-def resolve_device(device_arg: str) -> torch.device:
-    if device_arg == "cpu":
-        return torch.device("cpu")
-    if device_arg == "cuda":
-        if not torch.cuda.is_available():
-            raise RuntimeError("There is no CUDA device available in the current environment.")
-        return torch.device("cuda")
-    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-
-def load_torch_file(path: Path):
-    try:
-        return torch.load(path, map_location="cpu", weights_only=False)
-    except TypeError:
-        return torch.load(path, map_location="cpu")
-
 
-def normalize_state_dict(checkpoint_obj) -> Tuple[Dict[str, torch.Tensor], Dict[str, object]]:
-    if isinstance(checkpoint_obj, dict) and "state_dict" in checkpoint_obj:
-        state_dict = checkpoint_obj["state_dict"]
-        meta = checkpoint_obj
-    elif isinstance(checkpoint_obj, dict):
-        state_dict = checkpoint_obj
-        meta = checkpoint_obj
-    else:
-        raise TypeError("Unsupported checkpoint format.")
+def print_summary(
+    predictor: SuirenPredictor,
+    args: argparse.Namespace,
+    incremental: Optional[IncrementalScores] = None,
+) -> None:
+    if incremental is not None:
+        print(incremental.summary())
+    if predictor.deduplicator is not None:
+        print(predictor.deduplicator.summary())
+    if predictor.prediction_cache is not None:
+        print(predictor.prediction_cache.summary())
+    if args.memory_budget is not None:
+        print(format_peak_memory(predictor.device))
+
+
+def stream_predictions(
+    input_path: Path,
+    predictor: SuirenPredictor,
+    args: argparse.Namespace,
+    incremental: Optional[IncrementalScores] = None,
+) -> None:
+    smiles_column = detect_smiles_column(pd.read_csv(input_path, nrows=0), args.smiles_column)
+
+    def predict_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+        smiles_list = chunk[smiles_column].tolist()
+        if incremental is not None:
+            incremental.remember(chunk)
+        _, value_columns = predictor.predict_rows(smiles_list, [PROPERTY], incremental)
+        output_df = chunk.copy()
+        output_df["value"] = value_columns[PROPERTY]
+        if incremental is not None:
+            output_df[KEY_COLUMN] = incremental.row_keys(smiles_list)
+        return output_df
 
-    normalized = {}
-    for key, value in state_dict.items():
-        new_key = key[7:] if key.startswith("module.") else key
-        normalized[new_key] = value
-    return normalized, meta
-
-
-def to_float(value) -> float:
-    if isinstance(value, torch.Tensor):
-        return float(value.item())
-    return float(value)
+    output_path = Path(args.output).expanduser().resolve() if args.output else input_path
+    if incremental is not None and output_path != input_path and output_path.is_file():
+        incremental.load(output_path)
+    total = stream_csv(
+        input_path,
+        output_path,
+        predict_chunk,
+        chunk_rows=args.chunk_rows,
+        on_chunk=lambda rows_done: print(f"Processed entries:{rows_done}", flush=True),
+    )
+    print(f"Task: boiling_point")
+    print(f"Type: regression")
+    print(f"Total entries:{total}")
+    print(f"Result file:{output_path}")
+    print_summary(predictor, args, incremental)
 
 
-def download_model_from_modelscope(model_path: Path) -> bool:
+def stream_stdin(
+    predictor: SuirenPredictor,
+    args: argparse.Namespace,
+    output: TextIO,
+) -> None:
     """
-    尝试从 ModelScope 下载模型文件。
-    
-    Args:
-        model_path: 模型文件路径
-        
-    Returns:
-        True 如果下载成功，False 如果下载失败
+    Predict SMILES lines from stdin in latency-bounded micro-batches and write
+    one JSON line per input line, in input order, as each batch completes.
     """
-    if model_path.is_file():
-        return True
-    
-    model_dir = model_path.parent
-    model_name = model_path.name
-    
-    print(f"Model file not found: {model_path}")
-    print(f"Attempting to download model from ModelScope...")
-    
+    if args.output:
+        output = open(Path(args.output).expanduser().resolve(), "w", encoding="utf-8")
+    total = 0
     try:
-        cmd = [
-            "modelscope", "download",
-            "--model", "ajy112/Suiren-Model-Set",
-            model_name,
-            "--local_dir", str(model_dir)
-        ]
-        
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=300
-        )
-        
-        if result.returncode == 0 and model_path.is_file():
-            print(f"Model downloaded successfully to: {model_path}")
-            return True
-        else:
-            print(f"Download command failed with return code: {result.returncode}")
-            if result.stderr:
-                print(f"Error output: {result.stderr}")
-            return False
-            
-    except subprocess.TimeoutExpired:
-        print(f"Download timed out after 300 seconds.")
-        return False
-    except FileNotFoundError:
-        print("modelscope command not found. Please ensure modelscope is installed.")
-        return False
-    except Exception as e:
-        print(f"Unexpected error during download: {str(e)}")
-        return False
-
-
-def load_model(model_path: Path, device: torch.device):
-    if not model_path.is_file():
-        # 尝试从 ModelScope 下载
-        if not download_model_from_modelscope(model_path):
-            error_msg = (
-                f"{model_path.parent}目录下不存在模型文件，且下载失败，"
-                f"需要从\"https://modelscope.cn/models/ajy112/Suiren-Model-Set\"手动下载"
-            )
-            print(error_msg)
-            raise FileNotFoundError(error_msg)
-
-    checkpoint_obj = load_torch_file(model_path)
-    state_dict, meta = normalize_state_dict(checkpoint_obj)
-
-    model = standard_finetune(class_flag=False, class_num=2)
-    model.load_state_dict(state_dict, strict=True)
-    model = model.to(device)
-    model.eval()
-
-    norm_factor = None
-    if isinstance(meta, dict) and "norm_factor" in meta:
-        norm_values = meta["norm_factor"]
-        if isinstance(norm_values, (list, tuple)) and len(norm_values) == 2:
-            mean, std = norm_values
-            norm_factor = (to_float(mean), to_float(std))
-
-    return model, norm_factor
-
-
-def detect_smiles_column(df: pd.DataFrame, preferred: Optional[str] = None) -> str:
-    if preferred:
-        if preferred not in df.columns:
-            raise ValueError(f"The specified column does not exist in the CSV: {preferred}")
-        return preferred
-
-    exact_candidates = [
-        "SMILES",
-        "smiles",
-        "Smiles",
-        "canonical_smiles",
-        "Canonical_SMILES",
-    ]
-    for column in exact_candidates:
-        if column in df.columns:
-            return column
-
-    fuzzy_candidates = [column for column in df.columns if "smiles" in str(column).lower()]
-    if len(fuzzy_candidates) == 1:
-        return fuzzy_candidates[0]
-
-    if len(df.columns) == 1:
-        return df.columns[0]
-
-    raise ValueError(
-        "Unable to automatically identify the SMILES column. Please specify it explicitly using --smiles-column."
-    )
-
-
-def looks_like_csv_path(input_value: str) -> bool:
-    return Path(input_value).suffix.lower() == ".csv"
-
-
-def load_inputs(input_value: str, smiles_column: Optional[str]) -> Tuple[str, pd.DataFrame, str, Optional[Path]]:
-    input_path = Path(input_value).expanduser()
-
-    if input_path.is_file():
-        df = pd.read_csv(input_path)
-        smiles_col = detect_smiles_column(df, smiles_column)
-        return "csv", df.copy(), smiles_col, input_path.resolve()
-
-    if looks_like_csv_path(input_value):
-        raise FileNotFoundError(f"Input CSV not found: {input_path.resolve()}")
-
-    df = pd.DataFrame({"SMILES": [input_value]})
-    return "smiles", df, "SMILES", None
-
-
-def build_graph(smiles: str) -> Tuple[Optional[Data], Optional[str]]:
-    if pd.isna(smiles):
-        return None, "empty_smiles"
-
-    smiles = str(smiles).strip()
-    if not smiles:
-        return None, "empty_smiles"
-
-    graph_tuple, mol_flag = from_smiles(smiles)
-    if not mol_flag:
-        return None, "invalid_smiles"
-
-    x, edge_index, edge_attr, edge_index_all = graph_tuple
-    atom_types = set(x[:, 0].tolist())
-    if not atom_types.issubset(ALLOWED_ELEMENTS):
-        return None, "unsupported_elements"
+        for smiles_batch in iter_micro_batches(sys.stdin, args.flush_size, args.flush_ms / 1000):
+            errors, value_columns = predictor.predict_rows(smiles_batch, [PROPERTY])
+            for smiles, error, value in zip(smiles_batch, errors, value_columns[PROPERTY]):
+                result = {"SMILES": smiles, "prediction": value}
+                if error is not None:
+                    result["error"] = error
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            total += len(smiles_batch)
+    except BrokenPipeError:
+        # The consumer exited (e.g. `| head`); silence the final flush of the closed pipe
+        os.dup2(os.open(os.devnull, os.O_WRONLY), output.fileno())
+    finally:
+        if args.output:
+            output.close()
 
-    data = Data(
-        x=x.to(torch.long),
-        edge_index=edge_index.to(torch.long),
-        edge_attr=edge_attr.to(torch.long),
-        edge_index_all=edge_index_all.to(torch.long),
-        smiles=smiles,
-    )
-    return data, None
-
-
-def run_inference(
-    model: torch.nn.Module,
-    norm_factor: Optional[Tuple[float, float]],
-    data_list: Sequence[Data],
-    device: torch.device,
-    batch_size: int,
-) -> List[Dict[str, object]]:
-    loader = DataLoader(list(data_list), batch_size=batch_size, shuffle=False)
-    outputs: List[Dict[str, object]] = []
-
-    with torch.no_grad():
-        for batch in loader:
-            batch = batch.to(device)
-            logits = model(batch)
-
-            preds = logits.view(-1).detach().cpu()
-            if norm_factor is not None:
-                mean, std = norm_factor
-                preds = preds * std + mean
-            for pred in preds:
-                outputs.append({"prediction": float(pred.item())})
-
-    return outputs
-
-
-def attach_predictions(
-    df: pd.DataFrame,
-    records: List[Optional[Dict[str, object]]],
-) -> pd.DataFrame:
-    result_df = df.copy()
-    result_df["status"] = "invalid"
-    result_df["error"] = None
-
-    discovered_columns: List[str] = []
-    for record in records:
-        if record:
-            for key in record.keys():
-                if key not in {"status", "error"} and key not in discovered_columns:
-                    discovered_columns.append(key)
-
-    for column in discovered_columns:
-        result_df[column] = None
-
-    for idx, record in enumerate(records):
-        if not record:
-            continue
-        result_df.at[idx, "status"] = record.get("status", "invalid")
-        result_df.at[idx, "error"] = record.get("error")
-        for key, value in record.items():
-            if key in {"status", "error"}:
-                continue
-            result_df.at[idx, key] = value
-
-    return result_df
+    print(f"Total entries:{total}")
+    if predictor.deduplicator is not None:
+        print(predictor.deduplicator.summary())
+    if predictor.prediction_cache is not None:
+        print(predictor.prediction_cache.summary())
 
 
 def main() -> None:
     args = parse_args()
+    jsonl_output = sys.stdout
+    if args.stdin_stream:
+        # stdout carries the JSON lines; every status message goes to stderr
+        sys.stdout = sys.stderr
 
-    if args.input is None:
+    if args.input is None and not args.stdin_stream:
         try:
             args.input = input().strip()
         except EOFError:
@@ -325,47 +324,54 @@ def main() -> None:
         if not args.input:
             raise ValueError("Input cannot be empty.")
 
-    device = resolve_device(args.device)
-
-    print(f"Loading model: {MODEL_PATH}")
-    model, norm_factor = load_model(MODEL_PATH, device)
+    predictor = SuirenPredictor(
+        device=args.device,
+        batch_size=args.batch_size,
+        max_batch_pairs=args.max_batch_pairs,
+        full_graph_mode=args.full_graph_mode,
+        memory_budget_mb=args.memory_budget,
+        backend=args.backend,
+        precision=args.precision,
+        workers=args.workers,
+        feature_cache=args.feature_cache,
+        feature_cache_size_mb=args.feature_cache_size,
+        prediction_cache=args.prediction_cache,
+        dedup=args.dedup,
+        inference_workers=args.inference_workers,
+        threads_per_worker=args.threads_per_worker,
+    )
+    atexit.register(predictor.close)
+    predictor.load([PROPERTY])
     print("Model loading complete.")
 
+    if args.stdin_stream:
+        stream_stdin(predictor, args, jsonl_output)
+        return
+
+    incremental: Optional[IncrementalScores] = None
+    if args.incremental:
+        incremental = IncrementalScores(list(predictor.model_keys([PROPERTY]).values()), ["value"])
+
+    input_path = Path(args.input).expanduser()
+    if args.stream and input_path.is_file():
+        stream_predictions(input_path.resolve(), predictor, args, incremental)
+        return
+
     input_kind, input_df, smiles_column, input_path = load_inputs(args.input, args.smiles_column)
+    if input_kind == "smiles":
+        incremental = None
+    if incremental is not None:
+        # Earlier results come from the file being written: the input itself or --output
+        incremental.remember(input_df)
+        previous_path = Path(args.output).expanduser().resolve() if args.output else input_path
+        if previous_path != input_path and previous_path.is_file():
+            incremental.load(previous_path)
 
-    data_list: List[Data] = []
-    valid_indices: List[int] = []
-    records: List[Optional[Dict[str, object]]] = [None] * len(input_df)
-
-    for idx, smiles in enumerate(input_df[smiles_column].tolist()):
-        graph, error = build_graph(smiles)
-        if graph is None:
-            records[idx] = {"status": "invalid", "error": error}
-            continue
-
-        data_list.append(graph)
-        valid_indices.append(idx)
-
-    if data_list:
-        predictions = run_inference(
-            model=model,
-            norm_factor=norm_factor,
-            data_list=data_list,
-            device=device,
-            batch_size=args.batch_size,
-        )
-        for row_idx, pred in zip(valid_indices, predictions):
-            pred["status"] = "ok"
-            pred["error"] = None
-            records[row_idx] = pred
-
-    result_df = attach_predictions(input_df, records)
+    _, value_columns = predictor.predict_rows(input_df[smiles_column].tolist(), [PROPERTY], incremental)
+    values = value_columns[PROPERTY]
 
     if input_kind == "smiles":
-        row = result_df.iloc[0]
-        result = {"SMILES": row.get(smiles_column)}
-        prediction = row.get("prediction")
-        result["prediction"] = None if pd.isna(prediction) else float(prediction)
+        result = {"SMILES": input_df.iloc[0][smiles_column], "prediction": values[0]}
 
         message = json.dumps(result, ensure_ascii=False, indent=2)
         if args.output:
@@ -374,18 +380,16 @@ def main() -> None:
             print(f"Results saved to: {output_path}")
         else:
             print(message)
+        if predictor.prediction_cache is not None:
+            print(predictor.prediction_cache.summary())
+        if args.memory_budget is not None:
+            print(format_peak_memory(predictor.device))
         return
 
-    value_column: List[Optional[object]] = []
-    for _, row in result_df.iterrows():
-        value = row.get("prediction")
-        if pd.isna(value):
-            value_column.append(None)
-        else:
-            value_column.append(float(value))
-
     output_df = input_df.copy()
-    output_df["value"] = value_column
+    output_df["value"] = values
+    if incremental is not None:
+        output_df[KEY_COLUMN] = incremental.row_keys(input_df[smiles_column].tolist())
 
     output_path = Path(args.output).expanduser().resolve() if args.output else input_path
     if output_path is None:
@@ -396,6 +400,7 @@ def main() -> None:
     print(f"Type: regression")
     print(f"Total entries:{len(output_df)}")
     print(f"Result file:{output_path}")
+    print_summary(predictor, args, incremental)
 
 
 if __name__ == "__main__":
@@ -11,8 +11,7 @@ Date: 2026-02-28
 
 import torch
 import torch.nn as nn
-from models.graph_NN import GNN
-from torch_geometric.nn import global_add_pool
+from models.graph_NN import GNN, set_full_graph_mode
 
 
 class PredictModel2D(torch.nn.Module):
@@ -121,27 +120,48 @@ class PredictModel2D(torch.nn.Module):
                 - x (Tensor): Node features
                 - edge_index (LongTensor): Local graph edges
                 - edge_index_all (LongTensor): Full-connect graph edges
+                  (may be absent or None in the "dense" and "chunked" full-graph modes)
                 - edge_attr (Tensor): Edge attributes
                 - batch (LongTensor): Batch assignment for nodes
+                - num_atoms (LongTensor, optional): Number of nodes of each graph;
+                  derived from batch if absent
 
         Returns:
             Tensor: Molecular level predictions
                 - Shape [batch_size, class_num] for classification
                 - Shape [batch_size, 1] for regression
         """
+        return self.forward_from_embeddings(data, self.pretrain_embeddings(data))
 
+    def pretrain_embeddings(self, data):
+        """
+        Stage 1 of forward: node embeddings of all layers of the pre-trained model.
+
+        Models with identical pretrain_model weights give identical results, so
+        multi-property inference computes this once per batch for all of them
+        (see models/shared_backbone.py).
+        """
         # ========================================================================
         # Stage 1: Extract Pre-trained Embeddings
         # ========================================================================
         # Get embeddings from all layers of pre-trained model
-        reference_2d = self.pretrain_model(
+        return self.pretrain_model(
             node_atom=data.x,
             edge_index=data.edge_index,
-            edge_index_all=data.edge_index_all,
+            edge_index_all=getattr(data, "edge_index_all", None),
             edge_attr=data.edge_attr,
             batch=data.batch
         )
 
+    def forward_from_embeddings(self, data, reference_2d):
+        """
+        Stages 2-5 of forward, given the output of pretrain_embeddings.
+        """
+        edge_index_all = getattr(data, "edge_index_all", None)
+        num_atoms = getattr(data, "num_atoms", None)
+        if num_atoms is None:
+            num_atoms = torch.bincount(data.batch)
+
         # ========================================================================
         # Stage 2: Fine-tune with Pre-trained Embeddings
         # ========================================================================
@@ -149,7 +169,7 @@ class PredictModel2D(torch.nn.Module):
         outputs_2d = self.finetune_model(
             node_atom=data.x,
             edge_index=data.edge_index,
-            edge_index_all=data.edge_index_all,
+            edge_index_all=edge_index_all,
             edge_attr=data.edge_attr,
             batch=data.batch,
             extra_embedding=reference_2d
@@ -165,7 +185,9 @@ class PredictModel2D(torch.nn.Module):
         # Stage 4: Graph-level Pooling and Normalization
         # ========================================================================
         # Aggregate node representations to molecular level using scatter mean
-        outputs_2d = global_add_pool(outputs_2d, data.batch) / self.avg_atom
+        # (global_add_pool with the graph count taken from num_atoms, so it stays traceable)
+        pooled = torch.zeros(num_atoms.size(0), outputs_2d.size(1), dtype=outputs_2d.dtype, device=outputs_2d.device)
+        outputs_2d = pooled.index_add_(0, data.batch, outputs_2d) / self.avg_atom
 
         # ========================================================================
         # Stage 5: Molecular Prediction
@@ -175,6 +197,19 @@ class PredictModel2D(torch.nn.Module):
 
         return outputs_2d_final
 
+    def set_full_graph_mode(self, mode, memory_budget_mb=None):
+        """
+        Select how the full-connect stages of all GATConv layers are executed.
+
+        Args:
+            mode (str): "sparse" (gather/scatter over edge_index_all),
+                        "dense" (padded batch tensors with masked softmax) or
+                        "chunked" (dense, split into target-node chunks for large molecules)
+            memory_budget_mb (float, optional): Pair-intermediate budget of the "chunked" mode
+        """
+        set_full_graph_mode(self, mode, memory_budget_mb)
+        return self
+
 
 def standard_finetune(class_num=2, class_flag=False):
     """
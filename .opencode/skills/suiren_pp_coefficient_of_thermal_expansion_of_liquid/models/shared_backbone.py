@@ -0,0 +1,80 @@
+"""
+Multi-property inference with one pre-trained backbone pass per batch.
+
+PredictModel2D runs its pretrain_model first and conditions the fine-tuned
+GNN on the resulting per-layer embeddings. The Suiren properties start from
+the same pretrained weights, so for a batch these embeddings are identical
+across every model whose pretrain_model weights are identical. Models are
+grouped by a fingerprint of those weights; each group computes the
+embeddings once per batch and feeds them to the fine-tuned part of each
+member. Predictions are the same as running each model on its own.
+"""
+
+import hashlib
+from typing import Dict, List, Mapping, Optional
+
+import torch
+import torch.nn as nn
+
+
+def backbone_fingerprint(model: nn.Module) -> Optional[str]:
+    """
+    SHA-256 over the pretrain_model state of a PredictModel2D.
+
+    Call on the fp32 model (before models.precision.apply_precision); the
+    reduced-precision versions of equal fp32 weights are equal as well.
+    Returns None for models without a pretrain_model.
+    """
+    backbone = getattr(model, "pretrain_model", None)
+    if backbone is None:
+        return None
+    digest = hashlib.sha256()
+    for name, tensor in backbone.state_dict().items():
+        tensor = tensor.detach().cpu().contiguous()
+        digest.update(f"{name}:{tensor.dtype}:{tuple(tensor.shape)}".encode())
+        digest.update(tensor.reshape(-1).view(torch.uint8).numpy().tobytes())
+    return digest.hexdigest()
+
+
+def group_by_backbone(fingerprints: Mapping[str, Optional[str]]) -> List[List[str]]:
+    """
+    Group model names by backbone fingerprint, in first-seen order.
+
+    Models without a fingerprint get a group of their own.
+    """
+    groups: Dict[object, List[str]] = {}
+    for name, fingerprint in fingerprints.items():
+        key = fingerprint if fingerprint is not None else ("unshared", name)
+        groups.setdefault(key, []).append(name)
+    return list(groups.values())
+
+
+def run_grouped(
+    models: Mapping[str, nn.Module],
+    groups: List[List[str]],
+    batch,
+) -> Dict[str, torch.Tensor]:
+    """
+    Run every model on a batch, sharing the backbone pass within each group.
+
+    Args:
+        models (Mapping[str, nn.Module]): Name -> model (PredictModel2D, its
+            int8 copy or AutocastModel; other callables run unshared)
+        groups (List[List[str]]): Output of group_by_backbone
+        batch: Collated batch
+
+    Returns:
+        Dict[str, Tensor]: Name -> model output
+    """
+    outputs: Dict[str, torch.Tensor] = {}
+    for group in groups:
+        first = models[group[0]]
+        if len(group) == 1 or not hasattr(first, "forward_from_embeddings"):
+            for name in group:
+                outputs[name] = models[name](batch)
+            continue
+
+        reference_2d = first.pretrain_embeddings(batch)
+        for name in group:
+            outputs[name] = models[name].forward_from_embeddings(batch, reference_2d)
+    return outputs
@@ -0,0 +1,129 @@
+"""
+Streaming CSV prediction with a resumable progress marker.
+
+The input CSV is read in fixed-size row chunks; each chunk is predicted and
+appended to the output before the next one is read, so memory stays constant
+in the library size. After every chunk a small JSON marker next to the output
+records how many input rows and output bytes are complete. A rerun with the
+same input and output picks up after the last completed chunk, discarding any
+partially written rows.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Callable, Optional
+
+import pandas as pd
+
+DEFAULT_CHUNK_ROWS = 10000
+
+
+def progress_path_for(output_path: Path) -> Path:
+    return output_path.with_name(output_path.name + ".progress")
+
+
+def input_signature(input_path: Path):
+    stat = input_path.stat()
+    return {"input": str(input_path), "input_size": stat.st_size, "input_mtime_ns": stat.st_mtime_ns}
+
+
+def load_progress(progress_path: Path, input_path: Path, work_path: Path) -> int:
+    """
+    Number of input rows already written to work_path, or 0 to start over.
+
+    The marker is only trusted if it was written for the same, unmodified input
+    and the output still holds at least the recorded number of bytes; the
+    output is then truncated back to that size.
+    """
+    if not progress_path.is_file() or not work_path.is_file():
+        return 0
+    try:
+        progress = json.loads(progress_path.read_text(encoding="utf-8"))
+    except ValueError:
+        return 0
+
+    for key, value in input_signature(input_path).items():
+        if progress.get(key) != value:
+            return 0
+    output_bytes = progress.get("output_bytes", 0)
+    if work_path.stat().st_size < output_bytes:
+        return 0
+
+    with open(work_path, "r+b") as handle:
+        handle.truncate(output_bytes)
+    return int(progress.get("rows_done", 0))
+
+
+def save_progress(progress_path: Path, input_path: Path, work_path: Path, rows_done: int) -> None:
+    progress = input_signature(input_path)
+    progress["rows_done"] = rows_done
+    progress["output_bytes"] = work_path.stat().st_size
+    tmp_path = progress_path.with_name(progress_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(progress), encoding="utf-8")
+    os.replace(tmp_path, progress_path)
+
+
+def stream_csv(
+    input_path: Path,
+    output_path: Path,
+    predict_chunk: Callable[[pd.DataFrame], pd.DataFrame],
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    on_chunk: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Predict a CSV chunk by chunk, appending to the output as it goes.
+
+    Args:
+        input_path (Path): Input CSV
+        output_path (Path): Result CSV. If it is the input itself, results are
+                            streamed to "<stem>.partial<suffix>" and moved over
+                            the input once every chunk is done.
+        predict_chunk (callable): Maps an input chunk (index reset to 0) to the
+                                  output rows of that chunk
+        chunk_rows (int): Input rows per chunk (default: 10000)
+        on_chunk (callable, optional): Called with the number of completed rows
+                                       after each chunk
+
+    Returns:
+        int: Total number of rows written
+    """
+    if chunk_rows <= 0:
+        raise ValueError(f"chunk_rows must be positive, got {chunk_rows}")
+
+    in_place = output_path.resolve() == input_path.resolve()
+    work_path = input_path.with_name(input_path.stem + ".partial" + input_path.suffix) if in_place else output_path
+    progress_path = progress_path_for(work_path)
+
+    rows_done = load_progress(progress_path, input_path, work_path)
+    if rows_done:
+        print(f"Resuming after {rows_done} completed rows: {work_path}", flush=True)
+        skip_rows = lambda line: 0 < line <= rows_done
+    else:
+        skip_rows = None
+
+    header_written = rows_done > 0
+    reader = pd.read_csv(input_path, chunksize=chunk_rows, skiprows=skip_rows)
+    for chunk in reader:
+        output_df = predict_chunk(chunk.reset_index(drop=True))
+        if header_written:
+            output_df.to_csv(work_path, mode="a", header=False, index=False, encoding="utf-8")
+        else:
+            # The BOM is only written once, at the start of the file
+            output_df.to_csv(work_path, mode="w", index=False, encoding="utf-8-sig")
+            header_written = True
+
+        rows_done += len(chunk)
+        save_progress(progress_path, input_path, work_path, rows_done)
+        if on_chunk is not None:
+            on_chunk(rows_done)
+
+    if not header_written:
+        # Header-only input: still produce a result file with the output columns
+        empty = pd.read_csv(input_path, nrows=0)
+        predict_chunk(empty).to_csv(work_path, mode="w", index=False, encoding="utf-8-sig")
+
+    if in_place:
+        os.replace(work_path, input_path)
+    progress_path.unlink(missing_ok=True)
+    return rows_done
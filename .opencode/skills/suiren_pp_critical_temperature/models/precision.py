@@ -0,0 +1,79 @@
+"""
+Reduced-precision inference modes for fine-tuned Suiren models.
+
+    "fp32": the checkpoint as trained (reference)
+    "bf16": forward pass under torch.autocast with bfloat16; Linear layers run
+            in bfloat16, node aggregations accumulate into fp32 tensors
+    "int8": dynamic int8 quantization of the nn.Linear layers (CPU only);
+            weights are stored in int8 and activations are quantized per batch
+
+Which properties tolerate a mode is checked with
+suiren_pp_all/validate_precision.py.
+"""
+
+import torch
+import torch.nn as nn
+
+PRECISIONS = ("fp32", "bf16", "int8")
+
+# The dense full-graph path uses the weight and bias tensors of weight_linear5
+# directly (see GATConv.full_graph_dense), which quantized Linear layers do not expose.
+UNQUANTIZED_LINEARS = ("weight_linear5",)
+
+
+class AutocastModel(nn.Module):
+    """Runs the wrapped model under bfloat16 autocast and returns fp32 predictions."""
+
+    def __init__(self, model: nn.Module, device_type: str):
+        super().__init__()
+        self.model = model
+        self.device_type = device_type
+
+    def forward(self, data):
+        with torch.autocast(device_type=self.device_type, dtype=torch.bfloat16):
+            return self.model(data).float()
+
+    def pretrain_embeddings(self, data):
+        with torch.autocast(device_type=self.device_type, dtype=torch.bfloat16):
+            return self.model.pretrain_embeddings(data)
+
+    def forward_from_embeddings(self, data, reference_2d):
+        with torch.autocast(device_type=self.device_type, dtype=torch.bfloat16):
+            return self.model.forward_from_embeddings(data, reference_2d).float()
+
+
+def quantize_int8(model: nn.Module) -> nn.Module:
+    """Dynamically quantize the nn.Linear layers of a model to int8."""
+    qconfig = torch.ao.quantization.default_dynamic_qconfig
+    qconfig_spec = {
+        name: qconfig
+        for name, module in model.named_modules()
+        if isinstance(module, nn.Linear) and name.rsplit(".", 1)[-1] not in UNQUANTIZED_LINEARS
+    }
+    return torch.ao.quantization.quantize_dynamic(model, qconfig_spec, dtype=torch.qint8)
+
+
+def apply_precision(model: nn.Module, precision: str, device: torch.device) -> nn.Module:
+    """
+    Return the model prepared for an inference precision.
+
+    Call after model.set_full_graph_mode, since the returned wrapper or
+    quantized copy does not expose it.
+
+    Args:
+        model (nn.Module): PredictModel2D in eval mode
+        precision (str): One of PRECISIONS
+        device (torch.device): Device the model is on
+
+    Returns:
+        nn.Module: A callable taking a collated batch, like model
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {PRECISIONS}, got {precision}")
+    if precision == "bf16":
+        return AutocastModel(model, device.type).eval()
+    if precision == "int8":
+        if device.type != "cpu":
+            raise RuntimeError("int8 dynamic quantization runs on CPU only; use --device cpu.")
+        return quantize_int8(model).eval()
+    return model
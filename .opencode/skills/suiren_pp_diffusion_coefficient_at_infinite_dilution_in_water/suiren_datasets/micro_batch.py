@@ -0,0 +1,74 @@
+"""
+Latency-bounded micro-batching of a line stream (the --stdin-stream mode).
+
+Lines are read on a background thread, so a blocking source (a pipe from a
+generator that emits molecules slowly) does not hold back a batch that is
+due. A micro-batch is emitted as soon as it holds max_size lines, when
+max_wait_s has passed since its first line arrived, or at the end of the
+input; lines keep their input order.
+"""
+
+import queue
+import threading
+import time
+from typing import Iterable, Iterator, List
+
+DEFAULT_FLUSH_SIZE = 32
+DEFAULT_FLUSH_MS = 100.0
+
+_END = object()
+
+
+def iter_micro_batches(lines: Iterable[str], max_size: int, max_wait_s: float) -> Iterator[List[str]]:
+    """
+    Group the lines of a blocking source into micro-batches.
+
+    Args:
+        lines (Iterable[str]): Line source, e.g. sys.stdin
+        max_size (int): Largest number of lines per batch
+        max_wait_s (float): Longest time a line waits for its batch to fill
+
+    Yields:
+        List[str]: The lines of one batch without their line terminators
+    """
+    if max_size <= 0:
+        raise ValueError(f"max_size must be positive, got {max_size}")
+
+    # Bounded, so a fast source does not run ahead of the model without limit
+    items: queue.Queue = queue.Queue(maxsize=4 * max_size)
+    errors: List[BaseException] = []
+
+    def read() -> None:
+        try:
+            for line in lines:
+                items.put(line.rstrip("\r\n"))
+        except BaseException as exc:  # re-raised in the consumer
+            errors.append(exc)
+        finally:
+            items.put(_END)
+
+    threading.Thread(target=read, name="micro-batch-reader", daemon=True).start()
+
+    finished = False
+    while not finished:
+        item = items.get()
+        if item is _END:
+            break
+        batch = [item]
+        deadline = time.monotonic() + max_wait_s
+        while len(batch) < max_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = items.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _END:
+                finished = True
+                break
+            batch.append(item)
+        yield batch
+
+    if errors:
+        raise errors[0]
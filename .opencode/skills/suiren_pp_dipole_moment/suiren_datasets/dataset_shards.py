@@ -0,0 +1,452 @@
+"""
+Parallel processing of property CSVs into training datasets.
+
+PP_smiles_2d.process and ShardedPP_smiles_2d share the helpers below:
+
+- Split membership is a set lookup, so selecting the rows of a split is
+  linear in the row count (the split itself is the seed-0 permutation that
+  PP_smiles_2d has always used, so existing splits.npz files stay valid).
+- Each SMILES is parsed once and featurized with fast_from_rdmol, in a
+  process pool (iter_featurized) when there are enough rows to pay for it.
+- ShardedPP_smiles_2d writes the processed split as shards of compact
+  records plus a JSON index instead of one collated .pt file, and loads a
+  shard only when one of its molecules is requested:
+
+    <property>_<split>_2d_shards.json      {"shards", "sizes", "failed", "class_num"}
+    <property>_<split>_2d_shard00000.pt    concatenated x / edge_index / edge_attr / y
+
+Items are the same Data objects that PP_smiles_2d returns (edge_index_all
+is rebuilt per molecule on access), so either dataset can feed a model.
+ShardBatches reads a sharded split as size-bucketed training batches for a
+DataLoader (see suiren_pp_all/finetune_property.py).
+"""
+
+import bisect
+import json
+import math
+import os
+import os.path as osp
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+from torch_geometric.data import Data, Dataset
+
+from suiren_datasets.compact import (
+    CompactMolecule,
+    bucketed_batch_indices,
+    collate_molecules,
+    compact_from_smiles,
+    full_graph_edge_index,
+)
+from suiren_datasets.parallel import DEFAULT_CHUNK_SIZE, FeaturizerPool, iter_featurized
+
+# Elements of the organic property sets: H, C, N, O, F, P, S, Cl, Br, I
+ALLOWED_ELEMENTS = frozenset({1, 6, 7, 8, 9, 15, 16, 17, 35, 53})
+UNSEEN_ELEMENTS = "unseen elements"
+DEFAULT_SHARD_SIZE = 50000
+DEFAULT_CACHED_SHARDS = 2
+
+
+def random_split(num_rows: int, ratio: float) -> Dict[str, np.ndarray]:
+    """Row indices of the train / valid splits: the seed-0 permutation of PP_smiles_2d."""
+    np.random.seed(0)
+    train, valid = np.split(np.random.permutation(num_rows), [int(ratio * num_rows)])
+    return {"train": train, "valid": valid}
+
+
+def rows_in_split(num_rows: int, split_indices: np.ndarray) -> List[int]:
+    """Rows of a split in file order."""
+    selected = set(split_indices.tolist())
+    return [row for row in range(num_rows) if row in selected]
+
+
+def default_workers(num_rows: int) -> int:
+    """All available cores, or none for sets that fit in a single chunk."""
+    if num_rows <= DEFAULT_CHUNK_SIZE:
+        return 0
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def featurize_dataset_smiles(smiles) -> Tuple[Optional[CompactMolecule], Optional[str]]:
+    """
+    Featurize one dataset SMILES, parsing it once.
+
+    Returns:
+        (CompactMolecule, None), or (None, reason) for unparsable SMILES and
+        molecules with elements outside ALLOWED_ELEMENTS
+    """
+    try:
+        record, mol_flag = compact_from_smiles(smiles)
+    except Exception as exc:
+        return None, f"featurization failed: {exc}"
+    if not mol_flag:
+        return None, "invalid SMILES"
+    # x_map['atomic_num'] starts at 0, so the feature index is the atomic number
+    if not set(record.x[:, 0].tolist()) <= ALLOWED_ELEMENTS:
+        return None, UNSEEN_ELEMENTS
+    return record, None
+
+
+def iter_dataset_records(
+    smiles_list: Sequence[str],
+    workers: Optional[int] = None,
+) -> Iterator[Tuple[int, Optional[CompactMolecule], Optional[str]]]:
+    """
+    Featurize dataset SMILES in input order, in a process pool.
+
+    Args:
+        smiles_list (Sequence[str]): SMILES of the selected rows
+        workers (int, optional): Worker processes; None uses default_workers
+
+    Yields:
+        (position, record, error) for every SMILES, as in featurize_dataset_smiles
+    """
+    if workers is None:
+        workers = default_workers(len(smiles_list))
+    pool = FeaturizerPool(workers) if workers else None
+    try:
+        for start, featurized in iter_featurized(smiles_list, featurize_dataset_smiles, pool):
+            for position, (record, error) in enumerate(featurized, start=start):
+                yield position, record, error
+    finally:
+        if pool is not None:
+            pool.close()
+
+
+def to_data(record: CompactMolecule, y: torch.Tensor, smiles: Optional[str] = None) -> Data:
+    """The Data object from_smiles-based processing stores for a molecule."""
+    data = Data(
+        x=record.x.to(torch.long),
+        y=y,
+        edge_index=record.edge_index.to(torch.long),
+        edge_attr=record.edge_attr.to(torch.long),
+        edge_index_all=full_graph_edge_index(torch.tensor([record.x.size(0)])),
+    )
+    if smiles is not None:
+        data.smiles = smiles
+    return data
+
+
+def select_rows(raw_path: str, root: str, split: str, ratio: float, defined: bool) -> Tuple[pd.DataFrame, List[int]]:
+    """Read a raw CSV and pick the rows of a split (writing splits.npz for random splits)."""
+    suppl = pd.read_csv(raw_path)
+    if defined:
+        return suppl, list(range(len(suppl)))
+    indices = random_split(len(suppl), ratio)
+    np.savez(osp.join(root, 'splits.npz'), idx_train=indices["train"], idx_valid=indices["valid"])
+    return suppl, rows_in_split(len(suppl), indices[split])
+
+
+def pack_shard(
+    records: Sequence[CompactMolecule],
+    labels: Sequence[object],
+    smiles: Optional[Sequence[str]],
+    classification: bool,
+) -> Dict[str, object]:
+    """Concatenate the records of a shard into a few tensors (fast to save and load)."""
+    atom_counts = torch.tensor([record.x.size(0) for record in records], dtype=torch.long)
+    edge_counts = torch.tensor([record.edge_index.size(1) for record in records], dtype=torch.long)
+    # The empty entries keep a split without valid molecules loadable
+    return {
+        "x": torch.cat([torch.empty(0, 5, dtype=torch.uint8), *(record.x for record in records)]),
+        "edge_index": torch.cat([torch.empty(2, 0, dtype=torch.int32), *(record.edge_index for record in records)], dim=1),
+        "edge_attr": torch.cat([torch.empty(0, 3, dtype=torch.uint8), *(record.edge_attr for record in records)]),
+        "atom_ptr": torch.cat([torch.zeros(1, dtype=torch.long), torch.cumsum(atom_counts, dim=0)]),
+        "edge_ptr": torch.cat([torch.zeros(1, dtype=torch.long), torch.cumsum(edge_counts, dim=0)]),
+        "y": torch.tensor(np.asarray(labels), dtype=torch.long if classification else torch.float),
+        "smiles": None if smiles is None else list(smiles),
+    }
+
+
+def record_at(packed: Dict[str, object], local: int) -> CompactMolecule:
+    atom_ptr, edge_ptr = packed["atom_ptr"], packed["edge_ptr"]
+    atoms = slice(int(atom_ptr[local]), int(atom_ptr[local + 1]))
+    edges = slice(int(edge_ptr[local]), int(edge_ptr[local + 1]))
+    return CompactMolecule(packed["x"][atoms], packed["edge_index"][:, edges], packed["edge_attr"][edges])
+
+
+def unpack_shard(packed: Dict[str, object]) -> List[CompactMolecule]:
+    return [record_at(packed, local) for local in range(len(packed["y"]))]
+
+
+class ShardedPP_smiles_2d(Dataset):
+    """
+    PP_smiles_2d for large property sets: processed in parallel into shards
+    that are loaded lazily, at most cached_shards at a time per process.
+
+    Args:
+        root (str): Dataset directory with raw/ and processed/
+        split (str): "train", "valid" or "test"
+        property_name (str): Raw CSV name (see PP_smiles_2d.raw_file_names)
+        ratio (float): Train fraction of a random split (default: 0.8)
+        defined (bool): The raw files are already split per split name
+        classification (bool): Store integer labels
+        workers (int, optional): Featurization processes; None uses all cores
+        shard_size (int): Molecules per shard (default: 50000)
+        cached_shards (int): Loaded shards kept in memory (default: 2)
+
+    Random access across shards reloads them; iterate shard by shard
+    (shard_ranges) to read each shard once per epoch.
+    """
+
+    def __init__(
+        self,
+        root,
+        split,
+        property_name,
+        ratio=0.8,
+        defined=False,
+        classification=False,
+        workers=None,
+        shard_size=DEFAULT_SHARD_SIZE,
+        cached_shards=DEFAULT_CACHED_SHARDS,
+    ):
+        assert split in ["train", "valid", "test"]
+        if shard_size <= 0:
+            raise ValueError(f"shard_size must be positive, got {shard_size}")
+        self.split = split
+        self.property_name = property_name
+        self.ratio = ratio
+        self.defined = defined
+        self.classification = classification
+        self.workers = workers
+        self.shard_size = shard_size
+        self.cached_shards = max(1, cached_shards)
+        self._shards: "OrderedDict[int, Dict[str, object]]" = OrderedDict()
+        super().__init__(osp.abspath(root))
+
+        with open(self.processed_paths[0], encoding="utf-8") as handle:
+            index = json.load(handle)
+        self.shard_files = index["shards"]
+        self.shard_sizes = index["sizes"]
+        self.fail_mole = index["failed"]
+        self.class_num = index["class_num"]
+        self._offsets = np.cumsum([0] + self.shard_sizes).tolist()
+
+    @property
+    def raw_file_names(self) -> List[str]:
+        if self.defined:
+            return ['{}_{}.csv'.format(self.property_name, self.split)]
+        else:
+            return ['{}.csv'.format(self.property_name)]
+
+    @property
+    def processed_file_names(self) -> str:
+        return '{}_{}_2d_shards.json'.format(self.property_name, self.split)
+
+    def shard_file_name(self, shard: int) -> str:
+        return '{}_{}_2d_shard{:05d}.pt'.format(self.property_name, self.split, shard)
+
+    def process(self):
+        suppl, rows = select_rows(self.raw_paths[0], self.root, self.split, self.ratio, self.defined)
+        smiles_column = suppl['SMILES'].to_numpy()
+        values = suppl['value'].to_numpy()
+        smiles_list = [smiles_column[row] for row in rows]
+
+        shard_files: List[str] = []
+        shard_sizes: List[int] = []
+        records: List[CompactMolecule] = []
+        labels: List[object] = []
+        kept_smiles: List[str] = []
+        label_set = set()
+        fail = 0
+        unseen = 0
+
+        def write_shard() -> None:
+            name = self.shard_file_name(len(shard_files))
+            torch.save(pack_shard(records, labels, kept_smiles if self.defined else None, self.classification),
+                       osp.join(self.processed_dir, name))
+            shard_files.append(name)
+            shard_sizes.append(len(records))
+            records.clear()
+            labels.clear()
+            kept_smiles.clear()
+
+        for position, record, error in iter_dataset_records(smiles_list, self.workers):
+            if record is None:
+                if error == UNSEEN_ELEMENTS:
+                    unseen += 1
+                else:
+                    fail += 1
+                continue
+            records.append(record)
+            labels.append(values[rows[position]])
+            if self.classification:
+                label_set.add(labels[-1])
+            kept_smiles.append(smiles_list[position])
+            if len(records) == self.shard_size:
+                write_shard()
+        if records or not shard_files:
+            write_shard()
+
+        class_num = len(label_set) if self.classification else 0
+        print(f'The size of {self.split} dataset: {sum(shard_sizes)} in {len(shard_files)} shards')
+        print(f'Failed to process {fail} molecules:')
+        if unseen:
+            print(f'Skipped {unseen} molecules with unseen elements, please check dataset.')
+        index = {"shards": shard_files, "sizes": shard_sizes, "failed": fail, "class_num": class_num}
+        with open(self.processed_paths[0], "w", encoding="utf-8") as handle:
+            json.dump(index, handle)
+
+    def len(self) -> int:
+        return self._offsets[-1]
+
+    def labels(self) -> torch.Tensor:
+        """Labels of the whole split, shard by shard."""
+        return torch.cat([torch.empty(0)] + [self.load_shard(shard)["y"] for shard in range(len(self.shard_files))])
+
+    def mean(self) -> float:
+        return float(self.labels().mean())
+
+    def std(self) -> float:
+        return float(self.labels().std())
+
+    @property
+    def shard_ranges(self) -> List[Tuple[int, int]]:
+        """(start, end) item range of every shard."""
+        return list(zip(self._offsets[:-1], self._offsets[1:]))
+
+    def load_shard(self, shard: int) -> Dict[str, object]:
+        if shard in self._shards:
+            self._shards.move_to_end(shard)
+            return self._shards[shard]
+        packed = torch.load(osp.join(self.processed_dir, self.shard_files[shard]))
+        self._shards[shard] = packed
+        while len(self._shards) > self.cached_shards:
+            self._shards.popitem(last=False)
+        return packed
+
+    def shard_records(self, shard: int) -> Tuple[List[CompactMolecule], torch.Tensor]:
+        """Compact records and labels of a whole shard, for collate_molecules."""
+        packed = self.load_shard(shard)
+        return unpack_shard(packed), packed["y"]
+
+    def get(self, idx: int) -> Data:
+        shard = bisect.bisect_right(self._offsets, idx) - 1
+        packed = self.load_shard(shard)
+        local = idx - self._offsets[shard]
+        smiles = packed["smiles"][local] if packed.get("smiles") is not None else None
+        return to_data(record_at(packed, local), packed["y"][local], smiles)
+
+
+class ShardBatches(IterableDataset):
+    """
+    Size-bucketed training batches of a ShardedPP_smiles_2d, read shard by shard.
+
+    Every epoch (set_epoch) permutes the shard order with the same seed on
+    all ranks. The work is divided among readers, one per DataLoader worker
+    of each data-parallel rank (see reader_slots): whole shards when there
+    are at least as many shards as readers, so each shard is read once per
+    epoch, and otherwise parts of the batches of each shard, so a small
+    dataset still keeps every reader busy. Within a shard, molecules of
+    similar size are batched together (under a pair budget if max_pairs is
+    set) and the batches are shuffled. Use with DataLoader(batch_size=None).
+
+    Yields:
+        (Data, Tensor): Collated batch (see collate_molecules) and its labels
+    """
+
+    def __init__(
+        self,
+        dataset: ShardedPP_smiles_2d,
+        batch_size: int,
+        max_pairs: Optional[int] = None,
+        full_graph_edges: bool = True,
+        shuffle: bool = True,
+        seed: int = 0,
+        rank: int = 0,
+        world_size: int = 1,
+    ):
+        if batch_size <= 0:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.max_pairs = max_pairs
+        self.full_graph_edges = full_graph_edges
+        self.shuffle = shuffle
+        self.seed = seed
+        self.rank = rank
+        self.world_size = world_size
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def epoch_shards(self) -> List[int]:
+        shards = list(range(len(self.dataset.shard_files)))
+        if self.shuffle:
+            generator = torch.Generator().manual_seed(self.seed * 100003 + self.epoch)
+            shards = [shards[i] for i in torch.randperm(len(shards), generator=generator).tolist()]
+        return shards
+
+    def reader_slots(self, reader: int, readers: int) -> List[Tuple[int, int, int]]:
+        """
+        Work of one reader in the current epoch.
+
+        Args:
+            reader (int): rank * loader workers + worker id
+            readers (int): world_size * loader workers
+
+        Returns:
+            List[Tuple[int, int, int]]: (shard, part, parts); the reader takes
+            every parts-th batch of the shard, starting at part
+        """
+        shards = self.epoch_shards()
+        # With fewer shards than readers, split each shard so that the parts divide evenly among the readers
+        parts = 1 if len(shards) >= readers else readers // math.gcd(len(shards), readers)
+        slots = [(shard, part, parts) for shard in shards for part in range(parts)]
+        return slots[reader::readers]
+
+    def idle_readers(self, readers: int) -> List[int]:
+        """Readers that get no batch in the current epoch (see reader_slots)."""
+        if len(self.dataset.shard_files) >= readers:
+            return []  # Each reader gets at least one whole shard
+        generator = torch.Generator()
+        num_batches = {}
+        for shard in self.epoch_shards():
+            generator.manual_seed(self.shard_seed(shard))
+            num_batches[shard] = len(self.batch_indices(self.dataset.shard_records(shard)[0], generator))
+        return [
+            reader for reader in range(readers)
+            if not any(part < num_batches[shard] for shard, part, _ in self.reader_slots(reader, readers))
+        ]
+
+    def shard_seed(self, shard: int) -> int:
+        # Seeded per shard, so every reader of a shard builds the same batches
+        return self.seed * 100003 + self.epoch * 7919 + shard
+
+    def batch_indices(self, records: Sequence[CompactMolecule], generator: torch.Generator) -> List[List[int]]:
+        order = list(range(len(records)))
+        if self.shuffle:
+            # Random order first, so molecules of equal size land in different batches each epoch
+            order = torch.randperm(len(records), generator=generator).tolist()
+        shuffled = [records[i] for i in order]
+        if self.max_pairs is not None:
+            batches = bucketed_batch_indices(shuffled, self.max_pairs)
+        else:
+            by_size = sorted(range(len(shuffled)), key=lambda i: shuffled[i].x.size(0))
+            batches = [by_size[start:start + self.batch_size] for start in range(0, len(by_size), self.batch_size)]
+        batches = [[order[i] for i in batch] for batch in batches]
+        if self.shuffle:
+            batches = [batches[i] for i in torch.randperm(len(batches), generator=generator).tolist()]
+        return batches
+
+    def __iter__(self) -> Iterator[Tuple[Data, torch.Tensor]]:
+        worker = get_worker_info()
+        num_workers, worker_id = (1, 0) if worker is None else (worker.num_workers, worker.id)
+        slots = self.reader_slots(self.rank * num_workers + worker_id, self.world_size * num_workers)
+        generator = torch.Generator()
+        for shard, part, parts in slots:
+            generator.manual_seed(self.shard_seed(shard))
+            records, labels = self.dataset.shard_records(shard)
+            for indices in self.batch_indices(records, generator)[part::parts]:
+                batch = collate_molecules([records[i] for i in indices], self.full_graph_edges)
+                yield batch, labels[indices]
+
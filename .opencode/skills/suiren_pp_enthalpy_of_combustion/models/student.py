@@ -0,0 +1,121 @@
+"""
+Multi-task student model distilled from the per-property Suiren checkpoints.
+
+The student is a small PredictModel2D with one output per property,
+trained by suiren_pp_all/distill_student.py to reproduce the teachers'
+normalized predictions ((prediction - mean) / std, with each teacher's
+norm_factor). One forward pass gives every property.
+
+Checkpoint (torch.save dict):
+    state_dict    student weights
+    config        PredictModel2D keyword arguments
+    properties    property name of each output, in order
+    norm_factors  property -> (mean, std) of its teacher
+    agreement     property -> agreement statistics with its teacher on the
+                  held-out part of the distillation corpus
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+
+from models.finetune_model import PredictModel2D
+
+STUDENT_CONFIG = {
+    "pretrain_num_layer": 2,
+    "finetune_num_layer": 4,
+    "pretrain_embed_dim": 128,
+    "finetune_embed_dim": 128,
+    "d_proj": 128,
+}
+
+
+def student_model(num_tasks: int, config: Optional[Dict[str, int]] = None) -> PredictModel2D:
+    """A student with one regression output per task."""
+    config = dict(STUDENT_CONFIG if config is None else config)
+    return PredictModel2D(drop_ratio=0.0, class_num=num_tasks, class_flag=True, **config)
+
+
+class StudentHead(nn.Module):
+    """
+    One property of a multi-task student, shaped like a single-property model.
+
+    The full student output is exposed as the shared stage of
+    models.shared_backbone.run_grouped, so grouping all heads of a student
+    runs it once per batch.
+    """
+
+    def __init__(self, student: nn.Module, index: int):
+        super().__init__()
+        self.student = student
+        self.index = index
+
+    def forward(self, data):
+        return self.student(data)[:, self.index:self.index + 1]
+
+    def pretrain_embeddings(self, data):
+        return self.student(data)
+
+    def forward_from_embeddings(self, data, outputs):
+        return outputs[:, self.index:self.index + 1]
+
+
+def save_student(
+    path: Path,
+    model: nn.Module,
+    config: Dict[str, int],
+    properties: Sequence[str],
+    norm_factors: Dict[str, Tuple[float, float]],
+    agreement: Dict[str, Dict[str, float]],
+) -> None:
+    torch.save({
+        "state_dict": model.state_dict(),
+        "config": dict(config),
+        "properties": list(properties),
+        "norm_factors": {name: list(norm_factors[name]) for name in properties},
+        "agreement": agreement,
+    }, path)
+
+
+def load_student(path: Path, device: torch.device):
+    """
+    Returns:
+        (model, properties, norm_factors, agreement)
+    """
+    if not Path(path).is_file():
+        raise FileNotFoundError(
+            f"Student model not found: {path}. Train it with suiren_pp_all/distill_student.py."
+        )
+    checkpoint = torch.load(path, map_location="cpu")
+    properties: List[str] = list(checkpoint["properties"])
+    model = student_model(len(properties), checkpoint["config"])
+    model.load_state_dict(checkpoint["state_dict"], strict=True)
+    model = model.to(device).eval()
+    norm_factors = {name: tuple(values) for name, values in checkpoint["norm_factors"].items()}
+    return model, properties, norm_factors, checkpoint.get("agreement", {})
+
+
+def agreement_statistics(student: torch.Tensor, teacher: torch.Tensor) -> Dict[str, float]:
+    """
+    Agreement of student with teacher predictions of one property (same units).
+
+    Returns:
+        dict with mae, rmse, max_abs, r2 (teacher as reference), pearson and count
+    """
+    student = student.double()
+    teacher = teacher.double()
+    error = student - teacher
+    centered = teacher - teacher.mean()
+    ss_tot = float((centered ** 2).sum())
+    student_centered = student - student.mean()
+    denom = float(centered.norm() * student_centered.norm())
+    return {
+        "mae": float(error.abs().mean()),
+        "rmse": float(error.pow(2).mean().sqrt()),
+        "max_abs": float(error.abs().max()),
+        "r2": 1.0 - float((error ** 2).sum()) / ss_tot if ss_tot > 0 else float("nan"),
+        "pearson": float((centered * student_centered).sum()) / denom if denom > 0 else float("nan"),
+        "count": int(teacher.numel()),
+    }
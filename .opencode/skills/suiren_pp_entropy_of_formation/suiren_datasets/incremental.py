@@ -0,0 +1,101 @@
+"""
+Incremental re-prediction of CSV files (the --incremental mode).
+
+The output CSV gets a "suiren_key" column next to the predictions. The key
+of a row is a short hash of the row's SMILES text and of the model keys of
+the predicted columns: the SHA-256 checksum of each loaded checkpoint plus
+its inference variant, as in the prediction cache. The checksum is taken
+from the record verify_checkpoint keeps next to the checkpoint while the
+file's size and mtime still match it, so unchanged checkpoints are not
+hashed again. A later run reuses the
+predictions of every row whose SMILES and models have the same key, taken
+from the file it writes to (the input itself when results are written
+back). New rows, edited SMILES and rows scored by a different checkpoint
+get new keys and are predicted again; the output is always written in full.
+"""
+
+import hashlib
+import math
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from models.checkpoint_integrity import read_checksum, record_checksum
+from suiren_datasets.prediction_cache import file_checksum
+
+KEY_COLUMN = "suiren_key"
+KEY_LENGTH = 16
+
+
+def model_key_for(model_file: Path, variant: str) -> str:
+    """Model key in the format of PredictionCache.model_key, without a cache database."""
+    record = read_checksum(model_file)
+    stat = model_file.stat()
+    if record is not None and record.get("size") == stat.st_size and record.get("mtime_ns") == stat.st_mtime_ns:
+        return f"{record['sha256']}:{variant}"
+    checksum = file_checksum(model_file)
+    if model_file.suffix == ".pt":
+        # Other artifacts (.onnx) would share the record file of their checkpoint
+        record_checksum(model_file, checksum)
+    return f"{checksum}:{variant}"
+
+
+class IncrementalScores:
+    """
+    Predictions of earlier runs, indexed by row key.
+
+    Args:
+        model_keys (Sequence[str]): Model key of each value column, in order
+        value_columns (Sequence[str]): Output columns holding the predictions
+    """
+
+    def __init__(self, model_keys: Sequence[str], value_columns: Sequence[str]):
+        self.value_columns = list(value_columns)
+        self._model_digest = hashlib.sha256("\n".join(model_keys).encode("utf-8")).digest()
+        self._scores: Dict[str, Tuple[float, ...]] = {}
+        self.reused = 0
+        self.predicted = 0
+
+    def row_key(self, smiles) -> Optional[str]:
+        if pd.isna(smiles):
+            return None
+        digest = hashlib.sha256(self._model_digest + str(smiles).strip().encode("utf-8"))
+        return digest.hexdigest()[:KEY_LENGTH]
+
+    def row_keys(self, smiles_list: Sequence[str]) -> List[Optional[str]]:
+        return [self.row_key(smiles) for smiles in smiles_list]
+
+    def remember(self, df: pd.DataFrame) -> None:
+        """Index the scored rows of an earlier output (rows with a key and every value)."""
+        if KEY_COLUMN not in df.columns or any(column not in df.columns for column in self.value_columns):
+            return
+        for key, *values in zip(df[KEY_COLUMN], *(df[column] for column in self.value_columns)):
+            if isinstance(key, str) and all(_is_number(value) for value in values):
+                self._scores[key] = tuple(float(value) for value in values)
+
+    def load(self, path: Path) -> None:
+        """Index the scored rows of an earlier output file, reading only the needed columns."""
+        wanted = {KEY_COLUMN, *self.value_columns}
+        self.remember(pd.read_csv(path, usecols=lambda column: column in wanted, dtype={KEY_COLUMN: str}))
+
+    def lookup(self, smiles_list: Sequence[str]) -> Dict[int, List[float]]:
+        """Row index -> earlier values of the value columns, for the rows that can be reused."""
+        found: Dict[int, List[float]] = {}
+        for idx, key in enumerate(self.row_keys(smiles_list)):
+            values = self._scores.get(key) if key is not None else None
+            if values is not None:
+                found[idx] = list(values)
+        self.reused += len(found)
+        self.predicted += len(smiles_list) - len(found)
+        return found
+
+    def summary(self) -> str:
+        return f"Incremental: {self.reused} rows reused, {self.predicted} rows predicted"
+
+
+def _is_number(value) -> bool:
+    try:
+        return not math.isnan(float(value))
+    except (TypeError, ValueError):
+        return False
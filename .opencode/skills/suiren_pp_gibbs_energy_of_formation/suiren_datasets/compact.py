@@ -0,0 +1,181 @@
+"""
+Compact molecule records and a batch collator for Suiren inference.
+
+A record keeps only the atom features and the bond list in small integer
+dtypes. The fully-connected edge_index_all that from_rdmol would store per
+molecule (N*(N-1) pairs as int64) is generated for the whole batch at collate
+time, and skipped entirely when the model runs a dense full-graph mode.
+"""
+
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import torch
+from torch_geometric.data import Data
+
+from suiren_datasets.fast_featurize import fast_from_smiles
+
+
+class CompactMolecule(NamedTuple):
+    x: torch.Tensor  # [num_atoms, 5] uint8 atom features
+    edge_index: torch.Tensor  # [2, num_bonds * 2] int32 local edges
+    edge_attr: torch.Tensor  # [num_bonds * 2, 3] uint8 bond features
+
+
+def compact_from_graph(x, edge_index, edge_attr) -> CompactMolecule:
+    # Every x_map / e_map index used by from_rdmol is below 256
+    return CompactMolecule(
+        x=x.to(torch.uint8),
+        edge_index=edge_index.to(torch.int32),
+        edge_attr=edge_attr.to(torch.uint8),
+    )
+
+
+def compact_from_smiles(smiles: str):
+    """
+    Featurize a SMILES string into a CompactMolecule without building edge_index_all.
+
+    Returns:
+        (CompactMolecule, mol_flag) with the same meaning of mol_flag as from_smiles.
+    """
+    (x, edge_index, edge_attr, _), mol_flag = fast_from_smiles(smiles, full_graph=False)
+    return compact_from_graph(x, edge_index, edge_attr), mol_flag
+
+
+def full_graph_edge_index(num_nodes: torch.Tensor) -> torch.Tensor:
+    """
+    Block-diagonal all-pairs edge index for a batch of graphs.
+
+    The result is identical to collating the per-molecule edge_index_all of
+    from_rdmol: for each graph, the pairs (i, j) with i < j in lexicographic
+    order, followed by the same pairs reversed, shifted by the node offset of
+    the graph.
+
+    Args:
+        num_nodes (LongTensor): Number of nodes of each graph [num_graphs]
+
+    Returns:
+        LongTensor: Edge indices of shape [2, sum(n * (n - 1))]
+    """
+    num_nodes = num_nodes.to(torch.long)
+    node_offset = torch.cumsum(num_nodes, dim=0) - num_nodes
+    total_nodes = int(num_nodes.sum())
+
+    # Local index of each node and the size of its graph
+    graph_size = torch.repeat_interleave(num_nodes, num_nodes)
+    local_idx = torch.arange(total_nodes) - torch.repeat_interleave(node_offset, num_nodes)
+
+    # Node i is the first element of (n - 1 - i) forward pairs (i, j), j > i
+    pair_count = graph_size - 1 - local_idx
+    total_pairs = int(pair_count.sum())
+    src = torch.repeat_interleave(torch.arange(total_nodes), pair_count)
+    block_start = torch.repeat_interleave(torch.cumsum(pair_count, dim=0) - pair_count, pair_count)
+    dst = src + 1 + (torch.arange(total_pairs) - block_start)
+
+    # Forward pairs of graph g are followed by its reversed pairs
+    graph_pairs = num_nodes * (num_nodes - 1) // 2
+    pair_offset = torch.repeat_interleave(torch.cumsum(graph_pairs, dim=0) - graph_pairs, graph_pairs)
+    pair_size = torch.repeat_interleave(graph_pairs, graph_pairs)
+    forward_pos = torch.arange(total_pairs) + pair_offset
+    reverse_pos = forward_pos + pair_size
+
+    edge_index_all = torch.empty(2, 2 * total_pairs, dtype=torch.long)
+    edge_index_all[0, forward_pos] = src
+    edge_index_all[1, forward_pos] = dst
+    edge_index_all[0, reverse_pos] = dst
+    edge_index_all[1, reverse_pos] = src
+    return edge_index_all
+
+
+def collate_molecules(records: Sequence[CompactMolecule], full_graph_edges: bool = True) -> Data:
+    """
+    Collate compact records into one batched graph for PredictModel2D.
+
+    Args:
+        records (Sequence[CompactMolecule]): Molecules of the batch
+        full_graph_edges (bool): Build edge_index_all. Only the "sparse" full-graph
+                                 mode of GATConv needs it. (default: True)
+
+    Returns:
+        Data: Batched graph with x, edge_index, edge_attr, edge_index_all, batch and
+              num_atoms (nodes per graph)
+    """
+    num_nodes = torch.tensor([record.x.size(0) for record in records], dtype=torch.long)
+    num_edges = torch.tensor([record.edge_index.size(1) for record in records], dtype=torch.long)
+    node_offset = torch.cumsum(num_nodes, dim=0) - num_nodes
+
+    x = torch.cat([record.x for record in records], dim=0).to(torch.long)
+    edge_attr = torch.cat([record.edge_attr for record in records], dim=0).to(torch.long).view(-1, 3)
+    edge_index = torch.cat([record.edge_index for record in records], dim=1).to(torch.long).view(2, -1)
+    edge_index = edge_index + torch.repeat_interleave(node_offset, num_edges).unsqueeze(0)
+    batch = torch.repeat_interleave(torch.arange(len(records)), num_nodes)
+
+    edge_index_all: Optional[torch.Tensor] = None
+    if full_graph_edges:
+        edge_index_all = full_graph_edge_index(num_nodes)
+
+    return Data(
+        x=x,
+        edge_index=edge_index,
+        edge_attr=edge_attr,
+        edge_index_all=edge_index_all,
+        batch=batch,
+        num_atoms=num_nodes,
+    )
+
+
+def bucketed_batch_indices(records: Sequence[CompactMolecule], max_pairs: int) -> List[List[int]]:
+    """
+    Group records into batches of similar size under a total-pair budget.
+
+    Records are sorted by atom count (stably, so equal sizes keep their input
+    order) and packed greedily while the summed N^2 of the batch, which bounds
+    both edge_index_all and the padded dense attention, stays within max_pairs.
+    A molecule larger than the budget forms a batch of its own.
+
+    Returns:
+        List[List[int]]: Indices into records of each batch
+    """
+    if max_pairs <= 0:
+        raise ValueError(f"max_pairs must be positive, got {max_pairs}")
+
+    num_nodes = torch.tensor([record.x.size(0) for record in records], dtype=torch.long)
+    order = torch.sort(num_nodes, stable=True).indices.tolist()
+
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_pairs = 0
+    for idx in order:
+        pairs = int(num_nodes[idx]) ** 2
+        if current and current_pairs + pairs > max_pairs:
+            batches.append(current)
+            current, current_pairs = [], 0
+        current.append(idx)
+        current_pairs += pairs
+    if current:
+        batches.append(current)
+    return batches
+
+
+def iterate_batches(
+    records: Sequence[CompactMolecule],
+    batch_size: int,
+    full_graph_edges: bool = True,
+    max_pairs: Optional[int] = None,
+) -> Iterator[Tuple[List[int], Data]]:
+    """
+    Yield collated batches together with the indices of their records.
+
+    Without max_pairs, batches are batch_size consecutive records in input
+    order. With max_pairs, they are size-bucketed by bucketed_batch_indices and
+    batch_size is ignored; callers scatter results back through the indices.
+    """
+    if max_pairs is None:
+        index_batches = [
+            list(range(start, min(start + batch_size, len(records))))
+            for start in range(0, len(records), batch_size)
+        ]
+    else:
+        index_batches = bucketed_batch_indices(records, max_pairs)
+
+    for indices in index_batches:
+        yield indices, collate_molecules([records[idx] for idx in indices], full_graph_edges)
@@ -0,0 +1,826 @@
+"""
+Suiren property prediction shared by the predict scripts.
+
+SuirenPredictor loads the property checkpoints, featurizes SMILES and runs
+the models, with the optional feature and prediction caches, deduplication,
+incremental scores and data-parallel inference. Each
+suiren_pp_<property>/<property>_predict.py script, all_properties_predict.py
+and suiren_server.py only parse their arguments and read and write inputs and
+outputs around SuirenPredictor.predict_rows, so every entry point predicts
+the same way.
+
+Checkpoints are found relative to the skills directory, so the copy of this
+module in any suiren_pp_* skill resolves the same files.
+"""
+
+import argparse
+import contextlib
+import functools
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import torch
+
+from models.checkpoint_integrity import OFFLINE_ENV, download_checkpoint, downloads_disabled, verify_checkpoint
+from models.data_parallel import DataParallelInference, auto_layout, available_cores
+from models.export import exported_path_for, load_exported_model
+from models.finetune_model import standard_finetune
+from models.precision import apply_precision
+from models.shared_backbone import backbone_fingerprint, group_by_backbone, run_grouped
+from models.shared_store import load_manifest, manifest_path_for, resolve_checkpoint_file
+from models.student import StudentHead, load_student
+from suiren_datasets.compact import CompactMolecule, compact_from_smiles, iterate_batches
+from suiren_datasets.dedup import Deduplicator, canonical_smiles
+from suiren_datasets.feature_cache import DEFAULT_MAX_SIZE_MB, FeatureCache, open_feature_cache
+from suiren_datasets.incremental import IncrementalScores, model_key_for
+from suiren_datasets.parallel import FeaturizerPool, iter_featurized
+from suiren_datasets.prediction_cache import PredictionCache
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+SKILLS_ROOT = Path(__file__).resolve().parents[2]
+ALLOWED_ELEMENTS = {1, 6, 7, 8, 9, 15, 16, 17, 35, 53}
+
+# 所有 suiren_pp_<property> 技能对应的性质名称，模型文件为 suiren_pp_<property>/<property>_regression.pt
+PROPERTIES = (
+    "acentric_factor",
+    "boiling_point",
+    "coefficient_of_thermal_expansion_of_liquid",
+    "critical_compressibility",
+    "critical_density",
+    "critical_pressure",
+    "critical_temperature",
+    "critical_volume",
+    "density_of_liquid",
+    "diffusion_coefficient_at_infinite_dilution_in_water",
+    "diffusion_coefficient_in_air",
+    "dipole_moment",
+    "enthalpy_of_combustion",
+    "enthalpy_of_formation",
+    "enthalpy_of_fusion",
+    "enthalpy_of_vaporization",
+    "entropy_of_formation",
+    "entropy_of_gas",
+    "flash_point",
+    "gibbs_energy_of_formation",
+    "heat_capacity_of_gas",
+    "heat_capacity_of_liquid",
+    "heat_capacity_of_solid",
+    "helmholtz_energy_of_formation",
+    "henrys_law_constant_for_compound_in_water",
+    "henrys_law_constant_for_gas_in_water",
+    "hydration_free_energy",
+    "internal_energy_of_formation",
+    "liquid_volume",
+    "lower_explosive_limit",
+    "melting_point",
+    "octanol_water_partition_coefficient",
+    "radius_of_gyration",
+    "refractive_index",
+    "solubility_in_water",
+    "solubility_in_water_containing_salt",
+    "solubility_of_gas_in_water",
+    "solubility_parameter",
+    "surface_tension",
+    "thermal_conductivity_of_gas",
+    "thermal_conductivity_of_liquid",
+    "upper_explosive_limit",
+    "van_der_waals_area",
+    "van_der_waals_volume",
+    "vapor_pressure",
+    "viscosity_of_gas",
+    "viscosity_of_liquid",
+)
+
+
+def parse_properties(properties_arg: str) -> List[str]:
+    value = properties_arg.strip()
+    if not value or value.lower() == "all":
+        return list(PROPERTIES)
+
+    selected: List[str] = []
+    for name in value.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name not in PROPERTIES:
+            raise ValueError(
+                f"Unknown property: {name}. Available properties: {', '.join(PROPERTIES)}"
+            )
+        if name not in selected:
+            selected.append(name)
+
+    if not selected:
+        raise ValueError("No property specified.")
+    return selected
+
+
+def model_path_for(property_name: str) -> Path:
+    return SKILLS_ROOT / f"suiren_pp_{property_name}" / f"{property_name}_regression.pt"
+
+
+def resolve_device(device_arg: str) -> torch.device:
+    if device_arg == "cpu":
+        return torch.device("cpu")
+    if device_arg == "cuda":
+        if not torch.cuda.is_available():
+            raise RuntimeError("There is no CUDA device available in the current environment.")
+        return torch.device("cuda")
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def peak_memory_mb(device: torch.device) -> Optional[float]:
+    if device.type == "cuda":
+        return torch.cuda.max_memory_allocated(device) / (1024 * 1024)
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def format_peak_memory(device: torch.device) -> str:
+    peak = peak_memory_mb(device)
+    if peak is None:
+        return "Peak memory: unavailable"
+    return f"Peak memory: {peak:.1f} MB"
+
+
+def load_torch_file(path: Path):
+    try:
+        return torch.load(path, map_location="cpu", weights_only=False)
+    except TypeError:
+        return torch.load(path, map_location="cpu")
+
+
+def normalize_state_dict(checkpoint_obj) -> Tuple[Dict[str, torch.Tensor], Dict[str, object]]:
+    if isinstance(checkpoint_obj, dict) and "state_dict" in checkpoint_obj:
+        state_dict = checkpoint_obj["state_dict"]
+        meta = checkpoint_obj
+    elif isinstance(checkpoint_obj, dict):
+        state_dict = checkpoint_obj
+        meta = checkpoint_obj
+    else:
+        raise TypeError("Unsupported checkpoint format.")
+
+    normalized = {}
+    for key, value in state_dict.items():
+        new_key = key[7:] if key.startswith("module.") else key
+        normalized[new_key] = value
+    return normalized, meta
+
+
+def to_float(value) -> float:
+    if isinstance(value, torch.Tensor):
+        return float(value.item())
+    return float(value)
+
+
+def download_model_from_modelscope(model_path: Path) -> bool:
+    """
+    尝试从 ModelScope 下载模型文件。
+
+    文件先下载到临时目录，校验完整后再移动到 model_path 并记录校验和
+    （见 models/checkpoint_integrity.py）。设置环境变量 SUIREN_OFFLINE=1 时不访问网络，
+    模型文件应预先由 suiren_pp_all/prefetch_models.py 下载。
+
+    Args:
+        model_path: 模型文件路径
+
+    Returns:
+        True 如果下载成功，False 如果下载失败
+    """
+    if model_path.is_file():
+        return True
+
+    print(f"Model file not found: {model_path}")
+    if downloads_disabled():
+        print(f"Downloads are disabled by {OFFLINE_ENV}; run suiren_pp_all/prefetch_models.py first.")
+        return False
+
+    print(f"Attempting to download model from ModelScope...")
+    try:
+        download_checkpoint(model_path)
+    except (RuntimeError, OSError) as e:
+        print(str(e))
+        return False
+    print(f"Model downloaded successfully to: {model_path}")
+    return True
+
+
+def load_model(model_path: Path, device: torch.device):
+    manifest_path = manifest_path_for(model_path)
+    shared = manifest_path.is_file()
+    if shared:
+        # 去重存储（dedup_checkpoints.py）：权重以内存映射方式加载，多个性质共享相同张量
+        state_dict, meta = load_manifest(manifest_path)
+    else:
+        if not model_path.is_file():
+            # 尝试从 ModelScope 下载
+            if not download_model_from_modelscope(model_path):
+                error_msg = (
+                    f"{model_path.parent}目录下不存在模型文件，且下载失败，"
+                    f"需要从\"https://modelscope.cn/models/ajy112/Suiren-Model-Set\"手动下载"
+                )
+                print(error_msg)
+                raise FileNotFoundError(error_msg)
+
+        verify_checkpoint(model_path)
+        checkpoint_obj = load_torch_file(model_path)
+        state_dict, meta = normalize_state_dict(checkpoint_obj)
+
+    model = standard_finetune(class_flag=False, class_num=2)
+    if shared:
+        # 直接以映射的张量作为模型参数，避免复制
+        model.load_state_dict(state_dict, strict=True, assign=True)
+    else:
+        model.load_state_dict(state_dict, strict=True)
+    model = model.to(device)
+    model.eval()
+
+    norm_factor = None
+    if isinstance(meta, dict) and "norm_factor" in meta:
+        norm_values = meta["norm_factor"]
+        if isinstance(norm_values, (list, tuple)) and len(norm_values) == 2:
+            mean, std = norm_values
+            norm_factor = (to_float(mean), to_float(std))
+
+    return model, norm_factor
+
+
+def load_models(
+    property_names: Sequence[str],
+    device: torch.device,
+    backend: str = "eager",
+) -> Dict[str, Tuple[torch.nn.Module, Optional[Tuple[float, float]]]]:
+    models: Dict[str, Tuple[torch.nn.Module, Optional[Tuple[float, float]]]] = {}
+    for name in property_names:
+        model_path = model_path_for(name)
+        if backend == "eager":
+            print(f"Loading model: {model_path}", flush=True)
+            models[name] = load_model(model_path, device)
+        else:
+            exported_path = exported_path_for(model_path, backend)
+            print(f"Loading model: {exported_path}", flush=True)
+            models[name] = load_exported_model(exported_path, backend, device)
+    return models
+
+
+def detect_smiles_column(df: pd.DataFrame, preferred: Optional[str] = None) -> str:
+    if preferred:
+        if preferred not in df.columns:
+            raise ValueError(f"The specified column does not exist in the CSV: {preferred}")
+        return preferred
+
+    exact_candidates = [
+        "SMILES",
+        "smiles",
+        "Smiles",
+        "canonical_smiles",
+        "Canonical_SMILES",
+    ]
+    for column in exact_candidates:
+        if column in df.columns:
+            return column
+
+    fuzzy_candidates = [column for column in df.columns if "smiles" in str(column).lower()]
+    if len(fuzzy_candidates) == 1:
+        return fuzzy_candidates[0]
+
+    if len(df.columns) == 1:
+        return df.columns[0]
+
+    raise ValueError(
+        "Unable to automatically identify the SMILES column. Please specify it explicitly using --smiles-column."
+    )
+
+
+def looks_like_csv_path(input_value: str) -> bool:
+    return Path(input_value).suffix.lower() == ".csv"
+
+
+def load_inputs(input_value: str, smiles_column: Optional[str]) -> Tuple[str, pd.DataFrame, str, Optional[Path]]:
+    input_path = Path(input_value).expanduser()
+
+    if input_path.is_file():
+        df = pd.read_csv(input_path)
+        smiles_col = detect_smiles_column(df, smiles_column)
+        return "csv", df.copy(), smiles_col, input_path.resolve()
+
+    if looks_like_csv_path(input_value):
+        raise FileNotFoundError(f"Input CSV not found: {input_path.resolve()}")
+
+    df = pd.DataFrame({"SMILES": [input_value]})
+    return "smiles", df, "SMILES", None
+
+
+def build_graph(
+    smiles: str,
+    feature_cache: Optional[FeatureCache] = None,
+) -> Tuple[Optional[CompactMolecule], Optional[str]]:
+    if pd.isna(smiles):
+        return None, "empty_smiles"
+
+    smiles = str(smiles).strip()
+    if not smiles:
+        return None, "empty_smiles"
+
+    if feature_cache is None:
+        record, mol_flag = compact_from_smiles(smiles)
+    else:
+        record, mol_flag = feature_cache.featurize(smiles)
+    if not mol_flag:
+        return None, "invalid_smiles"
+
+    atom_types = set(record.x[:, 0].tolist())
+    if not atom_types.issubset(ALLOWED_ELEMENTS):
+        return None, "unsupported_elements"
+
+    return record, None
+
+
+def run_inference(
+    models: Dict[str, Tuple[torch.nn.Module, Optional[Tuple[float, float]]]],
+    data_list: Sequence[CompactMolecule],
+    device: torch.device,
+    batch_size: int,
+    full_graph_edges: bool = True,
+    max_batch_pairs: Optional[int] = None,
+    backbone_groups: Optional[List[List[str]]] = None,
+) -> Dict[str, List[float]]:
+    """
+    Collate each batch once and run every requested property head on it.
+
+    Models in the same backbone group (see models/shared_backbone.py) share
+    one pre-trained backbone pass per batch; by default every model runs on
+    its own.
+
+    Returns:
+        Mapping from property name to predictions, in the order of ``data_list``.
+    """
+    outputs: Dict[str, List[float]] = {name: [0.0] * len(data_list) for name in models}
+    modules = {name: model for name, (model, _) in models.items()}
+    if backbone_groups is None:
+        backbone_groups = [[name] for name in models]
+
+    with torch.no_grad():
+        for indices, batch in iterate_batches(data_list, batch_size, full_graph_edges, max_batch_pairs):
+            batch = batch.to(device)
+            logits_by_name = run_grouped(modules, backbone_groups, batch)
+            for name, (model, norm_factor) in models.items():
+                logits = logits_by_name[name]
+
+                preds = logits.view(-1).detach().cpu()
+                if norm_factor is not None:
+                    mean, std = norm_factor
+                    preds = preds * std + mean
+                column = outputs[name]
+                for idx, pred in zip(indices, preds.tolist()):
+                    column[idx] = float(pred)
+
+    return outputs
+
+
+def predict_properties(
+    smiles_list: Sequence[str],
+    models: Dict[str, Tuple[torch.nn.Module, Optional[Tuple[float, float]]]],
+    device: torch.device,
+    args: argparse.Namespace,
+    feature_cache: Optional[FeatureCache] = None,
+    prediction_cache: Optional[PredictionCache] = None,
+    model_keys: Optional[Dict[str, str]] = None,
+    deduplicator: Optional[Deduplicator] = None,
+    backbone_groups: Optional[List[List[str]]] = None,
+    data_parallel: Optional[DataParallelInference] = None,
+    incremental: Optional[IncrementalScores] = None,
+    featurizer_pool: Optional[FeaturizerPool] = None,
+) -> Tuple[List[Optional[str]], Dict[str, List[Optional[float]]]]:
+    """
+    Featurize and predict every requested property for a list of SMILES.
+
+    With incremental scores, rows whose key is unchanged since an earlier
+    run keep their values. With a prediction cache, rows cached for every
+    property are taken from it and the remaining rows are predicted for all
+    properties. With a deduplicator, rows sharing a canonical SMILES are
+    predicted once.
+
+    Returns:
+        (errors, value_columns): Per-row error (None when valid) and, for each
+        property, the per-row prediction (None when invalid).
+    """
+    errors: List[Optional[str]] = [None] * len(smiles_list)
+    value_columns: Dict[str, List[Optional[float]]] = {
+        name: [None] * len(smiles_list) for name in models
+    }
+    featurize = functools.partial(build_graph, feature_cache=feature_cache)
+
+    row_indices: Sequence[int] = range(len(smiles_list))
+    inputs: Sequence[str] = smiles_list
+    if incremental is not None:
+        reused = incremental.lookup(smiles_list)
+        for idx, values in reused.items():
+            for column, value in zip(value_columns.values(), values):
+                column[idx] = value
+        row_indices = [idx for idx in row_indices if idx not in reused]
+        inputs = [smiles_list[idx] for idx in row_indices]
+    duplicates: Dict[int, List[int]] = {}
+    if prediction_cache is not None or deduplicator is not None:
+        canonicals = [canonical_smiles(smiles) for smiles in smiles_list]
+        if prediction_cache is not None:
+            cached = prediction_cache.lookup_rows([model_keys[name] for name in models], canonicals)
+            for idx, values in cached.items():
+                for column, value in zip(value_columns.values(), values):
+                    column[idx] = value
+            row_indices = [idx for idx in row_indices if idx not in cached]
+        if deduplicator is not None:
+            row_indices, duplicates = deduplicator.plan(row_indices, canonicals)
+        # Featurize from the canonical SMILES so that stored and shared values do not depend on the spelling
+        inputs = [smiles_list[idx] if canonicals[idx] is None else canonicals[idx] for idx in row_indices]
+
+    for start, featurized in iter_featurized(inputs, featurize, featurizer_pool):
+        data_list: List[CompactMolecule] = []
+        valid_indices: List[int] = []
+        for offset, (graph, error) in enumerate(featurized, start=start):
+            idx = row_indices[offset]
+            if graph is None:
+                errors[idx] = error
+                continue
+
+            data_list.append(graph)
+            valid_indices.append(idx)
+
+        if data_list:
+            if data_parallel is not None:
+                predictions = data_parallel(data_list)
+            else:
+                predictions = run_inference(
+                    models=models,
+                    data_list=data_list,
+                    device=device,
+                    batch_size=args.batch_size,
+                    full_graph_edges=args.full_graph_mode == "sparse",
+                    max_batch_pairs=args.max_batch_pairs,
+                    backbone_groups=backbone_groups,
+                )
+            for name, column in value_columns.items():
+                for row_idx, pred in zip(valid_indices, predictions[name]):
+                    column[row_idx] = pred
+                if prediction_cache is not None:
+                    prediction_cache.store(model_keys[name], {
+                        canonicals[row_idx]: pred for row_idx, pred in zip(valid_indices, predictions[name])
+                    })
+
+    for representative, rows in duplicates.items():
+        for idx in rows:
+            errors[idx] = errors[representative]
+            for column in value_columns.values():
+                column[idx] = column[representative]
+
+    return errors, value_columns
+
+
+def prediction_arrays(
+    errors: Sequence[Optional[str]],
+    value_columns: Dict[str, Sequence[Optional[float]]],
+) -> Dict[str, np.ndarray]:
+    """
+    Convert the output of predict_properties into arrays.
+
+    Returns:
+        One float64 array per property (NaN where the SMILES is invalid),
+        "valid" (bool mask) and "error" (object array of error codes or None).
+    """
+    arrays = {
+        name: np.array([np.nan if value is None else value for value in column], dtype=np.float64)
+        for name, column in value_columns.items()
+    }
+    arrays["valid"] = np.array([error is None for error in errors], dtype=bool)
+    arrays["error"] = np.array(errors, dtype=object)
+    return arrays
+
+
+def model_memory_bytes(model: torch.nn.Module) -> int:
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class SuirenPredictor:
+    """
+    In-process Suiren predictions, shared by the predict scripts, suiren_server.py and Python callers.
+
+        predictor = SuirenPredictor(device="cpu")
+        result = predictor.predict(["CCO", "c1ccccc1"], ["boiling_point", "melting_point"])
+        result["boiling_point"]  # float64 array, NaN where result["valid"] is False
+
+    Models are loaded on the first call that needs them and kept for later
+    calls; with max_memory_mb, the least recently used property models are
+    unloaded once their weights exceed it (the most recently used one is
+    always kept). unload releases models explicitly and close also releases
+    the caches and inference workers.
+
+    Instances are thread-safe: a property is loaded once even when several
+    threads request it together, and concurrent calls share the loaded
+    models, which are only read (eval mode, no_grad). Calls that use a cache,
+    deduplication or inference workers run one at a time.
+
+    Args:
+        device (str or torch.device): "auto", "cpu", "cuda" or a device
+        batch_size (int): Inference batch size
+        max_batch_pairs (int, optional): Atom-pair budget per batch
+        full_graph_mode (str): Full-connect attention mode of loaded models
+        memory_budget_mb (float, optional): Attention memory budget; implies the "chunked" mode
+        backend (str): "eager" or an exported backend (see export_models.py)
+        precision (str): Weight precision of eager models
+        workers (int): Featurization processes (0: in the calling thread)
+        feature_cache (str or Path, optional): Feature cache directory
+        feature_cache_size_mb (float): Size limit of the feature cache
+        prediction_cache (str or Path, optional): Prediction cache file
+        dedup (bool): Predict each distinct molecule (by canonical SMILES) once
+        student_path (str or Path, optional): Predict with this distilled student
+            instead of the property models (--fast-profile)
+        inference_workers (int or "auto"): Data-parallel CPU inference processes (0: none)
+        threads_per_worker (int, optional): Intra-op threads of each inference process
+        max_memory_mb (float, optional): Cap on the weights of resident property models
+    """
+
+    def __init__(
+        self,
+        device: Union[str, torch.device] = "auto",
+        batch_size: int = 32,
+        max_batch_pairs: Optional[int] = None,
+        full_graph_mode: str = "sparse",
+        memory_budget_mb: Optional[float] = None,
+        backend: str = "eager",
+        precision: str = "fp32",
+        workers: int = 0,
+        feature_cache: Optional[Union[str, Path]] = None,
+        feature_cache_size_mb: float = DEFAULT_MAX_SIZE_MB,
+        prediction_cache: Optional[Union[str, Path]] = None,
+        dedup: bool = False,
+        student_path: Optional[Union[str, Path]] = None,
+        inference_workers: Union[int, str] = 0,
+        threads_per_worker: Optional[int] = None,
+        max_memory_mb: Optional[float] = None,
+    ):
+        if memory_budget_mb is not None:
+            full_graph_mode = "chunked"
+        if backend != "eager" and (full_graph_mode != "sparse" or precision != "fp32"):
+            raise ValueError(f"The {backend} backend only supports the sparse full-graph mode at fp32.")
+        if student_path is not None and backend != "eager":
+            raise ValueError("The student model is only supported with the eager backend.")
+        self.device = resolve_device(device) if isinstance(device, str) else device
+        if inference_workers != 0 and self.device.type != "cpu":
+            raise ValueError("--inference-workers is only supported with --device cpu.")
+
+        # The settings predict_properties reads from the command line arguments
+        self.options = argparse.Namespace(
+            batch_size=batch_size,
+            max_batch_pairs=max_batch_pairs,
+            full_graph_mode=full_graph_mode,
+            workers=workers,
+        )
+        self.memory_budget_mb = memory_budget_mb
+        self.backend = backend
+        self.precision = precision
+        self.student_path = None if student_path is None else Path(student_path).expanduser().resolve()
+        self.inference_workers = inference_workers
+        self.threads_per_worker = threads_per_worker
+        self.max_memory_bytes = None if max_memory_mb is None else int(max_memory_mb * 1024 * 1024)
+        self.feature_cache: Optional[FeatureCache] = None
+        if feature_cache is not None:
+            self.feature_cache = open_feature_cache(Path(feature_cache), feature_cache_size_mb)
+        self.prediction_cache: Optional[PredictionCache] = None
+        if prediction_cache is not None:
+            self.prediction_cache = PredictionCache(Path(prediction_cache))
+        self.deduplicator = Deduplicator() if dedup else None
+        # Started on the first prediction and kept until close()
+        self.featurizer_pool = FeaturizerPool(workers) if workers else None
+
+        # name -> (model, norm_factor, backbone fingerprint, weight bytes), least recently used first
+        self._models: "OrderedDict[str, Tuple[torch.nn.Module, Optional[Tuple[float, float]], Optional[str], int]]" = (
+            OrderedDict()
+        )
+        self._student = None
+        self._model_keys: Dict[str, str] = {}
+        self._data_parallel: Optional[Tuple[Tuple[str, ...], DataParallelInference]] = None
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {name: threading.Lock() for name in PROPERTIES}
+        # The caches hold one SQLite connection each and the other helpers keep per-call state
+        serial = feature_cache is not None or prediction_cache is not None or dedup or inference_workers != 0
+        self._serial = threading.Lock() if serial else None
+
+    # ------------------------------------------------------------------
+    # Model loading
+    # ------------------------------------------------------------------
+    def _load(self, name: str) -> Tuple[torch.nn.Module, Optional[Tuple[float, float]], Optional[str]]:
+        with self._load_locks[name]:
+            with self._lock:
+                entry = self._models.get(name)
+                if entry is not None:
+                    self._models.move_to_end(name)
+                    return entry[:3]
+            model, norm_factor = load_models([name], self.device, self.backend)[name]
+            fingerprint = None
+            if self.backend == "eager":
+                model.set_full_graph_mode(self.options.full_graph_mode, self.memory_budget_mb)
+                fingerprint = backbone_fingerprint(model)
+                model = apply_precision(model, self.precision, self.device)
+                size = model_memory_bytes(model)
+            else:
+                size = exported_path_for(model_path_for(name), self.backend).stat().st_size
+            with self._lock:
+                self._models[name] = (model, norm_factor, fingerprint, size)
+                self._evict()
+            return model, norm_factor, fingerprint
+
+    def _evict(self) -> None:
+        # Called with self._lock held
+        if self.max_memory_bytes is None:
+            return
+        while len(self._models) > 1 and sum(entry[3] for entry in self._models.values()) > self.max_memory_bytes:
+            name, _ = self._models.popitem(last=False)
+            print(f"Evicting model: {name}", flush=True)
+
+    def _load_student(self, property_names: Sequence[str]):
+        with self._lock:
+            if self._student is None:
+                print(f"Loading student model: {self.student_path}")
+                student, properties, norm_factors, agreement = load_student(self.student_path, self.device)
+                student.set_full_graph_mode(self.options.full_graph_mode, self.memory_budget_mb)
+                student = apply_precision(student, self.precision, self.device)
+                self._student = (student, properties, norm_factors, agreement)
+            student, properties, norm_factors, _ = self._student
+        missing = [name for name in property_names if name not in properties]
+        if missing:
+            raise ValueError(f"Student model does not cover: {', '.join(missing)}")
+        # All heads share one student, so they form a single backbone group and the student runs once per batch
+        models = {
+            name: (StudentHead(student, properties.index(name)), norm_factors[name])
+            for name in property_names
+        }
+        return models, [list(models)]
+
+    def load(
+        self,
+        property_names: Sequence[str],
+    ) -> Tuple[Dict[str, Tuple[torch.nn.Module, Optional[Tuple[float, float]]]], Optional[List[List[str]]]]:
+        """
+        Load (or reuse) the models of the given properties.
+
+        Returns:
+            (models, backbone_groups): Models in the given order and the groups
+            of them sharing a pretrained backbone (None for exported backends)
+        """
+        if self.student_path is not None:
+            return self._load_student(property_names)
+        loaded = {name: self._load(name) for name in property_names}
+        models = {name: (model, norm_factor) for name, (model, norm_factor, _) in loaded.items()}
+        if self.backend != "eager":
+            return models, None
+        return models, group_by_backbone({name: fingerprint for name, (_, _, fingerprint) in loaded.items()})
+
+    def unload(self, property_names: Optional[Sequence[str]] = None) -> None:
+        """Release the models of the given properties, or every model (and the student) by default."""
+        with self._serial if self._serial is not None else contextlib.nullcontext():
+            data_parallel = None
+            with self._lock:
+                for name in list(self._models) if property_names is None else property_names:
+                    self._models.pop(name, None)
+                if property_names is None:
+                    self._student = None
+                # The inference workers hold copies of the models they were started with
+                if self._data_parallel is not None and (
+                    property_names is None or not set(property_names).isdisjoint(self._data_parallel[0])
+                ):
+                    data_parallel, self._data_parallel = self._data_parallel[1], None
+            if data_parallel is not None:
+                data_parallel.close()
+
+    def close(self) -> None:
+        """Unload every model and close the caches; the predictor cannot be used afterwards."""
+        self.unload()
+        if self.feature_cache is not None:
+            self.feature_cache.close()
+        if self.prediction_cache is not None:
+            self.prediction_cache.close()
+        if self.featurizer_pool is not None:
+            self.featurizer_pool.close()
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return list(self._models)
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(entry[3] for entry in self._models.values())
+
+    def student_agreement(self, property_names: Sequence[str]) -> Dict[str, Dict[str, float]]:
+        """Agreement statistics of the student with the property models (after load)."""
+        agreement = self._student[3] if self._student is not None else {}
+        return {name: agreement[name] for name in property_names if name in agreement}
+
+    def model_keys(self, property_names: Sequence[str]) -> Dict[str, str]:
+        """Model key of each property: checkpoint checksum and inference variant (see prediction_cache.py)."""
+        key_for = self.prediction_cache.model_key if self.prediction_cache is not None else model_key_for
+        for name in property_names:
+            if name in self._model_keys:
+                continue
+            if self.student_path is not None:
+                self._model_keys[name] = key_for(self.student_path, f"student:{name}/{self.precision}")
+                continue
+            if self.backend == "eager":
+                model_file = resolve_checkpoint_file(model_path_for(name))
+            else:
+                model_file = exported_path_for(model_path_for(name), self.backend)
+            self._model_keys[name] = key_for(model_file, f"{self.backend}/{self.precision}")
+        return {name: self._model_keys[name] for name in property_names}
+
+    def _data_parallel_for(
+        self,
+        property_names: Sequence[str],
+        models: Dict[str, Tuple[torch.nn.Module, Optional[Tuple[float, float]]]],
+        backbone_groups: Optional[List[List[str]]],
+    ) -> Optional[DataParallelInference]:
+        # Called with self._serial held; the workers are restarted when the property set changes
+        if self.inference_workers == 0:
+            return None
+        names = tuple(property_names)
+        if self._data_parallel is not None:
+            if self._data_parallel[0] == names:
+                return self._data_parallel[1]
+            self._data_parallel[1].close()
+            self._data_parallel = None
+        workers, threads = auto_layout(
+            max(1, available_cores() - self.options.workers),
+            None if self.inference_workers == "auto" else self.inference_workers,
+            self.threads_per_worker,
+        )
+        infer = functools.partial(
+            run_inference,
+            models=models,
+            device=self.device,
+            batch_size=self.options.batch_size,
+            full_graph_edges=self.options.full_graph_mode == "sparse",
+            max_batch_pairs=self.options.max_batch_pairs,
+            backbone_groups=backbone_groups,
+        )
+        data_parallel = DataParallelInference(infer, workers, threads, self.options.batch_size)
+        print(data_parallel.summary())
+        self._data_parallel = (names, data_parallel)
+        return data_parallel
+
+    # ------------------------------------------------------------------
+    # Prediction
+    # ------------------------------------------------------------------
+    def predict_rows(
+        self,
+        smiles_list: Sequence[str],
+        property_names: Sequence[str],
+        incremental: Optional[IncrementalScores] = None,
+    ) -> Tuple[List[Optional[str]], Dict[str, List[Optional[float]]]]:
+        """
+        Predict the given properties for a list of SMILES.
+
+        Returns:
+            (errors, value_columns): See predict_properties; the value columns
+            are in the order of property_names.
+        """
+        models, backbone_groups = self.load(property_names)
+        with self._serial if self._serial is not None else contextlib.nullcontext():
+            model_keys = self.model_keys(property_names) if self.prediction_cache is not None else None
+            return predict_properties(
+                list(smiles_list), models, self.device, self.options,
+                self.feature_cache, self.prediction_cache, model_keys, self.deduplicator, backbone_groups,
+                self._data_parallel_for(property_names, models, backbone_groups), incremental,
+                self.featurizer_pool,
+            )
+
+    def predict(self, smiles: Sequence[str], properties: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Predict properties for a list of SMILES.
+
+        Args:
+            smiles (Sequence[str]): Input SMILES
+            properties (Sequence[str], optional): Property names; all properties if omitted
+
+        Returns:
+            See prediction_arrays; arrays are aligned with smiles.
+        """
+        if isinstance(smiles, str):
+            smiles = [smiles]
+        if properties is None:
+            properties = "all"
+        property_names = parse_properties(properties if isinstance(properties, str) else ",".join(properties))
+        errors, value_columns = self.predict_rows(smiles, property_names)
+        return prediction_arrays(errors, value_columns)
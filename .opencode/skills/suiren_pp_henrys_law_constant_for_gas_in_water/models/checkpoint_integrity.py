@@ -0,0 +1,189 @@
+"""
+Download and integrity checks of Suiren checkpoint files.
+
+download_checkpoint fetches a checkpoint with `modelscope download` into a
+temporary directory next to its destination and moves it into place only
+after it opens as a complete torch.save archive (every member passes its
+CRC check) and, when one is given, matches the expected SHA-256. An
+interrupted or partial download therefore never appears under the
+checkpoint name. The verified checksum is recorded next to the checkpoint:
+
+    <name>_regression.checksum.json     {"sha256", "size", "mtime_ns"}
+
+The predict scripts call verify_checkpoint before torch.load. While the size
+and mtime of the file match its record only the archive directory is read;
+a file that changed since it was verified is hashed again and must still
+match. Files without a record (copied in by hand) get the archive check.
+
+suiren_pp_all/prefetch_models.py downloads and verifies all checkpoints
+ahead of time. With SUIREN_OFFLINE=1 the predict scripts never download
+and fail fast on a missing checkpoint instead.
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Dict, Optional
+
+MODELSCOPE_REPO = "ajy112/Suiren-Model-Set"
+DOWNLOAD_TIMEOUT_S = 300
+OFFLINE_ENV = "SUIREN_OFFLINE"
+CHECKSUM_SUFFIX = ".checksum.json"
+
+# torch.save writes zip archives; files of the legacy format are pickles
+ZIP_MAGIC = b"PK\x03\x04"
+PICKLE_PROTO = b"\x80"
+
+
+def downloads_disabled() -> bool:
+    return os.environ.get(OFFLINE_ENV, "").strip().lower() not in ("", "0", "false", "no")
+
+
+def checksum_path_for(model_path: Path) -> Path:
+    return model_path.with_name(model_path.stem + CHECKSUM_SUFFIX)
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def check_archive(path: Path, full: bool = False) -> None:
+    """
+    Raise RuntimeError unless path looks like a complete torch.save file.
+
+    The zip directory sits at the end of the archive, so reading it detects
+    truncation; full=True also checks the CRC of every member.
+    """
+    with open(path, "rb") as handle:
+        head = handle.read(len(ZIP_MAGIC))
+    if head.startswith(PICKLE_PROTO):
+        return
+    if head != ZIP_MAGIC:
+        raise RuntimeError(f"Checkpoint {path} is not a torch.save file; delete it and download it again.")
+    try:
+        with zipfile.ZipFile(path) as archive:
+            bad_member = archive.testzip() if full else None
+    except (zipfile.BadZipFile, OSError, EOFError) as exc:
+        raise RuntimeError(
+            f"Checkpoint {path} is corrupt or incomplete ({exc}); delete it and download it again."
+        ) from exc
+    if bad_member is not None:
+        raise RuntimeError(f"Checkpoint {path} is corrupt: {bad_member} fails its CRC check.")
+
+
+def read_checksum(model_path: Path) -> Optional[Dict[str, object]]:
+    try:
+        return json.loads(checksum_path_for(model_path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def record_checksum(model_path: Path, sha256: str) -> None:
+    stat = model_path.stat()
+    record = {"sha256": sha256, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    checksum_path = checksum_path_for(model_path)
+    tmp_path = checksum_path.with_suffix(".tmp")
+    try:
+        tmp_path.write_text(json.dumps(record), encoding="utf-8")
+        tmp_path.replace(checksum_path)
+    except OSError:
+        # Read-only model directories keep working, just without the fast path
+        pass
+
+
+def verify_checkpoint(model_path: Path, expected_sha256: Optional[str] = None, full: bool = False) -> Optional[str]:
+    """
+    Check a checkpoint file before it is loaded.
+
+    Args:
+        model_path (Path): Checkpoint file
+        expected_sha256 (str, optional): Required SHA-256 of the file
+        full (bool): Hash the file and check every archive member even if it
+                     is unchanged since its checksum was recorded
+
+    Returns:
+        The SHA-256 of the file, or None when it was neither hashed nor recorded.
+
+    Raises:
+        FileNotFoundError: The file does not exist
+        RuntimeError: The file is corrupt, incomplete, changed since it was
+                      verified, or does not match expected_sha256
+    """
+    if not model_path.is_file():
+        raise FileNotFoundError(f"Checkpoint not found: {model_path}")
+    check_archive(model_path, full=full)
+
+    record = read_checksum(model_path)
+    stat = model_path.stat()
+    unchanged = record is not None and record.get("size") == stat.st_size and record.get("mtime_ns") == stat.st_mtime_ns
+    if not full and expected_sha256 is None and (record is None or unchanged):
+        return None if record is None else record["sha256"]
+
+    digest = file_sha256(model_path)
+    if expected_sha256 is not None and digest != expected_sha256.lower():
+        raise RuntimeError(f"Checkpoint {model_path} has SHA-256 {digest}, expected {expected_sha256}.")
+    if expected_sha256 is None and record is not None and digest != record.get("sha256"):
+        raise RuntimeError(
+            f"Checkpoint {model_path} changed since it was verified; download it again "
+            f"or delete {checksum_path_for(model_path).name} to accept the new file."
+        )
+    if not unchanged or expected_sha256 is not None:
+        record_checksum(model_path, digest)
+    return digest
+
+
+def download_checkpoint(
+    model_path: Path,
+    expected_sha256: Optional[str] = None,
+    timeout: float = DOWNLOAD_TIMEOUT_S,
+) -> str:
+    """
+    Download a checkpoint from ModelScope, verify it and move it into place.
+
+    Returns:
+        The SHA-256 of the downloaded file.
+
+    Raises:
+        RuntimeError: modelscope is missing, the download failed or timed
+                      out, or the downloaded file failed verification
+    """
+    model_path.parent.mkdir(parents=True, exist_ok=True)
+    # A temporary directory on the same file system makes the final move atomic
+    with tempfile.TemporaryDirectory(dir=model_path.parent, prefix=".download-") as tmp_dir:
+        cmd = [
+            "modelscope", "download",
+            "--model", MODELSCOPE_REPO,
+            model_path.name,
+            "--local_dir", tmp_dir,
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired as exc:
+            raise RuntimeError(f"Download of {model_path.name} timed out after {timeout:g} seconds.") from exc
+        except FileNotFoundError as exc:
+            raise RuntimeError("modelscope command not found. Please ensure modelscope is installed.") from exc
+
+        downloaded = Path(tmp_dir) / model_path.name
+        if result.returncode != 0 or not downloaded.is_file():
+            raise RuntimeError(
+                f"Download of {model_path.name} failed with return code {result.returncode}: "
+                f"{(result.stderr or '').strip()}"
+            )
+        check_archive(downloaded, full=True)
+        digest = file_sha256(downloaded)
+        if expected_sha256 is not None and digest != expected_sha256.lower():
+            raise RuntimeError(
+                f"Downloaded {model_path.name} has SHA-256 {digest}, expected {expected_sha256}."
+            )
+        os.replace(downloaded, model_path)
+
+    record_checksum(model_path, digest)
+    return digest
@@ -0,0 +1,216 @@
+"""
+Export of fine-tuned Suiren models to self-contained inference artifacts.
+
+PredictModel2D takes a PyG batch object, which neither TorchScript tracing nor
+ONNX export can consume. TensorInputModel exposes the same computation on plain
+tensors, and the "sparse" full-graph path only uses native torch ops (see
+graph_NN.scatter_softmax), so a single trace stays valid for any number of
+atoms, edges and molecules.
+
+Artifacts:
+    <name>_regression.torchscript.pt  frozen TorchScript module; norm_factor is
+                                      stored in the "suiren.json" extra file
+    <name>_regression.onnx            ONNX graph; norm_factor is stored in the
+                                      "suiren" metadata property. Requires the
+                                      optional onnx and onnxruntime packages.
+"""
+
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional, Sequence, Tuple
+
+import torch
+import torch.nn as nn
+
+from models.graph_NN import set_full_graph_mode
+
+EXPORT_BACKENDS = ("torchscript", "onnx")
+BACKEND_SUFFIXES = {"torchscript": ".torchscript.pt", "onnx": ".onnx"}
+INPUT_NAMES = ["x", "edge_index", "edge_index_all", "edge_attr", "batch", "num_atoms"]
+METADATA_KEY = "suiren"
+ONNX_OPSET = 18  # ScatterElements with reduction="max" for scatter_softmax
+
+
+class TensorInputModel(nn.Module):
+    """
+    PredictModel2D with the batch fields as separate tensor inputs.
+
+    Returns:
+        Tensor: Predictions of shape [num_graphs, out_dim]
+    """
+
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x, edge_index, edge_index_all, edge_attr, batch, num_atoms):
+        data = SimpleNamespace(
+            x=x,
+            edge_index=edge_index,
+            edge_index_all=edge_index_all,
+            edge_attr=edge_attr,
+            batch=batch,
+            num_atoms=num_atoms,
+        )
+        return self.model(data)
+
+
+def exported_path_for(model_path: Path, backend: str) -> Path:
+    """Artifact path of a checkpoint for an export backend."""
+    if backend not in BACKEND_SUFFIXES:
+        raise ValueError(f"backend must be one of {EXPORT_BACKENDS}, got {backend}")
+    return model_path.with_name(model_path.stem + BACKEND_SUFFIXES[backend])
+
+
+def batch_inputs(data) -> Tuple[torch.Tensor, ...]:
+    """Tensor inputs of TensorInputModel for a collated batch (edge_index_all required)."""
+    edge_index_all = getattr(data, "edge_index_all", None)
+    if edge_index_all is None:
+        raise ValueError("Exported models need edge_index_all; collate with full_graph_edges=True.")
+    num_atoms = getattr(data, "num_atoms", None)
+    if num_atoms is None:
+        num_atoms = torch.bincount(data.batch)
+    return (
+        data.x.long(),
+        data.edge_index.long(),
+        edge_index_all.long(),
+        data.edge_attr.long(),
+        data.batch.long(),
+        num_atoms.long(),
+    )
+
+
+def trace_model(model: nn.Module, example_batch) -> torch.jit.ScriptModule:
+    """
+    Trace a PredictModel2D into a frozen TorchScript module.
+
+    The model is switched to the "sparse" full-graph mode, the only one without
+    data-dependent Python control flow.
+    """
+    set_full_graph_mode(model, "sparse")
+    wrapper = TensorInputModel(model).eval()
+    with torch.no_grad():
+        traced = torch.jit.trace(wrapper, batch_inputs(example_batch), check_trace=False)
+    return torch.jit.freeze(traced)
+
+
+def export_torchscript(model: nn.Module, example_batch, path: Path,
+                       norm_factor: Optional[Tuple[float, float]]) -> None:
+    traced = trace_model(model, example_batch)
+    metadata = json.dumps({"norm_factor": norm_factor})
+    torch.jit.save(traced, str(path), _extra_files={f"{METADATA_KEY}.json": metadata})
+
+
+def export_onnx(model: nn.Module, example_batch, path: Path,
+                norm_factor: Optional[Tuple[float, float]]) -> None:
+    try:
+        import onnx
+    except ImportError:
+        raise RuntimeError("ONNX export requires the onnx package: pip install onnx onnxruntime")
+
+    set_full_graph_mode(model, "sparse")
+    wrapper = TensorInputModel(model).eval()
+    dynamic_axes = {
+        "x": {0: "num_nodes"},
+        "edge_index": {1: "num_edges"},
+        "edge_index_all": {1: "num_edges_all"},
+        "edge_attr": {0: "num_edges"},
+        "batch": {0: "num_nodes"},
+        "num_atoms": {0: "num_graphs"},
+        "prediction": {0: "num_graphs"},
+    }
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper,
+            batch_inputs(example_batch),
+            str(path),
+            input_names=INPUT_NAMES,
+            output_names=["prediction"],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+        )
+
+    onnx_model = onnx.load(str(path))
+    onnx.helper.set_model_props(onnx_model, {METADATA_KEY: json.dumps({"norm_factor": norm_factor})})
+    onnx.save(onnx_model, str(path))
+
+
+def export_model(model: nn.Module, example_batch, path: Path, backend: str,
+                 norm_factor: Optional[Tuple[float, float]]) -> None:
+    """
+    Export a model to an artifact that also carries its norm_factor.
+
+    Args:
+        model (nn.Module): Loaded PredictModel2D in eval mode, on CPU
+        example_batch: Collated batch (with edge_index_all) used for tracing
+        path (Path): Output file
+        backend (str): One of EXPORT_BACKENDS
+        norm_factor (tuple, optional): (mean, std) used to de-normalize predictions
+    """
+    if backend == "torchscript":
+        export_torchscript(model, example_batch, path, norm_factor)
+    elif backend == "onnx":
+        export_onnx(model, example_batch, path, norm_factor)
+    else:
+        raise ValueError(f"backend must be one of {EXPORT_BACKENDS}, got {backend}")
+
+
+def parse_norm_factor(metadata: str) -> Optional[Tuple[float, float]]:
+    norm_factor = json.loads(metadata).get("norm_factor")
+    return None if norm_factor is None else (float(norm_factor[0]), float(norm_factor[1]))
+
+
+class ExportedModel:
+    """
+    Callable stand-in for PredictModel2D backed by an exported artifact.
+
+    Called with a collated batch, like the eager model, and returns predictions
+    of shape [num_graphs, out_dim].
+    """
+
+    def __init__(self, path: Path, backend: str, device: torch.device):
+        if device.type != "cpu":
+            # Tracing records the CPU device of intermediate tensors as constants
+            raise RuntimeError(f"The {backend} backend runs on CPU only; use --device cpu.")
+        self.backend = backend
+        if backend == "torchscript":
+            extra_files = {f"{METADATA_KEY}.json": ""}
+            self.module = torch.jit.load(str(path), map_location="cpu", _extra_files=extra_files)
+            self.norm_factor = parse_norm_factor(extra_files[f"{METADATA_KEY}.json"])
+        elif backend == "onnx":
+            try:
+                import onnxruntime
+            except ImportError:
+                raise RuntimeError("The onnx backend requires the onnxruntime package: pip install onnxruntime")
+            self.session = onnxruntime.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+            self.norm_factor = parse_norm_factor(self.session.get_modelmeta().custom_metadata_map[METADATA_KEY])
+        else:
+            raise ValueError(f"backend must be one of {EXPORT_BACKENDS}, got {backend}")
+
+    def __call__(self, data) -> torch.Tensor:
+        inputs = batch_inputs(data)
+        if self.backend == "torchscript":
+            return self.module(*inputs)
+        feeds = {name: tensor.cpu().numpy() for name, tensor in zip(INPUT_NAMES, inputs)}
+        return torch.from_numpy(self.session.run(None, feeds)[0])
+
+
+def load_exported_model(path: Path, backend: str, device: torch.device):
+    """
+    Load an exported artifact.
+
+    Returns:
+        (ExportedModel, norm_factor)
+    """
+    if not path.is_file():
+        raise FileNotFoundError(
+            f"Exported model not found: {path}. "
+            f"Create it with: python suiren_pp_all/export_models.py --backend {backend}"
+        )
+    model = ExportedModel(path, backend, device)
+    return model, model.norm_factor
+
+
+def max_abs_difference(expected: Sequence[torch.Tensor], actual: Sequence[torch.Tensor]) -> float:
+    return max(float((a.float() - e.float()).abs().max()) for e, a in zip(expected, actual))
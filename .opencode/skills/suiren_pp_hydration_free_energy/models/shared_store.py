@@ -0,0 +1,192 @@
+"""
+Content-addressed storage of Suiren checkpoints.
+
+All properties use the standard_finetune architecture and start from the
+same pretrained backbone, so many tensors are byte-identical across the
+<name>_regression.pt files. suiren_pp_all/dedup_checkpoints.py rewrites
+checkpoints into this layout, storing every distinct tensor once:
+
+    <store>/<sha256>.bin                 raw bytes of one tensor
+    <name>_regression.manifest.json      per property, next to its checkpoint:
+                                         tensor name -> (sha256, dtype, shape),
+                                         the store directory (relative to the
+                                         manifest) and the checkpoint metadata
+
+load_manifest memory-maps the tensor files (copy-on-write), so properties
+loaded together in one process reuse one mapping per distinct tensor, and
+processes on a node share the page cache instead of private copies. Load
+the returned state dict with load_state_dict(..., assign=True) to keep the
+mapped tensors as the model parameters.
+
+Before a tensor file is mapped its size must match the dtype and shape in
+the manifest, which catches truncated files. verify_manifest(full=True),
+run by suiren_pp_all/prefetch_models.py, also hashes every file against
+its content address.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Set, Tuple
+
+import torch
+
+MANIFEST_SUFFIX = ".manifest.json"
+TENSOR_SUFFIX = ".bin"
+
+# Mapped tensor files of this process, keyed by path
+_mapped: Dict[str, torch.Tensor] = {}
+# Tensor files hashed by this process, keyed by (path, size, mtime)
+_hashed: Set[Tuple[str, int, int]] = set()
+
+
+def manifest_path_for(model_path: Path) -> Path:
+    return model_path.with_name(model_path.stem + MANIFEST_SUFFIX)
+
+
+def resolve_checkpoint_file(model_path: Path) -> Path:
+    """The file a checkpoint is loaded from: its manifest if there is one."""
+    manifest_path = manifest_path_for(model_path)
+    return manifest_path if manifest_path.is_file() else model_path
+
+
+def tensor_bytes(tensor: torch.Tensor) -> bytes:
+    return tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy().tobytes()
+
+
+def dtype_name(dtype: torch.dtype) -> str:
+    return str(dtype).replace("torch.", "")
+
+
+def store_checkpoint(
+    state_dict: Dict[str, torch.Tensor],
+    meta: Dict[str, object],
+    manifest_path: Path,
+    store_dir: Path,
+) -> Tuple[int, int]:
+    """
+    Write a checkpoint as a manifest plus tensor files in a shared store.
+
+    Args:
+        state_dict (dict): Tensor name -> tensor
+        meta (dict): JSON-serializable checkpoint metadata (e.g. norm_factor)
+        manifest_path (Path): Manifest file to write
+        store_dir (Path): Directory of the tensor files, shared by checkpoints
+
+    Returns:
+        (tensor_bytes, written_bytes): Size of all tensors of the checkpoint
+        and the part of it that was not in the store yet.
+    """
+    store_dir.mkdir(parents=True, exist_ok=True)
+    tensors = {}
+    total = written = 0
+    for name, tensor in state_dict.items():
+        payload = tensor_bytes(tensor)
+        digest = hashlib.sha256(payload).hexdigest()
+        path = store_dir / f"{digest}{TENSOR_SUFFIX}"
+        if not path.is_file():
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_bytes(payload)
+            tmp_path.replace(path)
+            written += len(payload)
+        total += len(payload)
+        tensors[name] = {"sha256": digest, "dtype": dtype_name(tensor.dtype), "shape": list(tensor.shape)}
+
+    manifest = {
+        "store": Path(os.path.relpath(store_dir.resolve(), manifest_path.parent.resolve())).as_posix(),
+        "meta": meta,
+        "tensors": tensors,
+    }
+    tmp_path = manifest_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    tmp_path.replace(manifest_path)
+    return total, written
+
+
+def _tensor_nbytes(dtype: torch.dtype, shape) -> int:
+    numel = 1
+    for size in shape:
+        numel *= size
+    return numel * torch.empty((), dtype=dtype).element_size()
+
+
+def _check_tensor_file(name: str, path: Path, entry: Dict[str, object], full: bool) -> None:
+    """Raise unless path holds the bytes of one manifest entry."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Shared tensor file missing for {name}: {path}") from None
+    expected = _tensor_nbytes(getattr(torch, entry["dtype"]), entry["shape"])
+    if stat.st_size != expected:
+        raise RuntimeError(
+            f"Shared tensor file of {name} is corrupt: {path} has {stat.st_size} bytes, expected {expected}."
+        )
+    key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    if full and key not in _hashed:
+        digest = hashlib.sha256()
+        with open(path, "rb") as handle:
+            for block in iter(lambda: handle.read(1 << 20), b""):
+                digest.update(block)
+        if digest.hexdigest() != entry["sha256"]:
+            raise RuntimeError(f"Shared tensor file of {name} is corrupt: {path} does not match its SHA-256.")
+        _hashed.add(key)
+
+
+def _map_tensor(path: Path, dtype: torch.dtype, shape) -> torch.Tensor:
+    nbytes = _tensor_nbytes(dtype, shape)
+    if nbytes == 0:
+        return torch.empty(shape, dtype=dtype)
+
+    key = str(path.resolve())
+    data = _mapped.get(key)
+    if data is None:
+        # shared=False maps the file copy-on-write: reads share the page cache
+        data = _mapped[key] = torch.from_file(key, shared=False, size=nbytes, dtype=torch.uint8)
+    return data.view(dtype).view(shape)
+
+
+def _read_manifest(manifest_path: Path) -> Tuple[Dict[str, object], Path]:
+    manifest = json.loads(Path(manifest_path).read_text(encoding="utf-8"))
+    return manifest, Path(manifest_path).parent / manifest["store"]
+
+
+def verify_manifest(manifest_path: Path, full: bool = False) -> int:
+    """
+    Check the tensor files of a manifest without loading them.
+
+    Args:
+        manifest_path (Path): Manifest written by store_checkpoint
+        full (bool): Also hash every tensor file against its content address
+
+    Returns:
+        int: Number of tensor files checked
+
+    Raises:
+        FileNotFoundError: A tensor file is missing
+        RuntimeError: A tensor file has the wrong size or (full=True) content
+    """
+    manifest, store_dir = _read_manifest(manifest_path)
+    for name, entry in manifest["tensors"].items():
+        _check_tensor_file(name, store_dir / f"{entry['sha256']}{TENSOR_SUFFIX}", entry, full)
+    return len(manifest["tensors"])
+
+
+def load_manifest(manifest_path: Path, full: bool = False) -> Tuple[Dict[str, torch.Tensor], Dict[str, object]]:
+    """
+    Load a checkpoint written by store_checkpoint.
+
+    Args:
+        manifest_path (Path): Manifest file
+        full (bool): Hash every tensor file before mapping it, not only check its size
+
+    Returns:
+        (state_dict, meta): Memory-mapped CPU tensors and the checkpoint metadata
+    """
+    manifest, store_dir = _read_manifest(manifest_path)
+    state_dict = {}
+    for name, entry in manifest["tensors"].items():
+        path = store_dir / f"{entry['sha256']}{TENSOR_SUFFIX}"
+        _check_tensor_file(name, path, entry, full)
+        state_dict[name] = _map_tensor(path, getattr(torch, entry["dtype"]), entry["shape"])
+    return state_dict, manifest["meta"]
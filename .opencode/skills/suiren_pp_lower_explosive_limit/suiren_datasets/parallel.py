@@ -0,0 +1,138 @@
+"""
+Parallel featurization of SMILES lists for Suiren inference.
+
+RDKit parsing and per-atom feature extraction are pure Python per molecule, so
+large CSVs are split into chunks and featurized in a process pool.
+Chunks are yielded in input order while later chunks are still being
+featurized, which lets the caller run the model on one chunk as the pool works
+on the next ones. The pool is a FeaturizerPool owned by the caller (the predict
+CLIs, SuirenPredictor, dataset processing), so repeated calls reuse the same
+worker processes instead of starting a new pool each time.
+"""
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+import torch
+
+from suiren_datasets.compact import CompactMolecule
+from suiren_datasets.feature_cache import flush_open_caches
+
+DEFAULT_CHUNK_SIZE = 1024
+
+Featurizer = Callable[[str], Tuple[Optional[CompactMolecule], Optional[str]]]
+
+
+def _init_worker() -> None:
+    # Workers only run RDKit and small tensor ops; keep them off the intra-op pool
+    torch.set_num_threads(1)
+
+
+def _featurize_chunk(featurize: Featurizer, smiles_chunk: Sequence[str]):
+    # Ship records back as numpy arrays: torch would otherwise pass every small
+    # tensor through its own shared-memory handle and can run out of descriptors
+    results = []
+    for smiles in smiles_chunk:
+        record, error = featurize(smiles)
+        if record is not None:
+            record = tuple(tensor.numpy() for tensor in record)
+        results.append((record, error))
+    # Pool workers exit without running atexit hooks; commit cache entries per chunk
+    flush_open_caches()
+    return results
+
+
+def _restore_chunk(results) -> List[Tuple[Optional[CompactMolecule], Optional[str]]]:
+    return [
+        (None if record is None else CompactMolecule(*(torch.from_numpy(array) for array in record)), error)
+        for record, error in results
+    ]
+
+
+class FeaturizerPool:
+    """
+    Process pool for featurization, kept alive by its owner across calls.
+
+    The worker processes are started on the first submit and stopped by
+    close(); the pool can also be used as a context manager.
+
+    Args:
+        workers (int): Number of worker processes (positive)
+    """
+
+    def __init__(self, workers: int):
+        if workers <= 0:
+            raise ValueError(f"workers must be positive, got {workers}")
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def submit(self, fn, *args) -> Future:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        return self._executor.submit(fn, *args)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self) -> "FeaturizerPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def iter_featurized(
+    smiles_list: Sequence[str],
+    featurize: Featurizer,
+    executor: Optional[FeaturizerPool] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[Tuple[int, List[Tuple[Optional[CompactMolecule], Optional[str]]]]]:
+    """
+    Featurize SMILES strings, optionally in a process pool.
+
+    Args:
+        smiles_list (Sequence[str]): Input SMILES, in output order
+        featurize (callable): Picklable function mapping one SMILES string to
+                              (CompactMolecule or None, error or None)
+        executor (FeaturizerPool, optional): Pool to featurize in; it stays
+                                             open afterwards. None featurizes
+                                             everything in the calling process
+                                             as a single chunk. (default: None)
+        chunk_size (int): Largest number of SMILES per work unit; lists
+                          shorter than chunk_size x workers are split evenly
+                          over the workers instead (default: 1024)
+
+    Yields:
+        (start, results): Offset of the chunk in smiles_list and the featurize
+        result of each of its SMILES, in input order.
+    """
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+
+    smiles_list = list(smiles_list)
+    if executor is None:
+        yield 0, [featurize(smiles) for smiles in smiles_list]
+        return
+
+    # Spread short lists (e.g. stream micro-batches) over every worker instead of a single chunk
+    chunk_size = min(chunk_size, max(1, -(-len(smiles_list) // executor.workers)))
+    starts = range(0, len(smiles_list), chunk_size)
+    # Bound the look-ahead so featurized chunks do not pile up while the model is slower
+    max_pending = 2 * executor.workers
+    pending = []
+    next_chunk = 0
+    try:
+        while next_chunk < len(starts) or pending:
+            while next_chunk < len(starts) and len(pending) < max_pending:
+                start = starts[next_chunk]
+                future = executor.submit(_featurize_chunk, featurize, smiles_list[start:start + chunk_size])
+                pending.append((start, future))
+                next_chunk += 1
+            start, future = pending.pop(0)
+            yield start, _restore_chunk(future.result())
+    finally:
+        # An abandoned iteration must not leave work queued in the shared pool
+        for _, future in pending:
+            future.cancel()
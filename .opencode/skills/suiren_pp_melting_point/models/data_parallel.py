@@ -0,0 +1,149 @@
+"""
+Data-parallel CPU inference for Suiren models.
+
+One process uses one intra-op thread pool, and the small per-molecule graphs
+of a Suiren batch stop scaling after a few threads. DataParallelInference
+runs the model in several worker processes instead, each with a few threads:
+the records of a featurized chunk are split into shards, the shards are
+predicted by the workers, and the results are merged back in input order.
+
+The workers share the model weights with the parent instead of copying them.
+Where available they are forked after the model is loaded, so the parameter
+pages (or the memory-mapped manifest tensors, see models/shared_store.py)
+stay shared copy-on-write and are never written. On platforms without fork
+the model is sent to the spawned workers through torch.multiprocessing,
+which moves its tensors to shared memory.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import torch
+import torch.multiprocessing as mp
+
+from suiren_datasets.compact import CompactMolecule
+
+# Intra-op threads per worker when the layout is chosen automatically
+DEFAULT_THREADS_PER_WORKER = 4
+# Shards per worker and chunk, so that workers finishing early pick up more work
+SHARDS_PER_WORKER = 4
+
+# Called as infer(data_list=records), like run_inference of the predict scripts
+Infer = Callable[..., object]
+
+# Inference function of this worker process, set by _init_worker
+_infer: Optional[Infer] = None
+
+
+def available_cores() -> int:
+    """CPU cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def auto_layout(
+    cores: Optional[int] = None,
+    workers: Optional[int] = None,
+    threads: Optional[int] = None,
+) -> Tuple[int, int]:
+    """
+    Choose worker processes x intra-op threads per worker for a core count.
+
+    Without workers, every worker gets DEFAULT_THREADS_PER_WORKER threads
+    (fewer on small machines) and the cores are divided among as many
+    workers as fit. A given workers or threads value is kept and the other
+    one fills the cores.
+
+    Returns:
+        (workers, threads)
+    """
+    cores = max(1, available_cores() if cores is None else cores)
+    if workers is None:
+        threads = threads or min(DEFAULT_THREADS_PER_WORKER, cores)
+        workers = max(1, cores // threads)
+    elif threads is None:
+        threads = max(1, cores // workers)
+    return workers, threads
+
+
+def _pack(records: Sequence[CompactMolecule]):
+    # Send numpy arrays: torch would pass every small tensor through its own shared-memory handle
+    return [tuple(tensor.numpy() for tensor in record) for record in records]
+
+
+def _unpack(arrays) -> List[CompactMolecule]:
+    return [CompactMolecule(*(torch.from_numpy(array) for array in record)) for record in arrays]
+
+
+def _init_worker(infer: Infer, threads: int) -> None:
+    global _infer
+    _infer = infer
+    torch.set_num_threads(threads)
+
+
+def _run_shard(arrays):
+    return _infer(data_list=_unpack(arrays))
+
+
+def _ready() -> int:
+    return torch.get_num_threads()
+
+
+def _merge(parts: List[object]):
+    if isinstance(parts[0], dict):
+        return {key: [value for part in parts for value in part[key]] for key in parts[0]}
+    return [value for part in parts for value in part]
+
+
+class DataParallelInference:
+    """
+    Run an inference function on shards of a record list in worker processes.
+
+    Args:
+        infer (callable): Maps data_list=<list of records> to either a list
+            with one entry per record or a dict of such lists: the predict
+            scripts' run_inference with every other argument bound. It holds
+            the model and is handed to every worker once, when it starts.
+        workers (int): Number of worker processes
+        threads (int): Intra-op threads of each worker
+        batch_size (int): Shards are whole multiples of it, so that without
+            a pair budget the workers form the same batches as a serial run
+    """
+
+    def __init__(self, infer: Infer, workers: int, threads: int, batch_size: int):
+        if workers <= 0 or threads <= 0:
+            raise ValueError(f"workers and threads must be positive, got {workers} x {threads}")
+        self.workers = workers
+        self.threads = threads
+        self.batch_size = batch_size
+        methods = mp.get_all_start_methods()
+        context = mp.get_context("fork" if "fork" in methods else "spawn")
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(infer, threads),
+        )
+        # Start the workers now, while the parent holds nothing but the loaded model
+        for future in [self._executor.submit(_ready) for _ in range(workers)]:
+            future.result()
+
+    def shard_size(self, num_records: int) -> int:
+        batches = -(-num_records // self.batch_size)
+        return self.batch_size * max(1, -(-batches // (self.workers * SHARDS_PER_WORKER)))
+
+    def __call__(self, data_list: Sequence[CompactMolecule]):
+        size = self.shard_size(len(data_list))
+        futures = [
+            self._executor.submit(_run_shard, _pack(data_list[start:start + size]))
+            for start in range(0, len(data_list), size)
+        ]
+        return _merge([future.result() for future in futures])
+
+    def summary(self) -> str:
+        return f"Data-parallel inference: {self.workers} workers x {self.threads} threads"
+
+    def close(self) -> None:
+        self._executor.shutdown()
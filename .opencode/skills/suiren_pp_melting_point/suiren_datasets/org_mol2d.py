@@ -1,17 +1,13 @@
 from typing import List, Any, Dict
 
-import os
 import os.path as osp
 from tqdm import tqdm
-import numpy as np
 
 import torch
-from torch_geometric.data import (InMemoryDataset, Data)
+from torch_geometric.data import InMemoryDataset
 
 from rdkit import Chem
 
-import pandas as pd
-
 HAR2EV = 27.211386246
 KCALMOL2EV = 0.04336414
 
@@ -140,7 +136,7 @@ allowable_features = {
 
 # Organic molecules dataset class, elements must in [CHONPSClBrI]
 class PP_smiles_2d(InMemoryDataset):
-    def __init__(self, root, split, property_name, ratio=0.8, radius=8.0, update_atomrefs=False, defined=False, classification=False):
+    def __init__(self, root, split, property_name, ratio=0.8, radius=8.0, update_atomrefs=False, defined=False, classification=False, workers=None):
         assert split in ["train", "valid", "test"]
         self.split = split
         self.property_name = property_name
@@ -153,6 +149,8 @@ class PP_smiles_2d(InMemoryDataset):
         self.defined = defined
         self.classification = classification
         self.class_num = 0
+        # Featurization processes; None uses all cores (see dataset_shards.default_workers)
+        self.workers = workers
         super().__init__(self.root)
         self.data, self.slices = torch.load(self.processed_paths[0])
         self.class_num = len(torch.unique(self.data.y))
@@ -181,117 +179,39 @@ class PP_smiles_2d(InMemoryDataset):
             return self.property_name + '_' + self.split + '_atomref2d.pt'
 
     def process(self):
-        if not self.defined:
-            suppl = pd.read_csv(self.raw_paths[0])
-
-            Nmols = len(suppl['SMILES'])
-            Ntrain = int(self.ratio * Nmols)
-
-            np.random.seed(0)
-            data_perm = np.random.permutation(Nmols)
-
-            train, valid = np.split(data_perm, [Ntrain])
-            indices = {"train": train, "valid": valid}
-
-            np.savez(os.path.join(self.root, 'splits.npz'), idx_train=train, idx_valid=valid)
-
-            if self.classification:
-                label_list = []
-                for i in range(Nmols):
-                    label_list.append(suppl['value'][i])
-                label_dict = unique_strings_to_int(label_list)
-                self.class_num = len(label_dict.keys())
-
-            j = 0
-            fail = 0
-            allow_ele = {1, 6, 7, 8, 9, 15, 16, 17, 35, 53}
-            data_list = []
-            for i in tqdm(range(Nmols)):
-                if j not in indices[self.split]:
-                    j += 1
-                    continue
-                j += 1
-                mol = suppl['SMILES'][i]
-                mol_rdkit = Chem.MolFromSmiles(mol)
-                if mol_rdkit is None:
-                    fail += 1
-                    continue
-                try:
-                    smiles_dict, _ = from_smiles(mol)
-                    x, edge_index, edge_attr, edge_index_all = smiles_dict
-                    atom_types = x
-                    edge_index = edge_index
-                    edge_attr = edge_attr
-                    edge_index_all = edge_index_all
-
-                    if not contains_only_set(atom_types[:, 0].tolist(), allow_ele):
-                        self.exceed_ele = 'Unseen elements, please check dataset.'
-                        continue
-                    
-                except Exception as e:
-                    fail += 1
-                    continue
-
-                node_attr = torch.tensor(atom_types, dtype=torch.long)
-                edge_index = torch.tensor(edge_index, dtype=torch.long)
-                edge_index_all = torch.tensor(edge_index_all, dtype=torch.long)
-                edge_attr = torch.tensor(edge_attr, dtype=torch.long)
-
-                if self.classification:
-                    y = torch.tensor(suppl['value'][i], dtype=torch.long)
+        # Imported here: dataset_shards builds on fast_featurize, which imports the feature maps of this module
+        from suiren_datasets.dataset_shards import UNSEEN_ELEMENTS, iter_dataset_records, select_rows, to_data
+
+        suppl, rows = select_rows(self.raw_paths[0], self.root, self.split, self.ratio, self.defined)
+        smiles_column = suppl['SMILES'].to_numpy()
+        values = suppl['value'].to_numpy()
+        smiles_list = [smiles_column[row] for row in rows]
+
+        if self.classification and not self.defined:
+            label_dict = unique_strings_to_int(values.tolist())
+            self.class_num = len(label_dict.keys())
+
+        fail = 0
+        data_list = []
+        records = iter_dataset_records(smiles_list, self.workers)
+        for position, record, error in tqdm(records, total=len(smiles_list)):
+            if record is None:
+                if error == UNSEEN_ELEMENTS:
+                    self.exceed_ele = 'Unseen elements, please check dataset.'
                 else:
-                    y = torch.tensor(suppl['value'][i], dtype=torch.float)
-                data = Data(x=node_attr, y=y,
-                    edge_index=edge_index, edge_attr=edge_attr, edge_index_all=edge_index_all)
-                data_list.append(data)
-            print(f'The size of {self.split} dataset: {len(data_list)}')
-            print(f'Failed to process {fail} molecules:')
-            self.fail_mole = fail
-            torch.save(self.collate(data_list), self.processed_paths[0])
-        else:
-            suppl = pd.read_csv(self.raw_paths[0])
-
-            fail = 0
-            allow_ele = {1, 6, 7, 8, 9, 15, 16, 17, 35, 53}
-            data_list = []
-            for i in tqdm(range(len(suppl))):
-                mol = suppl['SMILES'][i]
-                mol_rdkit = Chem.MolFromSmiles(mol)
-                if mol_rdkit is None:
-                    fail += 1
-                    continue
-                try:
-                    smiles_dict, _ = from_smiles(mol)
-                    x, edge_index, edge_attr, edge_index_all = smiles_dict
-                    atom_types = x
-                    edge_index = edge_index
-                    edge_attr = edge_attr
-                    edge_index_all = edge_index_all
-
-                    if not contains_only_set(atom_types[:, 0].tolist(), allow_ele):
-                        self.exceed_ele = 'Unseen elements, please check dataset.'
-                        continue
-                    
-                except Exception as e:
                     fail += 1
-                    continue
-
-                node_attr = torch.tensor(atom_types, dtype=torch.long)
-                edge_index = torch.tensor(edge_index, dtype=torch.long)
-                edge_index_all = torch.tensor(edge_index_all, dtype=torch.long)
-                edge_attr = torch.tensor(edge_attr, dtype=torch.long)
-                
-                if self.classification:
-                    y = torch.tensor(suppl['value'][i], dtype=torch.long)
-                else:
-                    y = torch.tensor(suppl['value'][i], dtype=torch.float)
-                data = Data(x=node_attr, y=y,
-                    edge_index=edge_index, edge_attr=edge_attr, edge_index_all=edge_index_all, smiles=mol)
-                data_list.append(data)
-            print(f'The size of {self.split} dataset: {len(data_list)}')
-            print(f'Failed to process {fail} molecules:')
-            self.fail_mole = fail
-            torch.save(self.collate(data_list), self.processed_paths[0])
+                continue
+
+            value = values[rows[position]]
+            if self.classification:
+                y = torch.tensor(value, dtype=torch.long)
+            else:
+                y = torch.tensor(value, dtype=torch.float)
+            data_list.append(to_data(record, y, smiles_list[position] if self.defined else None))
+        print(f'The size of {self.split} dataset: {len(data_list)}')
+        print(f'Failed to process {fail} molecules:')
+        self.fail_mole = fail
+        torch.save(self.collate(data_list), self.processed_paths[0])
 
 def contains_only_set(arr, allowed_elements):
     return set(arr).issubset(allowed_elements)
@@ -304,12 +224,15 @@ def unique_strings_to_int(strings):
     return string_to_int
 
 
-def from_rdmol(mol) -> 'torch_geometric.data.Data':
+def from_rdmol(mol, full_graph: bool = True) -> 'torch_geometric.data.Data':
     r"""Converts a :class:`rdkit.Chem.Mol` instance to a
     :class:`torch_geometric.data.Data` instance.
 
     Args:
         mol (rdkit.Chem.Mol): The :class:`rdkit` molecule.
+        full_graph (bool, optional): If set to :obj:`False`, skips building the
+            fully-connected :obj:`edge_index_all` and returns :obj:`None` in its
+            place. (default: :obj:`True`)
     """
     from rdkit import Chem
 
@@ -355,6 +278,9 @@ def from_rdmol(mol) -> 'torch_geometric.data.Data':
         perm = (edge_index[0] * x.size(0) + edge_index[1]).argsort()
         edge_index, edge_attr = edge_index[:, perm], edge_attr[perm]
         
+    if not full_graph:
+        return x, edge_index, edge_attr, None
+
     # full-connected graph
     nodes = torch.arange(len(xs))
     i, j = torch.combinations(nodes, 2).T
@@ -369,6 +295,7 @@ def from_smiles(
     smiles: str,
     with_hydrogen: bool = False,
     kekulize: bool = False,
+    full_graph: bool = True,
 ) -> 'torch_geometric.data.Data':
     r"""Converts a SMILES string to a :class:`torch_geometric.data.Data`
     instance.
@@ -379,6 +306,8 @@ def from_smiles(
             hydrogens in the molecule graph. (default: :obj:`False`)
         kekulize (bool, optional): If set to :obj:`True`, converts aromatic
             bonds to single/double bonds. (default: :obj:`False`)
+        full_graph (bool, optional): If set to :obj:`False`, skips building the
+            fully-connected :obj:`edge_index_all`. (default: :obj:`True`)
     """
     from rdkit import Chem, RDLogger
 
@@ -395,7 +324,7 @@ def from_smiles(
     if kekulize:
         Chem.Kekulize(mol)
         
-    return from_rdmol(mol), mol_flag
+    return from_rdmol(mol, full_graph=full_graph), mol_flag
 
 
 if __name__ == "__main__":
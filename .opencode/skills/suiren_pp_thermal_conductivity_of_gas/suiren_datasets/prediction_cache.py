@@ -0,0 +1,152 @@
+"""
+Persistent cache of Suiren predictions.
+
+Predictions are stored in a SQLite database keyed by a model key and the
+canonical SMILES of the molecule. The model key is the SHA-256 checksum of
+the loaded checkpoint (or exported artifact) file plus the inference variant
+(backend and precision), so a re-downloaded or re-exported file starts with
+an empty cache; the entries of the file it replaced are deleted.
+
+Checksums are remembered per (path, size, mtime), so a checkpoint is only
+hashed again after it changed on disk.
+"""
+
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence
+
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "suiren" / "predictions.sqlite"
+
+# Stay below SQLite's default limit on host parameters per statement
+_LOOKUP_CHUNK = 500
+
+
+def file_checksum(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    Prediction store shared by all Suiren predictors.
+
+    Args:
+        path (Path): SQLite database file, created if missing
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        # Shared by the threads of a SuirenPredictor, which use it one at a time
+        self._db = sqlite3.connect(str(self.path), timeout=60, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS predictions (
+                model TEXT NOT NULL,
+                canonical TEXT NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (model, canonical)
+            );
+            """
+        )
+
+    def checkpoint_checksum(self, checkpoint_path: Path) -> str:
+        """SHA-256 of a checkpoint file; drops the predictions of its previous contents."""
+        path = str(Path(checkpoint_path).resolve())
+        stat = os.stat(path)
+        row = self._db.execute(
+            "SELECT size, mtime_ns, sha256 FROM checkpoints WHERE path = ?", (path,)
+        ).fetchone()
+        if row is not None and row[:2] == (stat.st_size, stat.st_mtime_ns):
+            return row[2]
+
+        checksum = file_checksum(Path(path))
+        with self._db:
+            if row is not None and row[2] != checksum:
+                self._db.execute("DELETE FROM predictions WHERE model LIKE ?", (row[2] + ":%",))
+            self._db.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, checksum),
+            )
+        return checksum
+
+    def model_key(self, checkpoint_path: Path, variant: str) -> str:
+        """
+        Cache key of a loaded model.
+
+        Args:
+            checkpoint_path (Path): File the model was loaded from
+            variant (str): Settings that change the predictions, e.g. "eager/fp32"
+        """
+        return f"{self.checkpoint_checksum(checkpoint_path)}:{variant}"
+
+    def lookup(self, model_key: str, canonicals: Sequence[str]) -> Dict[str, float]:
+        """Cached predictions of a model for the given canonical SMILES."""
+        unique = list(dict.fromkeys(canonicals))
+        found: Dict[str, float] = {}
+        for start in range(0, len(unique), _LOOKUP_CHUNK):
+            chunk = unique[start:start + _LOOKUP_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            found.update(self._db.execute(
+                f"SELECT canonical, value FROM predictions WHERE model = ? AND canonical IN ({placeholders})",
+                (model_key, *chunk),
+            ).fetchall())
+        return found
+
+    def lookup_rows(
+        self,
+        model_keys: Sequence[str],
+        canonicals: Sequence[Optional[str]],
+    ) -> Dict[int, List[float]]:
+        """
+        Find the input rows whose predictions are cached for every model.
+
+        Rows with a valid SMILES count as a hit or a miss.
+
+        Args:
+            model_keys (Sequence[str]): Keys of the models to look up
+            canonicals (Sequence[Optional[str]]): Canonical SMILES of each
+                                                  row, None when invalid
+
+        Returns:
+            For each fully cached row index, its predictions in the order of
+            model_keys.
+        """
+        valid = [canonical for canonical in canonicals if canonical is not None]
+        tables = [self.lookup(model_key, valid) for model_key in model_keys]
+
+        cached: Dict[int, List[float]] = {}
+        for idx, canonical in enumerate(canonicals):
+            if canonical is not None and all(canonical in table for table in tables):
+                cached[idx] = [table[canonical] for table in tables]
+        self.hits += len(cached)
+        self.misses += len(valid) - len(cached)
+        return cached
+
+    def store(self, model_key: str, predictions: Mapping[str, float]) -> None:
+        """Save predictions of a model, keyed by canonical SMILES."""
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)",
+                [(model_key, canonical, float(value)) for canonical, value in predictions.items()],
+            )
+
+    def summary(self) -> str:
+        return f"Prediction cache: {self.hits} hits, {self.misses} misses"
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,77 @@
+"""
+Deduplication of equivalent SMILES before Suiren inference.
+
+Input rows are grouped by canonical SMILES, so repeated and differently
+written SMILES of the same molecule are featurized and predicted once and
+the result is copied to every row of the group. Rows whose SMILES cannot be
+parsed are never merged; each keeps its own error.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+def canonical_smiles(smiles) -> Optional[str]:
+    """RDKit canonical SMILES, or None for empty or unparsable input."""
+    if smiles is None or smiles != smiles:  # None or NaN
+        return None
+    smiles = str(smiles).strip()
+    if not smiles:
+        return None
+
+    from rdkit import Chem, RDLogger
+
+    RDLogger.DisableLog('rdApp.*')  # type: ignore
+    mol = Chem.MolFromSmiles(smiles)
+    return None if mol is None else Chem.MolToSmiles(mol)
+
+
+class Deduplicator:
+    """Groups rows by canonical SMILES and counts the rows it saved."""
+
+    def __init__(self):
+        self.rows = 0
+        self.unique = 0
+
+    def plan(
+        self,
+        row_indices: Sequence[int],
+        canonicals: Sequence[Optional[str]],
+    ) -> Tuple[List[int], Dict[int, List[int]]]:
+        """
+        Pick one row per distinct canonical SMILES.
+
+        Args:
+            row_indices (Sequence[int]): Rows to predict
+            canonicals (Sequence[Optional[str]]): Canonical SMILES of every
+                                                  row, indexed by row
+
+        Returns:
+            (representatives, duplicates): The first row of each group, in
+            input order, and for each representative with duplicates the
+            other rows of its group.
+        """
+        representatives: List[int] = []
+        duplicates: Dict[int, List[int]] = {}
+        first_row: Dict[str, int] = {}
+        for idx in row_indices:
+            canonical = canonicals[idx]
+            if canonical is None:
+                representatives.append(idx)
+                continue
+            representative = first_row.setdefault(canonical, idx)
+            if representative == idx:
+                representatives.append(idx)
+            else:
+                duplicates.setdefault(representative, []).append(idx)
+
+        self.rows += len(row_indices)
+        self.unique += len(representatives)
+        return representatives, duplicates
+
+    @property
+    def ratio(self) -> float:
+        """Fraction of rows that did not need their own prediction."""
+        return 1.0 - self.unique / self.rows if self.rows else 0.0
+
+    def summary(self) -> str:
+        return f"Unique structures:{self.unique}/{self.rows} (dedup ratio {self.ratio:.1%})"
@@ -0,0 +1,1197 @@
+from base_test import BaseTestCase, test_level
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import torch
+
+"""
+Suiren 模型推理路径的数值一致性测试，不依赖 opencode 与模型文件。
+run test like:
+python -m unittest discover test -p 'test_suiren.py'
+"""
+
+SUIREN_SKILL_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ".opencode", "skills", "suiren_pp_all",
+)
+if SUIREN_SKILL_DIR not in sys.path:
+    sys.path.insert(0, SUIREN_SKILL_DIR)
+BOILING_POINT_SCRIPT = os.path.join(
+    os.path.dirname(SUIREN_SKILL_DIR), "suiren_pp_boiling_point", "boiling_point_predict.py",
+)
+
+from torch_geometric.data import Batch, Data
+from torch_geometric.utils import softmax
+
+from models.checkpoint_integrity import OFFLINE_ENV, checksum_path_for, downloads_disabled, verify_checkpoint
+from models.data_parallel import DataParallelInference, auto_layout
+from models.export import ExportedModel, export_model
+from models.finetune_model import PredictModel2D
+from models.graph_NN import GATConv, scatter_softmax, set_activation_checkpointing, set_full_graph_mode
+from models.precision import apply_precision
+from models.predictor import SuirenPredictor, prediction_arrays
+from models.shared_backbone import backbone_fingerprint, group_by_backbone, run_grouped
+from models.shared_store import load_manifest, store_checkpoint, tensor_bytes, verify_manifest
+from models.student import StudentHead, agreement_statistics, load_student, save_student, student_model
+from suiren_datasets import feature_cache
+from suiren_datasets.compact import bucketed_batch_indices, collate_molecules, compact_from_graph, iterate_batches
+from suiren_datasets.dataset_shards import ShardBatches, ShardedPP_smiles_2d, random_split, rows_in_split
+from suiren_datasets.dedup import Deduplicator
+from suiren_datasets.fast_featurize import fast_from_rdmol
+from suiren_datasets.incremental import KEY_COLUMN, IncrementalScores, model_key_for
+from suiren_datasets.org_mol2d import PP_smiles_2d, from_rdmol
+from suiren_datasets.micro_batch import iter_micro_batches
+from suiren_datasets.parallel import FeaturizerPool, iter_featurized
+from suiren_datasets.prediction_cache import PredictionCache
+from suiren_datasets.streaming import progress_path_for, stream_csv
+import suiren_client
+from suiren_server import SuirenRequestHandler, UnixHTTPServer
+
+
+def make_molecule_graph(num_node, generator):
+    """构造一个链状分子图（随机原子特征），edge_index_all 与 from_rdmol 的构造方式一致。"""
+    x = torch.stack([
+        torch.randint(1, 54, (num_node,), generator=generator),
+        torch.randint(0, 4, (num_node,), generator=generator),
+        torch.randint(0, 12, (num_node,), generator=generator),
+        torch.randint(0, 2, (num_node,), generator=generator),
+        torch.randint(0, 2, (num_node,), generator=generator),
+    ], dim=1)
+
+    src = torch.arange(num_node - 1)
+    edge_index = torch.cat([torch.stack([src, src + 1]), torch.stack([src + 1, src])], dim=1)
+    edge_attr = torch.stack([
+        torch.randint(0, 22, (edge_index.size(1),), generator=generator),
+        torch.randint(0, 5, (edge_index.size(1),), generator=generator),
+        torch.randint(0, 2, (edge_index.size(1),), generator=generator),
+    ], dim=1)
+
+    i, j = torch.combinations(torch.arange(num_node), 2).T
+    edge_index_all = torch.cat([torch.stack([i, j]), torch.stack([j, i])], dim=1)
+    return Data(x=x, edge_index=edge_index, edge_attr=edge_attr, edge_index_all=edge_index_all)
+
+
+def make_batch(sizes, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return Batch.from_data_list([make_molecule_graph(n, generator) for n in sizes])
+
+
+class TestSuirenFullGraphModes(BaseTestCase):
+
+    sizes = [1, 2, 5, 9, 17, 3]
+
+    @test_level(0)
+    def test_01_gatconv_dense_matches_sparse(self):
+        torch.manual_seed(0)
+        conv = GATConv(64).eval()
+        batch = make_batch(self.sizes)
+        x = torch.randn(batch.num_nodes, 64)
+
+        with torch.no_grad():
+            conv.full_graph_mode = "sparse"
+            expected = conv(x, batch.edge_index, batch.edge_index_all, batch.edge_attr, batch=batch.batch)
+            conv.full_graph_mode = "dense"
+            actual = conv(x, batch.edge_index, batch.edge_index_all, batch.edge_attr, batch=batch.batch)
+
+        self.assertEqual(actual.shape, expected.shape)
+        self.assertTrue(torch.allclose(actual, expected, atol=1e-5, rtol=1e-4))
+
+    @test_level(0)
+    def test_02_model_dense_matches_sparse(self):
+        torch.manual_seed(0)
+        model = PredictModel2D(
+            pretrain_num_layer=2,
+            finetune_num_layer=3,
+            pretrain_embed_dim=32,
+            finetune_embed_dim=32,
+            d_proj=32,
+        ).eval()
+        batch = make_batch(self.sizes, seed=1)
+
+        with torch.no_grad():
+            expected = model.set_full_graph_mode("sparse")(batch)
+            actual = model.set_full_graph_mode("dense")(batch)
+
+        self.assertTrue(torch.allclose(actual, expected, atol=1e-5, rtol=1e-4))
+
+    @test_level(0)
+    def test_03_chunked_matches_sparse(self):
+        torch.manual_seed(0)
+        conv = GATConv(64).eval()
+        batch = make_batch(self.sizes, seed=2)
+        x = torch.randn(batch.num_nodes, 64)
+
+        with torch.no_grad():
+            conv.full_graph_mode = "sparse"
+            expected = conv(x, batch.edge_index, batch.edge_index_all, batch.edge_attr, batch=batch.batch)
+            # 预算足够时走 dense 路径；预算较小时相邻分子打包为子批次；预算极小时按目标原子分块
+            pair_bytes = conv.heads * (2 * conv.reduce_channel + 4) * x.element_size()
+            for budget_mb in (64, 100.5 * pair_bytes / (1024 * 1024), 1e-3):
+                set_full_graph_mode(conv, "chunked", memory_budget_mb=budget_mb)
+                actual = conv(x, batch.edge_index, batch.edge_index_all, batch.edge_attr, batch=batch.batch)
+                self.assertTrue(torch.allclose(actual, expected, atol=1e-5, rtol=1e-4), msg=f"budget {budget_mb} MB")
+
+    @test_level(0)
+    def test_04_unknown_mode_rejected(self):
+        model = PredictModel2D(2, 2, 16, 16, d_proj=16)
+        with self.assertRaises(ValueError):
+            model.set_full_graph_mode("blocked")
+
+    @test_level(0)
+    def test_05_chunked_packs_graphs_that_fit(self):
+        torch.manual_seed(0)
+        conv = GATConv(64).eval()
+        batch = make_batch(self.sizes, seed=3)
+        x = torch.randn(batch.num_nodes, 64)
+        pair_bytes = conv.heads * (2 * conv.reduce_channel + 4) * x.element_size()
+        # 预算为 100 个原子对：[1, 2, 5]、[9]、[3] 打包为子批次，只有 17 个原子的分子需要分块
+        set_full_graph_mode(conv, "chunked", memory_budget_mb=100.5 * pair_bytes / (1024 * 1024))
+
+        with torch.no_grad(), \
+                mock.patch.object(conv, "full_graph_dense", wraps=conv.full_graph_dense) as dense, \
+                mock.patch.object(conv, "full_graph_target_chunks", wraps=conv.full_graph_target_chunks) as chunks:
+            conv.full_graph_chunked(x, batch.batch)
+
+        self.assertEqual([call.args[0].size(0) for call in dense.call_args_list], [8, 9, 3])
+        self.assertEqual([call.args[0].size(0) for call in chunks.call_args_list], [17])
+
+
+class TestSuirenExport(BaseTestCase):
+
+    sizes = [1, 2, 5, 9, 17, 3]
+
+    @test_level(0)
+    def test_01_scatter_softmax_matches_pyg(self):
+        generator = torch.Generator().manual_seed(5)
+        index = torch.randint(0, 7, (40,), generator=generator)
+        src = torch.randn(40, 2, generator=generator) * 10
+        expected = softmax(src, index, num_nodes=9)
+        actual = scatter_softmax(src, index, 9)
+        self.assertTrue(torch.allclose(actual, expected, atol=1e-6))
+
+    @test_level(0)
+    def test_02_torchscript_matches_eager_on_new_shapes(self):
+        torch.manual_seed(0)
+        model = PredictModel2D(2, 3, 32, 32, d_proj=32).eval()
+        example = make_batch([4, 7, 2], seed=6)
+        batch = make_batch(self.sizes, seed=7)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "model.torchscript.pt"
+            export_model(model, example, path, "torchscript", norm_factor=(1.5, 2.0))
+            exported = ExportedModel(path, "torchscript", torch.device("cpu"))
+
+        self.assertEqual(exported.norm_factor, (1.5, 2.0))
+        with torch.no_grad():
+            expected = model(batch)
+            actual = exported(batch)
+        self.assertEqual(actual.shape, expected.shape)
+        self.assertTrue(torch.allclose(actual, expected, atol=1e-5, rtol=1e-4))
+
+
+class TestSuirenPrecision(BaseTestCase):
+
+    @test_level(0)
+    def test_01_reduced_precision_close_to_fp32(self):
+        torch.manual_seed(0)
+        model = PredictModel2D(2, 3, 32, 32, d_proj=32).eval()
+        batch = make_batch([1, 2, 5, 9, 17, 3], seed=8)
+        device = torch.device("cpu")
+
+        for mode in ("sparse", "dense"):
+            model.set_full_graph_mode(mode)
+            with torch.no_grad():
+                expected = model(batch)
+                for precision in ("bf16", "int8"):
+                    actual = apply_precision(model, precision, device)(batch)
+                    self.assertEqual(actual.dtype, torch.float32)
+                    self.assertEqual(actual.shape, expected.shape)
+                    # 低精度只要求与 fp32 同量级，具体误差由 validate_precision.py 按性质评估
+                    scale = expected.abs().max() + 1.0
+                    self.assertLess(float((actual - expected).abs().max() / scale), 0.1, msg=f"{mode} {precision}")
+
+
+class TestSuirenCompactCollate(BaseTestCase):
+
+    @test_level(0)
+    def test_01_collate_matches_pyg_batch(self):
+        generator = torch.Generator().manual_seed(3)
+        graphs = [make_molecule_graph(n, generator) for n in [1, 2, 5, 9, 17, 3]]
+        expected = Batch.from_data_list(graphs)
+        records = [compact_from_graph(g.x, g.edge_index, g.edge_attr) for g in graphs]
+
+        actual = collate_molecules(records)
+        for key in ("x", "edge_index", "edge_attr", "edge_index_all", "batch"):
+            self.assertTrue(torch.equal(getattr(actual, key), getattr(expected, key)), msg=key)
+
+        # dense/chunked 模式不需要全连接边
+        lazy = collate_molecules(records, full_graph_edges=False)
+        self.assertIsNone(getattr(lazy, "edge_index_all", None))
+        self.assertTrue(torch.equal(lazy.edge_index, expected.edge_index))
+
+
+    @test_level(0)
+    def test_02_bucketed_batches_restore_order(self):
+        torch.manual_seed(0)
+        generator = torch.Generator().manual_seed(4)
+        sizes = [30, 2, 9, 1, 17, 5, 30, 3, 12, 2]
+        graphs = [make_molecule_graph(n, generator) for n in sizes]
+        records = [compact_from_graph(g.x, g.edge_index, g.edge_attr) for g in graphs]
+
+        max_pairs = 400
+        index_batches = bucketed_batch_indices(records, max_pairs)
+        self.assertEqual(sorted(idx for indices in index_batches for idx in indices), list(range(len(sizes))))
+        flat_sizes = [sizes[idx] for indices in index_batches for idx in indices]
+        self.assertEqual(flat_sizes, sorted(sizes))
+        for indices in index_batches:
+            if len(indices) > 1:
+                self.assertLessEqual(sum(sizes[idx] ** 2 for idx in indices), max_pairs)
+
+        model = PredictModel2D(2, 2, 32, 32, d_proj=32).eval()
+        with torch.no_grad():
+            expected = model(Batch.from_data_list(graphs)).view(-1)
+            actual = torch.empty_like(expected)
+            for indices, batch in iterate_batches(records, batch_size=4, max_pairs=max_pairs):
+                actual[indices] = model(batch).view(-1)
+
+        self.assertTrue(torch.allclose(actual, expected, atol=1e-5, rtol=1e-4))
+
+
+def infer_records(model, data_list):
+    """与预测脚本 run_inference 相同的调用方式（data_list 关键字参数），返回每个分子的预测值。"""
+    outputs = [0.0] * len(data_list)
+    with torch.no_grad():
+        for indices, batch in iterate_batches(data_list, 4):
+            for idx, pred in zip(indices, model(batch).view(-1).tolist()):
+                outputs[idx] = pred
+    return outputs
+
+
+class TestSuirenCheckpointIntegrity(BaseTestCase):
+
+    @test_level(0)
+    def test_01_detect_corrupt_and_changed_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_path = Path(tmp_dir) / "demo_regression.pt"
+            torch.save({"state_dict": {"w": torch.arange(1000.0)}, "norm_factor": [1.0, 2.0]}, model_path)
+
+            digest = verify_checkpoint(model_path, full=True)
+            self.assertTrue(checksum_path_for(model_path).is_file())
+            self.assertEqual(verify_checkpoint(model_path), digest)
+            with self.assertRaises(RuntimeError):
+                verify_checkpoint(model_path, expected_sha256="0" * 64)
+
+            # 截断的文件（不完整的下载）
+            truncated = Path(tmp_dir) / "truncated_regression.pt"
+            truncated.write_bytes(model_path.read_bytes()[:-100])
+            with self.assertRaises(RuntimeError):
+                verify_checkpoint(truncated)
+
+            # 校验后被替换的文件
+            torch.save({"state_dict": {"w": torch.zeros(1000)}}, model_path)
+            os.utime(model_path, ns=(1, 1))
+            with self.assertRaises(RuntimeError):
+                verify_checkpoint(model_path)
+
+    @test_level(0)
+    def test_02_offline_switch(self):
+        with mock.patch.dict(os.environ, {OFFLINE_ENV: "1"}):
+            self.assertTrue(downloads_disabled())
+        with mock.patch.dict(os.environ, {OFFLINE_ENV: "0"}):
+            self.assertFalse(downloads_disabled())
+
+
+class TestSuirenDataParallel(BaseTestCase):
+
+    @test_level(0)
+    def test_01_auto_layout(self):
+        self.assertEqual(auto_layout(64), (16, 4))
+        self.assertEqual(auto_layout(2), (1, 2))
+        self.assertEqual(auto_layout(64, workers=8), (8, 8))
+        self.assertEqual(auto_layout(64, threads=2), (32, 2))
+        self.assertEqual(auto_layout(3, workers=8), (8, 1))
+
+    @test_level(0)
+    def test_02_workers_match_serial(self):
+        torch.manual_seed(0)
+        model = PredictModel2D(2, 2, 32, 32, d_proj=32).eval()
+        generator = torch.Generator().manual_seed(5)
+        graphs = [make_molecule_graph(n, generator) for n in [3, 7, 1, 12, 5, 2, 9, 4, 6, 8, 2]]
+        records = [compact_from_graph(g.x, g.edge_index, g.edge_attr) for g in graphs]
+
+        expected = infer_records(model, records)
+        runner = DataParallelInference(functools.partial(infer_records, model), workers=2, threads=1, batch_size=4)
+        try:
+            # 分片大小为 batch_size 的整数倍，各进程组成的批次与串行推理相同
+            self.assertEqual(runner.shard_size(len(records)), 4)
+            actual = runner(records)
+        finally:
+            runner.close()
+        self.assertEqual(len(actual), len(expected))
+        for expected_value, actual_value in zip(expected, actual):
+            self.assertAlmostEqual(actual_value, expected_value, places=5)
+
+
+def featurize_chain(text):
+    """以原子数字符串代替 SMILES 的特征化函数，需定义在模块级以便进程池序列化。"""
+    if not text.isdigit():
+        return None, "invalid_smiles"
+    graph = make_molecule_graph(int(text), torch.Generator().manual_seed(int(text)))
+    return compact_from_graph(graph.x, graph.edge_index, graph.edge_attr), None
+
+
+class TestSuirenParallelFeaturize(BaseTestCase):
+
+    @test_level(0)
+    def test_01_workers_match_serial(self):
+        smiles_list = ["3", "x", "7", "1", "", "12", "5", "2"]
+        serial = [result for _, chunk in iter_featurized(smiles_list, featurize_chain) for result in chunk]
+
+        # 同一个进程池跨多次调用复用，每次结果都与串行一致
+        executors = []
+        with FeaturizerPool(2) as pool:
+            for _ in range(2):
+                parallel = []
+                for start, chunk in iter_featurized(smiles_list, featurize_chain, pool, chunk_size=3):
+                    self.assertEqual(start, len(parallel))
+                    parallel.extend(chunk)
+
+                self.assertEqual(len(parallel), len(smiles_list))
+                for (expected, expected_error), (actual, actual_error) in zip(serial, parallel):
+                    self.assertEqual(actual_error, expected_error)
+                    if expected is None:
+                        self.assertIsNone(actual)
+                        continue
+                    for expected_tensor, actual_tensor in zip(expected, actual):
+                        self.assertEqual(actual_tensor.dtype, expected_tensor.dtype)
+                        self.assertTrue(torch.equal(actual_tensor, expected_tensor))
+                executors.append(pool._executor)
+        self.assertIsNotNone(executors[0])
+        self.assertIs(executors[1], executors[0])
+        self.assertIsNone(pool._executor)
+
+    @test_level(0)
+    def test_02_short_lists_spread_over_workers(self):
+        # 流式微批次远小于默认块大小，也应平均分给每个进程
+        smiles_list = [str(count) for count in range(1, 8)]
+        with FeaturizerPool(2) as pool:
+            starts = [start for start, _ in iter_featurized(smiles_list, featurize_chain, pool)]
+        self.assertEqual(starts, [0, 4])
+
+
+class TestSuirenSharedBackbone(BaseTestCase):
+
+    @test_level(0)
+    def test_01_grouped_matches_separate(self):
+        torch.manual_seed(0)
+        models = {name: PredictModel2D(2, 2, 32, 32, d_proj=32).eval() for name in ("a", "b", "c")}
+        # a 与 b 共享预训练主干，c 使用不同的主干
+        models["b"].pretrain_model.load_state_dict(models["a"].pretrain_model.state_dict())
+
+        fingerprints = {name: backbone_fingerprint(model) for name, model in models.items()}
+        groups = group_by_backbone(fingerprints)
+        self.assertEqual(groups, [["a", "b"], ["c"]])
+
+        generator = torch.Generator().manual_seed(1)
+        batch = Batch.from_data_list([make_molecule_graph(n, generator) for n in (2, 5, 9)])
+        with torch.no_grad():
+            grouped = run_grouped(models, groups, batch)
+            for name, model in models.items():
+                self.assertTrue(torch.equal(grouped[name], model(batch)))
+
+            bf16_models = {name: apply_precision(model, "bf16", torch.device("cpu")) for name, model in models.items()}
+            grouped = run_grouped(bf16_models, groups, batch)
+            for name, model in bf16_models.items():
+                self.assertTrue(torch.equal(grouped[name], model(batch)))
+
+
+class TestSuirenStudent(BaseTestCase):
+
+    @test_level(0)
+    def test_01_heads_share_one_student_pass(self):
+        torch.manual_seed(0)
+        config = {"pretrain_num_layer": 1, "finetune_num_layer": 1, "pretrain_embed_dim": 32,
+                  "finetune_embed_dim": 32, "d_proj": 32}
+        student = student_model(3, config).eval()
+        heads = {name: StudentHead(student, index) for index, name in enumerate(("a", "b", "c"))}
+
+        generator = torch.Generator().manual_seed(1)
+        batch = Batch.from_data_list([make_molecule_graph(n, generator) for n in (2, 5, 9)])
+        with torch.no_grad():
+            full = student(batch)
+            grouped = run_grouped(heads, [list(heads)], batch)
+        self.assertEqual(tuple(full.shape), (3, 3))
+        for index, name in enumerate(heads):
+            self.assertTrue(torch.equal(grouped[name], full[:, index:index + 1]))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "student.pt"
+            agreement = {"a": agreement_statistics(full[:, 0], full[:, 0])}
+            save_student(path, student, config, list(heads), {name: (1.0, 2.0) for name in heads}, agreement)
+            loaded, properties, norm_factors, loaded_agreement = load_student(path, torch.device("cpu"))
+            with torch.no_grad():
+                self.assertTrue(torch.equal(loaded(batch), full))
+        self.assertEqual(properties, ["a", "b", "c"])
+        self.assertEqual(norm_factors["b"], (1.0, 2.0))
+        self.assertEqual(loaded_agreement["a"]["mae"], 0.0)
+        self.assertAlmostEqual(loaded_agreement["a"]["r2"], 1.0)
+
+    @test_level(0)
+    def test_02_agreement_statistics(self):
+        teacher = torch.tensor([1.0, 2.0, 3.0, 4.0])
+        stats = agreement_statistics(teacher + torch.tensor([0.5, -0.5, 0.5, -0.5]), teacher)
+        self.assertAlmostEqual(stats["mae"], 0.5)
+        self.assertAlmostEqual(stats["rmse"], 0.5)
+        self.assertAlmostEqual(stats["max_abs"], 0.5)
+        # SS_res = 1.0, SS_tot = 5.0
+        self.assertAlmostEqual(stats["r2"], 0.8)
+        self.assertEqual(stats["count"], 4)
+
+
+class TestSuirenSharedStore(BaseTestCase):
+
+    @test_level(0)
+    def test_01_shared_tensors_stored_and_mapped_once(self):
+        torch.manual_seed(0)
+        backbone = PredictModel2D(2, 2, 32, 32, d_proj=32).eval()
+        model_a = PredictModel2D(2, 2, 32, 32, d_proj=32).eval()
+        model_b = PredictModel2D(2, 2, 32, 32, d_proj=32).eval()
+        # 两个“性质”共享预训练主干（pretrain_model），其余参数各不相同
+        state_a = dict(backbone.state_dict())
+        state_b = dict(backbone.state_dict())
+        differing = [name for name in state_a if not name.startswith("pretrain_model.")]
+        self.assertTrue(differing)
+        for name in differing:
+            state_a[name] = model_a.state_dict()[name]
+            state_b[name] = model_b.state_dict()[name]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store_dir = Path(tmp_dir) / "store"
+            store_checkpoint(state_a, {"norm_factor": [1.0, 2.0]}, Path(tmp_dir) / "a.manifest.json", store_dir)
+            total_b, written_b = store_checkpoint(state_b, {}, Path(tmp_dir) / "b.manifest.json", store_dir)
+            self.assertLess(written_b, total_b)
+
+            loaded_a, meta_a = load_manifest(Path(tmp_dir) / "a.manifest.json")
+            loaded_b, _ = load_manifest(Path(tmp_dir) / "b.manifest.json")
+            self.assertEqual(meta_a, {"norm_factor": [1.0, 2.0]})
+            for name, tensor in state_a.items():
+                self.assertTrue(torch.equal(loaded_a[name], tensor))
+                if name not in differing and tensor.numel() > 0:
+                    self.assertEqual(loaded_a[name].data_ptr(), loaded_b[name].data_ptr())
+
+            model = PredictModel2D(2, 2, 32, 32, d_proj=32).eval()
+            model.load_state_dict(loaded_a, strict=True, assign=True)
+            generator = torch.Generator().manual_seed(1)
+            batch = Batch.from_data_list([make_molecule_graph(n, generator) for n in (3, 6)])
+            reference = PredictModel2D(2, 2, 32, 32, d_proj=32).eval()
+            reference.load_state_dict(state_a, strict=True)
+            with torch.no_grad():
+                self.assertTrue(torch.equal(model(batch), reference(batch)))
+
+    @test_level(0)
+    def test_02_corrupt_tensor_files_rejected(self):
+        state = {"weight": torch.arange(16, dtype=torch.float32).view(4, 4), "bias": torch.ones(4)}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store_dir = Path(tmp_dir) / "store"
+            manifest_path = Path(tmp_dir) / "a.manifest.json"
+            store_checkpoint(state, {}, manifest_path, store_dir)
+            self.assertEqual(verify_manifest(manifest_path, full=True), 2)
+            weight_file = store_dir / f"{hashlib.sha256(tensor_bytes(state['weight'])).hexdigest()}.bin"
+
+            # 大小不变但内容损坏：只有完整校验能发现
+            payload = bytearray(weight_file.read_bytes())
+            payload[0] ^= 0xFF
+            weight_file.write_bytes(bytes(payload))
+            self.assertEqual(verify_manifest(manifest_path), 2)
+            with self.assertRaisesRegex(RuntimeError, "SHA-256"):
+                verify_manifest(manifest_path, full=True)
+            with self.assertRaisesRegex(RuntimeError, "SHA-256"):
+                load_manifest(manifest_path, full=True)
+
+            # 截断的文件在加载时即被拒绝
+            weight_file.write_bytes(bytes(payload[:-4]))
+            with self.assertRaisesRegex(RuntimeError, "bytes"):
+                load_manifest(manifest_path)
+
+            weight_file.unlink()
+            with self.assertRaises(FileNotFoundError):
+                load_manifest(manifest_path)
+
+
+class TestSuirenFastFeaturize(BaseTestCase):
+
+    # 覆盖手性、形式电荷、芳香性、双键立体化学、环与单原子分子
+    smiles_list = [
+        "C",
+        "[OH-]",
+        "CCO",
+        "c1ccccc1O",
+        "C/C=C/Cl",
+        "F/C=C\\F",
+        "C[C@H](N)C(=O)O",
+        "C[C@@H](Br)I",
+        "CCOP(=S)(OCC)Oc1ccc(cc1)[N+](=O)[O-]",
+        "CC1(C)SC2C(NC(=O)Cc3ccccc3)C(=O)N2C1C(=O)O",
+        "C#N",
+    ]
+
+    @test_level(0)
+    def test_01_bit_identical_to_from_rdmol(self):
+        from rdkit import Chem
+
+        for smiles in self.smiles_list:
+            mol = Chem.MolFromSmiles(smiles)
+            full_graph_options = (False, True) if mol.GetNumAtoms() > 1 else (False,)
+            for full_graph in full_graph_options:
+                expected = from_rdmol(mol, full_graph=full_graph)
+                actual = fast_from_rdmol(mol, full_graph=full_graph)
+                for expected_tensor, actual_tensor in zip(expected, actual):
+                    if expected_tensor is None:
+                        self.assertIsNone(actual_tensor)
+                        continue
+                    self.assertEqual(actual_tensor.dtype, expected_tensor.dtype, smiles)
+                    self.assertEqual(actual_tensor.shape, expected_tensor.shape, smiles)
+                    self.assertTrue(torch.equal(actual_tensor, expected_tensor), smiles)
+
+
+class TestSuirenFeatureCache(BaseTestCase):
+
+    @staticmethod
+    def make_records(sizes):
+        generator = torch.Generator().manual_seed(0)
+        graphs = [make_molecule_graph(n, generator) for n in sizes]
+        return [compact_from_graph(g.x, g.edge_index, g.edge_attr) for g in graphs]
+
+    def assertRecordEqual(self, actual, expected):
+        self.assertIsNotNone(actual)
+        for expected_tensor, actual_tensor in zip(expected, actual):
+            self.assertEqual(actual_tensor.dtype, expected_tensor.dtype)
+            self.assertTrue(torch.equal(actual_tensor, expected_tensor))
+
+    @test_level(0)
+    def test_01_round_trip(self):
+        records = self.make_records([1, 2, 5, 9, 30])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = feature_cache.FeatureCache(Path(tmp_dir))
+            for i, record in enumerate(records):
+                cache.put(f"C{i}", record)
+                cache.put_alias(f"alias{i}", f"C{i}")
+            cache.put_alias("invalid", None)
+            cache.close()
+
+            # 新实例只能从磁盘读取
+            reopened = feature_cache.FeatureCache(Path(tmp_dir))
+            for i, record in enumerate(records):
+                self.assertEqual(reopened.lookup_alias(f"alias{i}"), (True, f"C{i}"))
+                self.assertRecordEqual(reopened.get(f"C{i}"), record)
+            self.assertEqual(reopened.lookup_alias("invalid"), (True, None))
+            self.assertEqual(reopened.lookup_alias("unknown"), (False, None))
+            self.assertIsNone(reopened.get("unknown"))
+            reopened.close()
+
+    @test_level(0)
+    def test_02_evict_oldest_segments(self):
+        records = self.make_records([20] * 12)
+        segment_bytes = 2 * len(feature_cache.encode_record(records[0]))
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch.object(feature_cache, "SEGMENT_BYTES", segment_bytes):
+            # 上限约为三个缓存段（别名表按每行 ALIAS_BYTES 计入）
+            max_size_bytes = 3.5 * (segment_bytes + 2 * feature_cache.ALIAS_BYTES)
+            cache = feature_cache.FeatureCache(Path(tmp_dir), max_size_mb=max_size_bytes / (1024 * 1024))
+            for i, record in enumerate(records):
+                cache.put(f"C{i}", record)
+                cache.put_alias(f"alias{i}", f"C{i}")
+                cache.flush()
+            cache.close()
+
+            reopened = feature_cache.FeatureCache(Path(tmp_dir))
+            kept = [i for i in range(len(records)) if reopened.get(f"C{i}") is not None]
+            self.assertEqual(kept, list(range(len(records) - len(kept), len(records))))
+            self.assertGreaterEqual(len(kept), 6)
+            self.assertLess(len(kept), len(records))
+            self.assertEqual(reopened.lookup_alias("alias0"), (False, None))
+            for i in kept:
+                self.assertRecordEqual(reopened.get(f"C{i}"), records[i])
+            self.assertEqual(len(list(Path(tmp_dir).glob("segment-*.bin"))), len(kept) // 2)
+            reopened.close()
+
+    @test_level(0)
+    def test_03_evict_invalid_aliases_least_recently_used(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = feature_cache.FeatureCache(
+                Path(tmp_dir), max_size_mb=10 * feature_cache.ALIAS_BYTES / (1024 * 1024),
+            )
+            for i in range(10):
+                cache.put_alias(f"bad{i}", None)
+            cache.flush()
+            # 命中后 bad0 成为最近使用的记录
+            self.assertEqual(cache.featurize("bad0"), (None, False))
+            cache.flush()
+            for i in range(10, 15):
+                cache.put_alias(f"bad{i}", None)
+            cache.flush()
+
+            known = [i for i in range(15) if cache.lookup_alias(f"bad{i}")[0]]
+            self.assertEqual(known, [0] + list(range(6, 15)))
+            cache.close()
+
+    @test_level(0)
+    def test_04_keep_segments_of_live_writers(self):
+        record = self.make_records([20])[0]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            writer = feature_cache.FeatureCache(Path(tmp_dir))
+            writer.put("C0", record)
+            writer.flush()
+
+            # 其他实例淘汰时不能删除仍在写入的缓存段
+            other = feature_cache.FeatureCache(Path(tmp_dir), max_size_mb=0)
+            self.assertEqual(other.evict(), [])
+            self.assertRecordEqual(other.get("C0"), record)
+
+            # 关闭后缓存段被封存，可以淘汰
+            writer.close()
+            self.assertEqual(len(other.evict()), 1)
+            self.assertIsNone(other.get("C0"))
+            other.close()
+
+    @test_level(0)
+    def test_05_running_totals_match_index(self):
+        records = self.make_records([20] * 6)
+        segment_bytes = 2 * len(feature_cache.encode_record(records[0]))
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch.object(feature_cache, "SEGMENT_BYTES", segment_bytes):
+            cache = feature_cache.FeatureCache(Path(tmp_dir))
+            for i, record in enumerate(records):
+                cache.put(f"C{i}", record)
+                cache.put_alias(f"alias{i}", f"C{i}")
+                # 重复写入的别名不应重复计数
+                cache.put_alias(f"alias{i // 2}", f"C{i // 2}")
+                cache.put_alias("invalid", None)
+                cache.flush()
+            totals = (cache._segment_bytes, cache._alias_count)
+            cache._refresh_totals()
+            self.assertEqual(totals, (cache._segment_bytes, cache._alias_count))
+            self.assertEqual(cache._alias_count, len(records) + 1)
+            cache.close()
+
+
+class TestSuirenDatasetShards(BaseTestCase):
+
+    @test_level(0)
+    def test_01_split_rows_in_file_order(self):
+        indices = random_split(10, 0.8)
+        self.assertEqual(sorted(indices["train"].tolist() + indices["valid"].tolist()), list(range(10)))
+        self.assertEqual(rows_in_split(10, indices["valid"]), sorted(indices["valid"].tolist()))
+
+    @test_level(0)
+    def test_02_sharded_items_match_in_memory_dataset(self):
+        # 含无效 SMILES 与超出元素集合（Si）的分子
+        smiles = ["CCO", "c1ccccc1O", "not-a-smiles", "C[Si](C)(C)C", "CC(=O)O", "ClCCBr", "CCN", "OCCO"]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for root in ("memory", "sharded"):
+                os.makedirs(os.path.join(tmp_dir, root, "raw"))
+                pd.DataFrame({"SMILES": smiles, "value": [float(i) for i in range(len(smiles))]}).to_csv(
+                    os.path.join(tmp_dir, root, "raw", "bp.csv"), index=False,
+                )
+            in_memory = PP_smiles_2d(os.path.join(tmp_dir, "memory"), "train", "bp", ratio=1.0, workers=0)
+            sharded = ShardedPP_smiles_2d(os.path.join(tmp_dir, "sharded"), "train", "bp", ratio=1.0,
+                                          workers=0, shard_size=2, cached_shards=1)
+
+            self.assertEqual(len(sharded), 6)
+            self.assertEqual(sharded.shard_sizes, [2, 2, 2])
+            self.assertEqual(sharded.fail_mole, 1)
+            self.assertEqual(len(in_memory), len(sharded))
+            for idx in reversed(range(len(sharded))):
+                expected, actual = in_memory[idx], sharded[idx]
+                for key in ("x", "y", "edge_index", "edge_attr", "edge_index_all"):
+                    self.assertTrue(torch.equal(actual[key], expected[key]), key)
+
+
+class FakeShards:
+    """只提供 ShardBatches 所需接口的分片数据集：每个分子的标签即其全局编号。"""
+
+    def __init__(self, shard_sizes, seed=0):
+        generator = torch.Generator().manual_seed(seed)
+        self.shard_files = [f"shard{k}.pt" for k in range(len(shard_sizes))]
+        self.shards = []
+        offset = 0
+        for size in shard_sizes:
+            sizes = torch.randint(2, 12, (size,), generator=generator).tolist()
+            graphs = [make_molecule_graph(n, generator) for n in sizes]
+            records = [compact_from_graph(g.x, g.edge_index, g.edge_attr) for g in graphs]
+            self.shards.append((records, torch.arange(offset, offset + size, dtype=torch.float)))
+            offset += size
+
+    def shard_records(self, shard):
+        return self.shards[shard]
+
+
+class TestSuirenFinetune(BaseTestCase):
+
+    @test_level(0)
+    def test_01_shard_batches_cover_each_molecule_once(self):
+        dataset = FakeShards([7, 3, 10, 1, 5])
+        orders = []
+        for epoch in range(2):
+            seen = []
+            for rank in range(2):
+                batches = ShardBatches(dataset, batch_size=4, seed=3, rank=rank, world_size=2)
+                batches.set_epoch(epoch)
+                for batch, y in batches:
+                    self.assertLessEqual(len(y), 4)
+                    self.assertEqual(batch.num_atoms.size(0), len(y))
+                    seen.extend(int(label) for label in y)
+            self.assertEqual(sorted(seen), list(range(26)))
+            orders.append(seen)
+        # 每个 epoch 重新打乱分片与批次顺序
+        self.assertNotEqual(orders[0], orders[1])
+
+    @test_level(0)
+    def test_02_activation_checkpointing_same_gradients(self):
+        torch.manual_seed(0)
+        model = PredictModel2D(2, 3, 32, 32, drop_ratio=0.0, d_proj=32).train()
+        batch = make_batch([4, 7, 2], seed=8)
+
+        grads = []
+        for enabled in (False, True):
+            set_activation_checkpointing(model, enabled)
+            model.zero_grad()
+            model(batch).sum().backward()
+            grads.append([param.grad.clone() for param in model.parameters() if param.grad is not None])
+
+        self.assertEqual(len(grads[0]), len(grads[1]))
+        for expected, actual in zip(*grads):
+            self.assertTrue(torch.allclose(actual, expected, atol=1e-6))
+
+    @test_level(0)
+    def test_03_fewer_shards_than_readers(self):
+        # 两个分片、四个读取方（2 个进程 × 2 个加载进程）：按批次分配
+        dataset = FakeShards([9, 7])
+        counts = []
+        seen = []
+        for reader in range(4):
+            batches = ShardBatches(dataset, batch_size=2, seed=1, rank=reader // 2, world_size=2)
+            with mock.patch(
+                "suiren_datasets.dataset_shards.get_worker_info",
+                return_value=mock.Mock(id=reader % 2, num_workers=2),
+            ):
+                ys = [y for _, y in batches]
+            counts.append(len(ys))
+            seen.extend(int(label) for y in ys for label in y)
+        self.assertEqual(sorted(seen), list(range(16)))
+        self.assertTrue(all(count > 0 for count in counts))
+        self.assertEqual(ShardBatches(dataset, batch_size=2, seed=1).idle_readers(4), [])
+
+        # 一个分片只有两批时，第三、四个读取方分不到批次
+        self.assertEqual(ShardBatches(FakeShards([4]), batch_size=2).idle_readers(4), [2, 3])
+
+
+class TestSuirenDedup(BaseTestCase):
+
+    @test_level(0)
+    def test_01_plan_groups_by_canonical(self):
+        canonicals = ["CCO", None, "c1ccccc1", "CCO", None, "CCO", "O", "c1ccccc1"]
+        deduplicator = Deduplicator()
+        representatives, duplicates = deduplicator.plan([0, 1, 2, 3, 4, 5, 7], canonicals)
+
+        # 无效 SMILES 不合并；第 6 行（如已命中缓存）不参与
+        self.assertEqual(representatives, [0, 1, 2, 4])
+        self.assertEqual(duplicates, {0: [3, 5], 2: [7]})
+        self.assertEqual((deduplicator.rows, deduplicator.unique), (7, 4))
+        self.assertAlmostEqual(deduplicator.ratio, 3 / 7)
+
+
+class TestSuirenPredictionCache(BaseTestCase):
+
+    @test_level(0)
+    def test_01_invalidate_on_new_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint = Path(tmp_dir) / "model.pt"
+            checkpoint.write_bytes(b"weights-v1")
+            cache = PredictionCache(Path(tmp_dir) / "predictions.sqlite")
+
+            key = cache.model_key(checkpoint, "eager/fp32")
+            self.assertEqual(cache.model_key(checkpoint, "eager/fp32"), key)
+            self.assertNotEqual(cache.model_key(checkpoint, "eager/bf16"), key)
+            cache.store(key, {"CCO": 351.5, "O": 373.1})
+            self.assertEqual(cache.lookup(key, ["O", "CCO", "C", "O"]), {"CCO": 351.5, "O": 373.1})
+
+            # 重新下载的模型文件：内容与修改时间均改变
+            checkpoint.write_bytes(b"weights-v2")
+            stat = checkpoint.stat()
+            os.utime(checkpoint, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            new_key = cache.model_key(checkpoint, "eager/fp32")
+            self.assertNotEqual(new_key, key)
+            self.assertEqual(cache.lookup(new_key, ["CCO"]), {})
+            self.assertEqual(cache.lookup(key, ["CCO"]), {})
+            cache.close()
+
+
+class TestSuirenIncremental(BaseTestCase):
+
+    @test_level(0)
+    def test_01_keys_follow_model_and_smiles(self):
+        scores = IncrementalScores(["sha-a:eager/fp32"], ["value"])
+        key = scores.row_key("CCO")
+        self.assertEqual(scores.row_key(" CCO "), key)
+        self.assertNotEqual(scores.row_key("OCC"), key)
+        self.assertIsNone(scores.row_key(float("nan")))
+        # 更换模型文件后所有行的键都改变
+        self.assertNotEqual(IncrementalScores(["sha-b:eager/fp32"], ["value"]).row_key("CCO"), key)
+
+    @test_level(0)
+    def test_02_reuse_only_scored_rows(self):
+        model_keys = ["sha-a:eager/fp32", "sha-b:eager/fp32"]
+        scores = IncrementalScores(model_keys, ["tb", "tc"])
+        previous = pd.DataFrame({
+            "SMILES": ["CCO", "O", "C1CC1", "CC"],
+            "tb": [351.5, 373.1, None, 184.6],
+            "tc": [514.0, 647.1, 398.0, 305.3],
+            KEY_COLUMN: scores.row_keys(["CCO", "O", "C1CC1", "CCC"]),
+        })
+        scores.remember(previous)
+
+        # 第 2 行缺少预测值、第 3 行的 SMILES 已被修改，均需重新预测
+        reused = scores.lookup(["CCO", "O", "C1CC1", "CC", "N"])
+        self.assertEqual(reused, {0: [351.5, 514.0], 1: [373.1, 647.1]})
+        self.assertEqual(scores.summary(), "Incremental: 2 rows reused, 3 rows predicted")
+        # 其他模型的评分结果不会被沿用
+        other = IncrementalScores(model_keys[:1], ["tb"])
+        other.remember(previous)
+        self.assertEqual(other.lookup(["CCO"]), {})
+
+    @test_level(0)
+    def test_03_model_key_reuses_checksum_record(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_path = Path(tmp_dir) / "bp_regression.pt"
+            torch.save({"weight": torch.ones(3)}, model_path)
+            digest = hashlib.sha256(model_path.read_bytes()).hexdigest()
+            self.assertEqual(model_key_for(model_path, "eager/fp32"), f"{digest}:eager/fp32")
+            self.assertTrue(checksum_path_for(model_path).is_file())
+
+            # 文件未变化时直接使用校验记录，不再计算哈希
+            with mock.patch("suiren_datasets.incremental.file_checksum") as file_checksum:
+                self.assertEqual(model_key_for(model_path, "eager/bf16"), f"{digest}:eager/bf16")
+                file_checksum.assert_not_called()
+
+            # 文件改变后重新计算
+            torch.save({"weight": torch.zeros(3)}, model_path)
+            os.utime(model_path, ns=(0, 0))
+            new_digest = hashlib.sha256(model_path.read_bytes()).hexdigest()
+            self.assertEqual(model_key_for(model_path, "eager/fp32"), f"{new_digest}:eager/fp32")
+
+
+def slow_lines():
+    """前两行立即到达，之后的行间隔较长，模拟上游生成器逐个产生分子。"""
+    yield "C\n"
+    yield "CC\n"
+    time.sleep(0.3)
+    yield "CCC\n"
+    time.sleep(0.3)
+    yield "CCCC"
+
+
+class TestSuirenMicroBatch(BaseTestCase):
+
+    @test_level(0)
+    def test_01_flush_by_size(self):
+        lines = [f"{'C' * n}\n" for n in range(1, 8)]
+        batches = list(iter_micro_batches(lines, max_size=3, max_wait_s=10.0))
+        self.assertEqual(batches, [["C", "CC", "CCC"], ["CCCC", "CCCCC", "CCCCCC"], ["CCCCCCC"]])
+
+    @test_level(0)
+    def test_02_flush_by_time(self):
+        start = time.monotonic()
+        batches = list(iter_micro_batches(slow_lines(), max_size=100, max_wait_s=0.05))
+        self.assertEqual(batches, [["C", "CC"], ["CCC"], ["CCCC"]])
+        # 批次不会等到输入结束才提交
+        self.assertLess(time.monotonic() - start, 2.0)
+
+    @test_level(0)
+    def test_03_reader_error_propagates(self):
+        def failing_lines():
+            yield "C"
+            raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+
+        with self.assertRaises(UnicodeDecodeError):
+            list(iter_micro_batches(failing_lines(), max_size=4, max_wait_s=0.01))
+
+
+class TestSuirenStreamCsv(BaseTestCase):
+
+    @staticmethod
+    def predict_chunk(chunk):
+        output_df = chunk.copy()
+        output_df["value"] = chunk["SMILES"].str.len()
+        return output_df
+
+    @test_level(0)
+    def test_01_resume_after_interruption(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = Path(tmp_dir) / "input.csv"
+            output_path = Path(tmp_dir) / "output.csv"
+            input_df = pd.DataFrame({"id": range(25), "SMILES": ["C" * (i + 1) for i in range(25)]})
+            input_df.to_csv(input_path, index=False)
+
+            calls = []
+
+            def failing_chunk(chunk):
+                calls.append(len(chunk))
+                if len(calls) == 2:
+                    raise RuntimeError("interrupted")
+                return self.predict_chunk(chunk)
+
+            with self.assertRaises(RuntimeError):
+                stream_csv(input_path, output_path, failing_chunk, chunk_rows=10)
+            self.assertTrue(progress_path_for(output_path).is_file())
+
+            # 模拟中断时已写入一半的块，恢复时应被截断
+            with open(output_path, "a", encoding="utf-8") as handle:
+                handle.write("99,partial")
+
+            resumed = []
+            total = stream_csv(
+                input_path, output_path, self.predict_chunk, chunk_rows=10, on_chunk=resumed.append,
+            )
+            self.assertEqual(total, 25)
+            self.assertEqual(resumed, [20, 25])
+            self.assertFalse(progress_path_for(output_path).exists())
+
+            output_df = pd.read_csv(output_path, encoding="utf-8-sig")
+            pd.testing.assert_frame_equal(output_df, self.predict_chunk(input_df))
+
+    @test_level(0)
+    def test_02_in_place_output(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            input_path = Path(tmp_dir) / "input.csv"
+            input_df = pd.DataFrame({"SMILES": ["CCO", "c1ccccc1", "O"]})
+            input_df.to_csv(input_path, index=False)
+
+            stream_csv(input_path, input_path, self.predict_chunk, chunk_rows=2)
+            output_df = pd.read_csv(input_path, encoding="utf-8-sig")
+            pd.testing.assert_frame_equal(output_df, self.predict_chunk(input_df))
+            self.assertEqual(sorted(path.name for path in Path(tmp_dir).iterdir()), ["input.csv"])
+
+
+class TestSuirenApi(BaseTestCase):
+
+    @test_level(0)
+    def test_01_prediction_arrays(self):
+        errors = [None, "invalid_smiles", None]
+        value_columns = {"boiling_point": [351.4, None, 353.2], "flash_point": [286.1, None, 262.0]}
+        arrays = prediction_arrays(errors, value_columns)
+
+        self.assertEqual(arrays["boiling_point"].dtype, np.float64)
+        self.assertTrue(np.isnan(arrays["boiling_point"][1]))
+        np.testing.assert_allclose(arrays["flash_point"][[0, 2]], [286.1, 262.0])
+        np.testing.assert_array_equal(arrays["valid"], [True, False, True])
+        self.assertEqual(list(arrays["error"]), errors)
+
+    @test_level(0)
+    def test_02_models_loaded_once_across_threads(self):
+        calls = []
+
+        def fake_load_models(names, device, backend):
+            calls.append(list(names))
+            time.sleep(0.05)
+            return {name: (PredictModel2D(2, 2, 32, 32, d_proj=32).eval(), None) for name in names}
+
+        predictor = SuirenPredictor(device="cpu")
+        with mock.patch("models.predictor.load_models", side_effect=fake_load_models):
+            # 多个线程同时请求同一性质时只加载一次，之后的调用复用已加载的模型
+            threads = [
+                threading.Thread(target=predictor.load, args=(["boiling_point", "flash_point"],))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            models, groups = predictor.load(["flash_point", "boiling_point"])
+
+        self.assertEqual(sorted(calls), [["boiling_point"], ["flash_point"]])
+        self.assertEqual(list(models), ["flash_point", "boiling_point"])
+        self.assertEqual(sum(len(group) for group in groups), 2)
+
+    @test_level(0)
+    def test_03_evict_and_unload(self):
+        def fake_load_models(names, device, backend):
+            return {name: (PredictModel2D(2, 2, 32, 32, d_proj=32).eval(), None) for name in names}
+
+        # 上限小于单个模型：只保留最近使用的模型
+        predictor = SuirenPredictor(device="cpu", max_memory_mb=1e-3)
+        with mock.patch("models.predictor.load_models", side_effect=fake_load_models):
+            predictor.load(["boiling_point"])
+            predictor.load(["flash_point"])
+            self.assertEqual(predictor.loaded(), ["flash_point"])
+            models, _ = predictor.load(["boiling_point", "melting_point"])
+        self.assertEqual(list(models), ["boiling_point", "melting_point"])
+        self.assertEqual(predictor.loaded(), ["melting_point"])
+        self.assertGreater(predictor.memory_bytes(), 0)
+
+        predictor.unload(["melting_point"])
+        self.assertEqual(predictor.loaded(), [])
+        self.assertEqual(predictor.memory_bytes(), 0)
+
+
+
+def fake_load_models(names, device, backend):
+    """以固定随机种子构造的小模型代替下载的检查点，每次加载得到相同的权重。"""
+    models = {}
+    for name in names:
+        torch.manual_seed(0)
+        models[name] = (PredictModel2D(2, 2, 32, 32, d_proj=32).eval(), (300.0, 50.0))
+    return models
+
+
+class TestSuirenServer(BaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch("models.predictor.load_models", side_effect=fake_load_models)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.predictor = SuirenPredictor(device="cpu")
+        self.addCleanup(self.predictor.close)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def serve(self, server):
+        server.predictor = self.predictor
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+    def serve_tcp(self) -> str:
+        # 端口 0 由系统分配空闲端口
+        server = ThreadingHTTPServer(("127.0.0.1", 0), SuirenRequestHandler)
+        self.serve(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def serve_unix(self) -> str:
+        socket_path = os.path.join(self.tmp_dir.name, "suiren.sock")
+        self.serve(UnixHTTPServer(socket_path, SuirenRequestHandler))
+        return f"unix://{socket_path}"
+
+    def request(self, server, method, path, payload=None):
+        connection = suiren_client.open_connection(server, timeout=60)
+        try:
+            body = None if payload is None else json.dumps(payload).encode("utf-8")
+            connection.request(method, path, body=body)
+            response = connection.getresponse()
+            return response.status, json.loads(response.read().decode("utf-8"))
+        finally:
+            connection.close()
+
+    def run_script(self, main, argv, stdin_text):
+        with mock.patch.object(sys, "argv", argv), mock.patch("builtins.input", return_value=stdin_text):
+            main()
+
+    def run_cli(self, stdin_text, output_path):
+        spec = importlib.util.spec_from_file_location("boiling_point_predict", BOILING_POINT_SCRIPT)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        self.run_script(
+            module.main, ["boiling_point_predict.py", "--device", "cpu", "--output", output_path], stdin_text,
+        )
+
+    def run_client(self, server, stdin_text, output_path):
+        self.run_script(
+            suiren_client.main,
+            ["suiren_client.py", "--property", "boiling_point", "--server", server, "--output", output_path],
+            stdin_text,
+        )
+
+    @test_level(0)
+    def test_01_health_and_predict(self):
+        server = self.serve_tcp()
+        status, health = self.request(server, "GET", "/health")
+        self.assertEqual(status, 200)
+        self.assertEqual(health["status"], "ok")
+        self.assertEqual(health["loaded"], [])
+
+        _, expected = self.predictor.predict_rows(["CCO", "c1ccccc1"], ["boiling_point"])
+        status, single = self.request(server, "POST", "/predict", {"property": "boiling_point", "smiles": "CCO"})
+        self.assertEqual(status, 200)
+        self.assertEqual(single["property"], "boiling_point")
+        self.assertEqual(len(single["results"]), 1)
+        self.assertEqual(single["results"][0]["SMILES"], "CCO")
+        self.assertIsNone(single["results"][0]["error"])
+        self.assertAlmostEqual(single["results"][0]["prediction"], expected["boiling_point"][0], places=5)
+
+        # 批量请求中的非法 SMILES 只影响自身这一行
+        status, batch = self.request(
+            server, "POST", "/predict", {"property": "boiling_point", "smiles": ["CCO", "not_a_smiles", "c1ccccc1"]},
+        )
+        self.assertEqual(status, 200)
+        results = batch["results"]
+        self.assertEqual([result["SMILES"] for result in results], ["CCO", "not_a_smiles", "c1ccccc1"])
+        self.assertEqual([result["error"] for result in results], [None, "invalid_smiles", None])
+        self.assertIsNone(results[1]["prediction"])
+        self.assertAlmostEqual(results[0]["prediction"], expected["boiling_point"][0], places=5)
+        self.assertAlmostEqual(results[2]["prediction"], expected["boiling_point"][1], places=5)
+
+        _, health = self.request(server, "GET", "/health")
+        self.assertEqual(health["loaded"], ["boiling_point"])
+        self.assertGreater(health["memory_mb"], 0)
+
+    @test_level(0)
+    def test_02_request_errors(self):
+        server = self.serve_tcp()
+        status, payload = self.request(server, "POST", "/predict", {"property": "no_such_property", "smiles": ["CCO"]})
+        self.assertEqual(status, 400)
+        self.assertIn("Unknown property", payload["error"])
+
+        status, payload = self.request(server, "POST", "/predict", {"smiles": ["CCO"]})
+        self.assertEqual(status, 400)
+        self.assertIn("Malformed request", payload["error"])
+
+        status, _ = self.request(server, "GET", "/missing")
+        self.assertEqual(status, 404)
+
+        with self.assertRaisesRegex(RuntimeError, "Unknown property"):
+            suiren_client.request_predictions(server, "no_such_property", ["CCO"], timeout=60)
+
+    @test_level(0)
+    def test_03_client_matches_cli(self):
+        server = self.serve_unix()
+        input_path = os.path.join(self.tmp_dir.name, "input.csv")
+        pd.DataFrame({"name": ["ethanol", "invalid", "benzene"], "SMILES": ["CCO", "not_a_smiles", "c1ccccc1"]}) \
+            .to_csv(input_path, index=False)
+
+        # CSV：客户端写出的 value 列与 boiling_point_predict.py 的输出逐字节一致
+        client_csv = os.path.join(self.tmp_dir.name, "client.csv")
+        cli_csv = os.path.join(self.tmp_dir.name, "cli.csv")
+        self.run_client(server, input_path, client_csv)
+        self.run_cli(input_path, cli_csv)
+        self.assertEqual(Path(client_csv).read_bytes(), Path(cli_csv).read_bytes())
+        output_df = pd.read_csv(client_csv, encoding="utf-8-sig")
+        self.assertEqual(list(output_df.columns), ["name", "SMILES", "value"])
+        self.assertTrue(np.isnan(output_df["value"][1]))
+
+        # 单个 SMILES：输出相同的 {"SMILES", "prediction"} JSON
+        client_json = os.path.join(self.tmp_dir.name, "client.json")
+        cli_json = os.path.join(self.tmp_dir.name, "cli.json")
+        self.run_client(server, "CCO", client_json)
+        self.run_cli("CCO", cli_json)
+        self.assertEqual(Path(client_json).read_text(encoding="utf-8"), Path(cli_json).read_text(encoding="utf-8"))
+        self.assertEqual(list(json.loads(Path(client_json).read_text(encoding="utf-8"))), ["SMILES", "prediction"])
+
+
+if __name__ == "__main__":
+    unittest.main()